@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+CLI adapter for BatchProcessor (converting many ledgers in one run)
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import argparse
+import json
+import os
+import sys
+
+# Like cli.py, the processing modules are only imported after the arguments are validated.
+
+parser = argparse.ArgumentParser(description='Parse many Kraken ledgers for Portfolio Performance Import, sharing one rate provider.')
+
+parser.add_argument('pp_rates_file', metavar='PP_RATES_FILE', type=str, nargs='?',
+                    help='portfolio performance rates export')
+parser.add_argument('-cm', '--currency-mapping', dest='currency_mapping', type=json.loads)
+
+source = parser.add_mutually_exclusive_group(required=True)
+source.add_argument('-m', '--manifest', dest='manifest', type=str,
+                    help='JSON list of {"ledger", "out_dir", "depot_old", "depot_new", "account", "refids_to_ignore"} objects')
+source.add_argument('-g', '--glob', dest='glob', type=str,
+                    help='Glob of kraken ledger files, outputs go to OUT_DIR/<path below the common directory, without extension>/')
+
+parser.add_argument('-fc', '--fiat-currency', dest="fiat_currency", help='define base currency (def=EUR)', default='EUR')
+parser.add_argument('-ir', '--ignore-refids', dest='refids_to_ignore', type=str, help="Default comma-separated list of refids to ignore while processing", default="")
+parser.add_argument('-o', '--out-dir', dest='out_dir', type=str, help='Directory to store PP transactions in when using --glob (def=cwd)', default='.')
+parser.add_argument('-do', '--depot-old', dest='depot_old', type=str, help="Default name of current/old depot (def=DEPOT)", default="DEPOT")
+parser.add_argument('-dn', '--depot-new', dest='depot_new', type=str, help="Default name of new depot (target of transfers, def=DEPOT_NEW)", default="DEPOT_NEW")
+parser.add_argument('-a', '--account', dest='account', type=str, help="Default name of account (def=ACCOUNT)", default="ACCOUNT")
+parser.add_argument('-w', '--workers', dest='workers', type=int, help='Number of worker processes converting ledgers in parallel, 1 converts them one after another (def=4)', default=4)
+parser.add_argument('-v', '--verbose', dest='verbose', action='store_true', help='Activate verbose mode')
+parser.add_argument('-l', '--language', dest='language', type=str, help='Language for output (en/de, def=de)', default='de')
+
+args = parser.parse_args()
+
+if args.verbose:
+    print(args)
+
+for input_file in [args.pp_rates_file, args.manifest]:
+    if input_file and not os.path.isfile(input_file):
+        parser.error(f"file not found: {input_file}")
+
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.batch_processor import BatchProcessor
+
+defaults = {
+    "depot_current": args.depot_old,
+    "depot_new": args.depot_new,
+    "account": args.account,
+    "refids_to_ignore": args.refids_to_ignore,
+}
+
+if args.manifest:
+    jobs = BatchProcessor.jobs_from_manifest(args.manifest, **defaults)
+else:
+    jobs = BatchProcessor.jobs_from_glob(args.glob, args.out_dir, **defaults)
+
+if not jobs:
+    parser.error("no ledgers to process")
+
+if args.pp_rates_file:
+    rate_provider = PortfolioPerformanceRateProvider(args.pp_rates_file,
+                                                     currency_mapping=args.currency_mapping,
+                                                     fiat_currency=args.fiat_currency,
+                                                     language=args.language)
+else:
+    rate_provider = None
+
+bp = BatchProcessor(rate_provider=rate_provider,
+                    fiat_currency=args.fiat_currency,
+                    language=args.language,
+                    workers=args.workers)
+
+try:
+    results = bp.run(jobs)
+except ValueError as e:
+    parser.error(str(e))
+print(BatchProcessor.format_summary(results, verbose=args.verbose))
+
+sys.exit(1 if any(result.failed for result in results) else 0)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded generator for synthetic Kraken ledgers and matching PP rate exports
+
+Every pattern handled by LedgerProcessor._process_transaction is produced:
+fiat/crypto deposits and withdrawals (dup refids with a blank-txid first leg),
+trades with fiat and crypto fees, spend/receive, staking rewards with their
+".S" deposit twin, earn rewards, staking transfers and the "Unknown" refid bug.
+Balances are running balances per asset, as in real exports.
+
+Usage: python -m benchmarks.ledger_generator ROWS LEDGER_CSV RATES_CSV [--seed N]
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import argparse
+import csv
+import datetime
+import random
+import string
+
+LEDGER_COLUMNS = ["txid", "refid", "time", "type", "subtype", "aclass", "asset", "amount", "fee", "balance"]
+
+FIAT = "ZEUR"
+
+# kraken asset code -> (normalized symbol used for the PP rates column, start price in EUR, amount decimals)
+CRYPTO_ASSETS = {
+    "XXBT": ("XBT", 30000.0, 10),
+    "XETH": ("ETH", 2000.0, 10),
+    "DOT": ("DOT", 20.0, 10),
+    "ADA": ("ADA", 1.0, 8),
+    "SOL": ("SOL", 50.0, 10),
+}
+
+# kraken staking asset code -> normalized symbol
+STAKING_ASSETS = {
+    "ATOM.S": "ATOM",
+    "DOT.S": "DOT",
+    "TRX.S": "TRX",
+    "ADA.S": "ADA",
+}
+
+STAKING_SUBTYPES = ["spottostaking", "stakingfromspot", "stakingtospot", "spotfromstaking", "allocation", "deallocation"]
+
+# pattern -> relative weight (roughly like a staking-heavy retail account)
+PATTERNS = {
+    "fiat_deposit": 3,
+    "crypto_deposit": 2,
+    "buy": 8,
+    "sell": 4,
+    "buy_crypto_fee": 2,
+    "spend_receive": 2,
+    "staking_with_deposit": 30,
+    "staking": 10,
+    "earn": 15,
+    "staking_transfer": 8,
+    "fiat_withdrawal": 1,
+    "crypto_withdrawal": 2,
+    "unknown_refid": 1,
+}
+
+
+class LedgerGenerator:
+
+    def __init__(self, seed=0, start=datetime.datetime(2020, 1, 1)):
+        self._random = random.Random(seed)
+        self._time = start
+        self._balances = {}
+        self._prices = {symbol: price for symbol, price, _ in CRYPTO_ASSETS.values()}
+        self._prices.update({"ATOM": 10.0, "TRX": 0.07})
+        self.start = start
+
+    def _id(self, prefix, lengths):
+        alphabet = string.ascii_uppercase + string.digits
+        return prefix + "-".join("".join(self._random.choice(alphabet) for _ in range(n)) for n in lengths)
+
+    def _txid(self):
+        return self._id("L", [5, 5, 6])
+
+    def _refid(self, prefix):
+        return self._id(prefix, [6, 6, 6])
+
+    def _advance(self, max_seconds=1800):
+        self._time += datetime.timedelta(seconds=self._random.randint(1, max_seconds))
+        return self._time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _advance_same_day(self, max_seconds):
+        """Like _advance, but never past the end of the current day"""
+        end_of_day = self._time.replace(hour=23, minute=59, second=59)
+        self._time = min(self._time + datetime.timedelta(seconds=self._random.randint(1, max_seconds)), end_of_day)
+        return self._time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _amount(self, low, high, decimals=8):
+        return round(self._random.uniform(low, high), decimals)
+
+    def _row(self, txid, refid, time, type, asset, amount, fee=0.0, subtype=""):
+        balance = ""
+        if txid:
+            balance = round(self._balances.get(asset, 0.0) + amount - fee, 10)
+            self._balances[asset] = balance
+        return {"txid": txid, "refid": refid, "time": time, "type": type, "subtype": subtype, "aclass": "currency",
+                "asset": asset, "amount": amount, "fee": fee, "balance": balance}
+
+    def _dup(self, refid, type, asset, amount, fee=0.0):
+        """Deposits and withdrawals: pending first leg without txid, booked second leg"""
+        return [self._row("", refid, self._advance(), type, asset, amount, fee),
+                self._row(self._txid(), refid, self._advance(3600), type, asset, amount, fee)]
+
+    def _crypto(self):
+        return self._random.choice(list(CRYPTO_ASSETS))
+
+    def _staking_asset(self):
+        return self._random.choice(list(STAKING_ASSETS))
+
+    def fiat_deposit(self):
+        return self._dup(self._refid("Q"), "deposit", FIAT, self._amount(50, 5000, 4))
+
+    def crypto_deposit(self):
+        asset = self._crypto()
+        return self._dup(self._refid("Q"), "deposit", asset, self._amount(0.01, 2, 8))
+
+    def fiat_withdrawal(self):
+        return self._dup(self._refid("A"), "withdrawal", FIAT, -self._amount(50, 1000, 4), 0.09)
+
+    def crypto_withdrawal(self):
+        asset = self._crypto()
+        return self._dup(self._refid("A"), "withdrawal", asset, -self._amount(0.01, 0.5, 8), self._amount(0.0001, 0.005, 8))
+
+    def _trade(self, is_buy, crypto_fee=False, types=("trade", "trade")):
+        asset = self._crypto()
+        symbol, _, decimals = CRYPTO_ASSETS[asset]
+        self._prices[symbol] *= self._random.uniform(0.97, 1.03)
+        fiat = self._amount(10, 2000, 4)
+        crypto = round(fiat / self._prices[symbol], decimals)
+        refid = self._refid("T")
+        time = self._advance()
+        sign = -1 if is_buy else 1
+        fiat_fee = 0.0 if crypto_fee else round(fiat * 0.0026, 4)
+        crypto_fee_amount = round(crypto * 0.0026, decimals) if crypto_fee else 0.0
+        return [self._row(self._txid(), refid, time, types[0], FIAT, sign * fiat, fiat_fee),
+                self._row(self._txid(), refid, time, types[1], asset, -sign * crypto, crypto_fee_amount)]
+
+    def buy(self):
+        return self._trade(True)
+
+    def sell(self):
+        return self._trade(False)
+
+    def buy_crypto_fee(self):
+        return self._trade(True, crypto_fee=True)
+
+    def spend_receive(self):
+        return self._trade(True, crypto_fee=False, types=("spend", "receive"))
+
+    def staking_with_deposit(self):
+        asset = self._staking_asset()
+        amount = self._amount(0.0001, 0.05, 8)
+        # Kraken books the reward twice on the same day, with different refids
+        return [self._row("", self._refid("R"), self._advance(), "deposit", asset, amount),
+                self._row(self._txid(), self._refid("S"), self._advance_same_day(600), "staking", asset, amount)]
+
+    def staking(self):
+        return [self._row(self._txid(), self._refid("S"), self._advance(), "staking", self._staking_asset(), self._amount(0.0001, 0.05, 8))]
+
+    def earn(self):
+        return [self._row(self._txid(), self._refid("E"), self._advance(), "earn", self._staking_asset(), self._amount(0.0001, 0.05, 8))]
+
+    def staking_transfer(self):
+        return [self._row(self._txid(), self._refid("B"), self._advance(), "transfer", self._staking_asset(),
+                          self._amount(0.1, 10, 8), subtype=self._random.choice(STAKING_SUBTYPES))]
+
+    def unknown_refid(self):
+        """Kraken bug: refid "Unknown", a pair cancelling itself out plus a real transfer"""
+        asset = self._staking_asset()
+        amount = self._amount(0.1, 10, 8)
+        time = self._advance()
+        return [self._row(self._txid(), "Unknown", time, "transfer", asset, amount, subtype="spottostaking"),
+                self._row(self._txid(), "Unknown", time, "transfer", asset, -amount, subtype="stakingfromspot"),
+                self._row(self._txid(), "Unknown", self._advance(60), "transfer", asset, self._amount(0.1, 10, 8), subtype="spottostaking")]
+
+    def generate(self, rows):
+        """Returns roughly `rows` ledger rows (whole patterns only), sorted by time"""
+        patterns = list(PATTERNS)
+        weights = [PATTERNS[pattern] for pattern in patterns]
+        result = []
+        while len(result) < rows:
+            pattern = self._random.choices(patterns, weights)[0]
+            result.extend(getattr(self, pattern)())
+        result.sort(key=lambda row: row["time"])
+        return result
+
+    def symbols(self):
+        return sorted(set(symbol for symbol, _, _ in CRYPTO_ASSETS.values()) | set(STAKING_ASSETS.values()))
+
+    def generate_rates(self, start_date, end_date, fiat_currency="EUR"):
+        """Returns PP "all historic rates" rows (header first) covering start_date..end_date"""
+        symbols = self.symbols()
+        prices = {symbol: self._prices.get(symbol, 1.0) for symbol in symbols}
+        rows = [["Datum"] + [f"{symbol}-{fiat_currency}" for symbol in symbols]]
+        day = start_date
+        while day <= end_date:
+            for symbol in symbols:
+                prices[symbol] *= self._random.uniform(0.95, 1.05)
+            rows.append([day.strftime("%Y-%m-%d")] + [prices[symbol] for symbol in symbols])
+            day += datetime.timedelta(days=1)
+        return rows
+
+
+def write_ledger_csv(filename, rows):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, LEDGER_COLUMNS, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _format_german(value):
+    return f"{value:,.4f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def write_rates_csv(filename, rows):
+    """Writes rates like PP's German CSV export (';' separated, ',' decimals, '.' thousands)"""
+    with open(filename, "w") as f:
+        f.write(";".join(rows[0]) + "\n")
+        for row in rows[1:]:
+            f.write(";".join([row[0]] + [_format_german(value) for value in row[1:]]) + "\n")
+
+
+def generate_files(rows, ledger_file, rates_file, seed=0):
+    generator = LedgerGenerator(seed)
+    ledger = generator.generate(rows)
+    write_ledger_csv(ledger_file, ledger)
+
+    first_day = datetime.datetime.strptime(ledger[0]["time"][:10], "%Y-%m-%d")
+    last_day = datetime.datetime.strptime(ledger[-1]["time"][:10], "%Y-%m-%d")
+    write_rates_csv(rates_file, generator.generate_rates(first_day, last_day))
+    return len(ledger)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Kraken ledger and a matching PP rates export.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("ledger_file")
+    parser.add_argument("rates_file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"{generate_files(args.rows, args.ledger_file, args.rates_file, args.seed)} rows written")
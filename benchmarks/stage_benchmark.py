@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Stage-level benchmark of the conversion pipeline on synthetic ledgers
+
+Times every stage of a real conversion with the StageProfiler of
+LedgerProcessor (load, parse_group, process, rate_lookup, render, write) and
+optionally memory-profiles them (tracemalloc peak, a second and slower run).
+Every size runs in its own subprocess with a timeout. Results are compared to
+stored baselines and the exit code is 1 on regressions.
+
+The defaults (10k and 100k rows, no memory run) take seconds and suit CI,
+1M rows take about a minute and are tracked in the baselines as well.
+
+Run from the project root:
+    python -m benchmarks.stage_benchmark [--sizes 10000,100000,1000000] [--memory] [--save-baseline]
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.ledger_generator import generate_files
+from src.profiler import StageProfiler
+
+# stages of StageProfiler in a conversion, rate_lookup is part of process
+STAGES = ["load_rates", "load_i18n", "load", "parse_group", "process", "rate_lookup", "render", "write"]
+DEFAULT_BASELINE_FILE = Path(__file__).parent / "baselines.json"
+
+
+class _MemoryStageProfiler(StageProfiler):
+    """StageProfiler that also records the tracemalloc peak of every outermost stage"""
+
+    def __init__(self):
+        super().__init__()
+        self.peaks = {}
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # nested stages (rate_lookup within process) must not reset the peak of the outer one
+        outermost = self._depth == 0
+        if outermost:
+            tracemalloc.reset_peak()
+        self._depth += 1
+        try:
+            with super().stage(name):
+                yield
+        finally:
+            self._depth -= 1
+            if outermost:
+                peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                self.peaks[name] = max(self.peaks.get(name, 0.0), peak)
+
+
+def run_stages(ledger_file, rates_file, out_dir, memory=False):
+    """
+    Runs one conversion with the stage profiler of LedgerProcessor and the rate provider,
+    returns {stage: {"seconds": .., "calls": .., "peak_mb": ..}, "rows": .., "groups": ..}
+    """
+    from src.ledger_processor import LedgerProcessor
+    from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+
+    if memory:
+        tracemalloc.start()
+    profiler = _MemoryStageProfiler() if memory else StageProfiler()
+
+    rate_provider = PortfolioPerformanceRateProvider(rates_file, profiler=profiler)
+    # unhandled groups are printed, which is not part of the measured work
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        lp = LedgerProcessor(filename=ledger_file, rate_provider=rate_provider, profiler=profiler,
+                             depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+    lp.store_transactions(out_dir)
+
+    report = profiler.report()
+    results = {name: dict(stage) for name, stage in report["stages"].items()}
+    if memory:
+        tracemalloc.stop()
+        for name, peak in profiler.peaks.items():
+            results[name]["peak_mb"] = peak
+    results["rows"] = report["counters"].get("rows", 0)
+    results["groups"] = report["counters"].get("groups", 0)
+    return results
+
+
+def _run_size_in_subprocess(size, seed, work_dir, timeout, memory):
+    ledger_file = os.path.join(work_dir, f"ledger_{size}_{seed}.csv")
+    rates_file = os.path.join(work_dir, f"rates_{size}_{seed}.csv")
+    if not (os.path.isfile(ledger_file) and os.path.isfile(rates_file)):
+        generate_files(size, ledger_file, rates_file, seed)
+
+    command = [sys.executable, "-m", "benchmarks.stage_benchmark", "--run", ledger_file, rates_file, work_dir]
+    if memory:
+        command.append("--run-memory")
+    try:
+        process = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                 cwd=Path(__file__).parents[1])
+    except subprocess.TimeoutExpired:
+        return {"error": f"timeout after {timeout}s"}
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"exit code {process.returncode}"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(sizes, seed=0, work_dir=None, timeout=600, memory=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = work_dir or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        for size in sizes:
+            print(f"Running {size} rows ...", file=sys.stderr)
+            result = _run_size_in_subprocess(size, seed, work_dir, timeout, memory=False)
+            if memory and "error" not in result:
+                memory_result = _run_size_in_subprocess(size, seed, work_dir, timeout * 3, memory=True)
+                for stage in STAGES:
+                    if "peak_mb" in memory_result.get(stage, {}):
+                        result[stage]["peak_mb"] = memory_result[stage]["peak_mb"]
+            results[str(size)] = result
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Returns a list of regression messages (slower than tolerance * baseline and by more than 50ms)"""
+    regressions = []
+    for size, result in results.items():
+        if size not in baseline or "error" in baseline[size]:
+            continue
+        if "error" in result:
+            regressions.append(f"{size} rows: {result['error']}")
+            continue
+        for stage in STAGES:
+            observed = result.get(stage, {}).get("seconds")
+            expected = baseline[size].get(stage, {}).get("seconds")
+            if observed is None or expected is None:
+                continue
+            if observed > expected * tolerance and observed - expected > 0.05:
+                regressions.append(f"{size} rows, {stage}: {observed:.3f}s (baseline {expected:.3f}s)")
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'rows':>9} {'stage':<12} {'seconds':>10} {'peak MB':>9}"]
+    for size, result in results.items():
+        if "error" in result:
+            lines.append(f"{size:>9} {result['error']}")
+            continue
+        for stage in STAGES:
+            stage_result = result.get(stage, {})
+            peak = stage_result.get("peak_mb")
+            peak = f"{peak:9.1f}" if peak is not None else f"{'-':>9}"
+            lines.append(f"{size:>9} {stage:<12} {stage_result.get('seconds', 0):10.3f} {peak}")
+        lines.append(f"{size:>9} {'groups':<12} {result['groups']:>10}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level benchmark on synthetic Kraken ledgers.")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=600, help="Seconds per size before it is reported as timeout")
+    parser.add_argument("--work-dir", help="Keep generated ledgers here (def=temporary directory)")
+    parser.add_argument("--memory", action="store_true", help="Add a tracemalloc pass for the peak memory per stage")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE_FILE))
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown factor against the baseline")
+    parser.add_argument("--run", nargs=3, metavar=("LEDGER", "RATES", "OUT_DIR"), help=argparse.SUPPRESS)
+    parser.add_argument("--run-memory", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_stages(*args.run, memory=args.run_memory)))
+        return 0
+
+    results = run_benchmark(args.sizes, args.seed, args.work_dir, args.timeout, args.memory)
+    print(format_results(results))
+
+    if args.save_baseline:
+        # sizes that were not run keep their baseline
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline stored in {args.baseline}")
+        return 0
+
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,10 +5,16 @@ CLI adapter for LedgerProcessor
 Copyright 2022-05-16 AlexanderLill
 """
 import argparse
+import contextlib
+import datetime
 import json
+import logging
+import os
+import sys
 
-from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
-from src.ledger_processor import LedgerProcessor
+# Only lightweight modules are imported up front, so that -h and argument errors return instantly.
+# The processing modules (and with them pandas) are imported once the arguments are validated.
+# For the same reason the src modules import pandas and numpy inside the functions using them.
 
 parser = argparse.ArgumentParser(description='Parse Kraken Crypto Transactions for Portfolio Performance Import.')
 
@@ -20,8 +26,9 @@ parser.add_argument('-cm', '--currency-mapping', dest='currency_mapping', type=j
 
 
 ### Ledger Processor
-parser.add_argument('kraken_csv_file', metavar='KRAKEN_CSV_FILE', type=str, nargs='?',
-                    help='kraken ledger export csv file')
+parser.add_argument('kraken_csv_files', metavar='KRAKEN_CSV_FILE', type=str, nargs='*',
+                    help="kraken ledger export csv file, several overlapping exports are merged and deduplicated "
+                         "('-' reads rows from stdin and streams the output)")
 parser.add_argument('-fc', '--fiat-currency', dest="fiat_currency", help='define base currency (def=EUR)', default='EUR')
 parser.add_argument('-ir', '--ignore-refids', dest='refids_to_ignore', type=str, help="Comma-separated list of refids to ignore while processing", default="")
 parser.add_argument('-o', '--out-dir', dest='out_dir', type=str, help='Directory to store PP transactions in (def=cwd)', default='.')
@@ -30,29 +37,227 @@ parser.add_argument('-dn', '--depot-new', dest='depot_new', type=str, help="Name
 parser.add_argument('-a', '--account', dest='account', type=str, help="Name of account (def=ACCOUNT)", default="ACCOUNT")
 parser.add_argument('-v', '--verbose', dest='verbose', action='store_true', help='Activate verbose mode')
 parser.add_argument('-l', '--language', dest='language', type=str, help='Language for output (en/de, def=de)', default='de')
+parser.add_argument('--from', dest='date_from', type=lambda value: datetime.date.fromisoformat(value).isoformat(), metavar='YYYY-MM-DD',
+                    help='Only convert transactions from this day on (groups crossing the day are kept complete)')
+parser.add_argument('--to', dest='date_to', type=lambda value: datetime.date.fromisoformat(value).isoformat(), metavar='YYYY-MM-DD',
+                    help='Only convert transactions up to this day (inclusive)')
+parser.add_argument('--assets', dest='assets', type=lambda value: [asset for asset in value.split(",") if asset], metavar='ASSET,...',
+                    help='Only convert transactions of these assets (Kraken or PP names, e.g. XXBT or XBT)')
+parser.add_argument('--asset-mapping', dest='asset_mapping', type=str, metavar='JSON_FILE',
+                    help='JSON object with additional Kraken asset code -> PP name mappings, e.g. {"ETH2.S": "ETH"}')
+parser.add_argument('-c', '--compress', dest='compress', choices=['gz', 'zst'], help='Compress the three output CSVs (.gz/.zst)')
+parser.add_argument('--frames', dest='frames_format', choices=['parquet', 'feather', 'arrow'],
+                    help='Also write the three tables with typed columns (numbers stay numbers) as Parquet/Feather/Arrow IPC files, '
+                         'needs pyarrow')
+parser.add_argument('--aggregate-trades', dest='aggregate_trades', type=float, metavar='SECONDS',
+                    help='Book the trade fills of one asset and side within SECONDS (after the first fill) as one transaction')
+parser.add_argument('--staking-rollup', dest='staking_rollup', type=str, metavar='PERIODS',
+                    help="Book staking/earn rewards as one delivery per asset and period: daily, weekly or monthly, "
+                         "optionally per asset, e.g. 'monthly,DOT=weekly' (PP names)")
+parser.add_argument('--staking-rollup-valuation', dest='staking_rollup_valuation', choices=['sum', 'period_end'], default='sum',
+                    help='Value a rolled-up delivery with the sum of the reward values or with the rate of its day (def=sum)')
+parser.add_argument('--balance-check', dest='balance_check', choices=['off', 'warn', 'strict'], default='warn',
+                    help="Compare Kraken's balance column with the replayed amounts before converting, "
+                         "'strict' aborts on a mismatch (def=warn)")
+parser.add_argument('--rate-check', dest='rate_check', choices=['off', 'strict', 'mark'], default='strict',
+                    help="Check that PP_RATES_FILE has all needed rates before converting (not when streaming) and report every gap, "
+                         "'mark' converts anyway and books the affected transactions without rates (def=strict)")
+parser.add_argument('--gains-report', dest='gains_report', type=str, metavar='OUT_CSV',
+                    help='Write the realized gains of all sales (FIFO lots, one-year holding period) to this file, needs PP_RATES_FILE')
+parser.add_argument('--daily-values', dest='daily_values', type=str, metavar='OUT_FILE',
+                    help='Write the value of the holdings per asset and in total at the end of each day (CSV, or Parquet for *.parquet), '
+                         'needs PP_RATES_FILE')
+parser.add_argument('--rules', dest='rules', type=str, metavar='RULES_FILE',
+                    help='JSON/YAML/CSV file with rules ignoring ledger rows (by refid, txid, asset, type/subtype, date range) '
+                         'or forcing their groups into a handler, e.g. [{"action": "ignore", "txid": "..."}]')
+parser.add_argument('--cache-dir', dest='cache_dir', type=str,
+                    help='Keep the grouped ledger here, re-runs with other depot/account/language options skip reading and grouping')
+parser.add_argument('--diagnostics-file', dest='diagnostics_file', type=str, metavar='OUT_JSONL',
+                    help='Write every unhandled/ignored transaction group as JSON Lines to this file')
+parser.add_argument('--stats', dest='stats', action='store_true',
+                    help='Only print statistics of the ledger (rows per type/asset, groups per handler, unknown cases) as JSON, '
+                         'without converting or loading rates')
+parser.add_argument('--profile', dest='profile', type=str, metavar='OUT_JSON', help='Write stage timings and counters as JSON to this file')
+
+### Streaming (KRAKEN_CSV_FILE is '-')
+parser.add_argument('-if', '--input-format', dest='input_format', choices=['csv', 'jsonl'], help='Format of the ledger rows read from stdin (def=csv)', default='csv')
+parser.add_argument('--fifos', dest='fifos', type=str, nargs=3, metavar=('DEPOT_NORMAL', 'DEPOT_SPECIAL', 'ACCOUNT'),
+                    help='Write the three outputs to these files/named pipes instead of a tagged stream on stdout')
+parser.add_argument('--window-days', dest='window_days', type=int, help='Days a group may span before it is emitted (def=1)', default=1)
+
+args = parser.parse_intermixed_args()
 
-args = parser.parse_args()
+# diagnostics are logged to stderr, verbose mode adds the informational summaries
+logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(levelname)s: %(message)s")
 
 if args.verbose:
     print(args)
 
-if args.pp_rates_file:
+if not args.kraken_csv_files:
+    parser.error("KRAKEN_CSV_FILE is required")
+streaming = args.kraken_csv_files == ["-"]
+for input_file in [args.pp_rates_file, args.asset_mapping] + ([] if streaming else args.kraken_csv_files):
+    if input_file and not os.path.isfile(input_file):
+        parser.error(f"file not found: {input_file}")
+if streaming and (args.date_from or args.date_to or args.assets):
+    parser.error("--from, --to and --assets are not supported when streaming from stdin")
+if args.gains_report and (streaming or not args.pp_rates_file):
+    parser.error("--gains-report needs PP_RATES_FILE and is not supported when streaming from stdin")
+if args.gains_report and args.rate_check == 'mark':
+    parser.error("--gains-report needs the value of every transaction, it cannot be combined with --rate-check mark")
+if args.daily_values and (streaming or not args.pp_rates_file):
+    parser.error("--daily-values needs PP_RATES_FILE and is not supported when streaming from stdin")
+if args.stats and (streaming or args.gains_report or args.daily_values or args.frames_format):
+    parser.error("--stats cannot be combined with streaming from stdin, --gains-report, --daily-values or --frames")
+if streaming and args.frames_format:
+    parser.error("--frames is not supported when streaming from stdin")
+if streaming and (args.aggregate_trades is not None or args.staking_rollup or args.rules):
+    parser.error("--aggregate-trades, --staking-rollup and --rules are not supported when streaming from stdin")
+if args.staking_rollup:
+    from src.staking_rollup import parse_periods
+    try:
+        staking_periods = parse_periods(args.staking_rollup)
+    except ValueError as e:
+        parser.error(str(e))
+if args.daily_values and (args.date_from or args.assets):
+    parser.error("--daily-values needs the complete ledger, it cannot be combined with --from and --assets")
+if not streaming and not os.path.isdir(args.out_dir):
+    parser.error(f"output directory not found: {args.out_dir}")
+
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.ledger_processor import IllegalArgumentError, LedgerProcessor
+from src.balance_check import BalanceMismatchError
+from src.rate_coverage import RateCoverageError
+from src.diagnostics import Diagnostics
+
+diagnostics = Diagnostics(args.diagnostics_file)
+
+profiler = None
+if args.profile:
+    from src.profiler import StageProfiler
+    profiler = StageProfiler()
+
+asset_normalizer = None
+if args.asset_mapping:
+    from src.assets import AssetNormalizer
+    asset_normalizer = AssetNormalizer.from_file(args.asset_mapping)
+
+rules = None
+if args.rules:
+    from src.ledger_rules import LedgerRules
+    try:
+        rules = LedgerRules.from_file(args.rules, asset_normalizer)
+    except (OSError, ValueError, ImportError) as e:
+        parser.error(f"invalid rules file {args.rules}: {e}")
+
+# partial conversions only load the rates of their days and assets
+rate_date_from, rate_date_to, rate_currencies = None, None, None
+if args.date_from or args.date_to or args.assets:
+    from src.ledger_filter import LedgerFilter
+    ledger_filter = LedgerFilter(args.date_from, args.date_to, args.assets, asset_normalizer)
+    rate_date_from, rate_date_to = ledger_filter.rate_range()
+    rate_currencies = ledger_filter.normalized_assets()
+
+if args.pp_rates_file and not args.stats:
     rate_provider = PortfolioPerformanceRateProvider(args.pp_rates_file,
                                                      currency_mapping=args.currency_mapping,
                                                      fiat_currency=args.fiat_currency,
-                                                     language=args.language)
+                                                     language=args.language,
+                                                     profiler=profiler,
+                                                     date_from=rate_date_from,
+                                                     date_to=rate_date_to,
+                                                     currencies=rate_currencies)
 else:
     rate_provider = None
 
-lp = LedgerProcessor(filename=args.kraken_csv_file,
-                     rate_provider=rate_provider,
-                     fiat_currency=args.fiat_currency,
-                     refids_to_ignore=args.refids_to_ignore,
-                     depot_current=args.depot_old,
-                     depot_new=args.depot_new,
-                     account=args.account,
-                     language=args.language)
-
-lp.store_depot_normal_transactions(f"{args.out_dir}/transactions_normal_depot.csv")
-lp.store_depot_special_transactions(f"{args.out_dir}/transactions_special_depot.csv")
-lp.store_account_transactions(f"{args.out_dir}/transactions_account.csv")
+staking_rollup = None
+if args.staking_rollup:
+    from src.staking_rollup import StakingRollup
+    staking_rollup = StakingRollup(*staking_periods, valuation=args.staking_rollup_valuation, rate_provider=rate_provider)
+
+if streaming:
+    from src.stream_processor import StreamProcessor, read_csv_rows, read_jsonl_rows
+
+    if args.fifos:
+        outputs = {kind: open(filename, "w") for kind, filename in zip(StreamProcessor.KINDS, args.fifos)}
+    else:
+        outputs = sys.stdout
+
+    # stdout carries the converted rows, so diagnostics go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        sp = StreamProcessor(outputs,
+                             rate_provider=rate_provider,
+                             fiat_currency=args.fiat_currency,
+                             refids_to_ignore=args.refids_to_ignore,
+                             depot_current=args.depot_old,
+                             depot_new=args.depot_new,
+                             account=args.account,
+                             language=args.language,
+                             window_days=args.window_days,
+                             diagnostics=diagnostics)
+        reader = read_jsonl_rows if args.input_format == "jsonl" else read_csv_rows
+        sp.process(reader(sys.stdin))
+
+    if args.fifos:
+        for output in outputs.values():
+            output.close()
+else:
+    try:
+        lp = LedgerProcessor(filename=args.kraken_csv_files[0] if len(args.kraken_csv_files) == 1 else args.kraken_csv_files,
+                             rate_provider=rate_provider,
+                             fiat_currency=args.fiat_currency,
+                             refids_to_ignore=args.refids_to_ignore,
+                             depot_current=args.depot_old,
+                             depot_new=args.depot_new,
+                             account=args.account,
+                             language=args.language,
+                             profiler=profiler,
+                             diagnostics=diagnostics,
+                             cache_dir=args.cache_dir,
+                             date_from=args.date_from,
+                             date_to=args.date_to,
+                             assets=args.assets,
+                             asset_normalizer=asset_normalizer,
+                             balance_check=None if args.balance_check == 'off' else args.balance_check,
+                             aggregate_trades=args.aggregate_trades,
+                             staking_rollup=staking_rollup,
+                             rules=rules,
+                             rate_check=None if args.rate_check == 'off' else args.rate_check,
+                             dry_run=args.stats)
+    except BalanceMismatchError as e:
+        sys.exit(f"error: {e} (see the warnings above, --balance-check warn converts anyway)")
+    except RateCoverageError as e:
+        sys.exit(f"error: {e}" if args.gains_report else f"error: {e}\n(--rate-check mark converts anyway)")
+    except IllegalArgumentError as e:
+        sys.exit(f"error: {e}")
+
+    if args.stats:
+        print(json.dumps(lp.stats(), indent=2))
+    else:
+        lp.store_transactions(args.out_dir, compression=args.compress)
+        if args.frames_format:
+            try:
+                lp.store_frames(args.out_dir, args.frames_format)
+            except ImportError as e:
+                sys.exit(f"error: {e}")
+        diagnostics.log_summary()
+
+        if args.gains_report:
+            from src.lot_engine import FifoLotEngine
+            lot_engine = FifoLotEngine.for_processor(lp)
+            lot_engine.process(lp.depot_transactions)
+            lot_engine.store_report(args.gains_report)
+
+        if args.daily_values:
+            from src.holdings import DailyHoldings
+            from src.ledger_merge import read_ledger
+            # the holdings are replayed from the rows, independent of grouping and the group cache
+            ledger = read_ledger(args.kraken_csv_files)
+            if args.date_to:
+                ledger = ledger[ledger["time"].str[:10] <= args.date_to]
+            holdings = DailyHoldings(ledger, asset_normalizer, date_to=args.date_to,
+                                     refids_to_ignore=[refid for refid in args.refids_to_ignore.split(",") if refid], rules=rules)
+            DailyHoldings.store(holdings.values_frame(rate_provider), args.daily_values)
+
+if profiler is not None:
+    profiler.dump(args.profile)
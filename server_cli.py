@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+CLI adapter for ConversionServer (conversion daemon with warm rate provider)
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import argparse
+import json
+import os
+
+parser = argparse.ArgumentParser(description='Serve Kraken to Portfolio Performance conversions on localhost.')
+
+parser.add_argument('pp_rates_file', metavar='PP_RATES_FILE', type=str, nargs='?',
+                    help='portfolio performance rates export (reloaded when it changes)')
+parser.add_argument('-cm', '--currency-mapping', dest='currency_mapping', type=json.loads)
+parser.add_argument('-fc', '--fiat-currency', dest="fiat_currency", help='define base currency (def=EUR)', default='EUR')
+parser.add_argument('-l', '--language', dest='language', type=str, help='Language for output (en/de, def=de)', default='de')
+parser.add_argument('-H', '--host', dest='host', type=str, help='Address to listen on (def=127.0.0.1)', default='127.0.0.1')
+parser.add_argument('-p', '--port', dest='port', type=int, help='Port to listen on (def=8765)', default=8765)
+parser.add_argument('-v', '--verbose', dest='verbose', action='store_true', help='Activate verbose mode')
+
+args = parser.parse_args()
+
+if args.pp_rates_file and not os.path.isfile(args.pp_rates_file):
+    parser.error(f"file not found: {args.pp_rates_file}")
+
+from src.conversion_server import ConversionServer, ConversionService, ReloadingRateProvider
+
+rate_provider = None
+if args.pp_rates_file:
+    rate_provider = ReloadingRateProvider(args.pp_rates_file,
+                                          currency_mapping=args.currency_mapping,
+                                          fiat_currency=args.fiat_currency,
+                                          language=args.language)
+    rate_provider.current()  # load before the first request
+
+service = ConversionService(rate_provider=rate_provider, fiat_currency=args.fiat_currency, language=args.language)
+server = ConversionServer(service, host=args.host, port=args.port, verbose=args.verbose)
+
+print(f"Serving conversions on {server.url} (POST /convert, GET /health)")
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
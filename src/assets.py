@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Asset name normalization
+
+Maps Kraken asset codes to the names used in PP (and in the PP rate export
+columns): legacy codes like XXBT or ZEUR lose their X/Z prefix, staking and
+earn variants (DOT.S, ETH2.S, XBT.M, SOL.F, ...) lose their suffix. Only the
+legacy codes listed in KRAKEN_LEGACY_CODES are shortened, so tickers like
+XTZ, XRP or ZRX stay as they are. Results are memoized per code.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+
+# Kraken asset codes from before the switch to plain tickers
+KRAKEN_LEGACY_CODES = {
+    "XXBT": "XBT",
+    "XETH": "ETH",
+    "XETC": "ETC",
+    "XLTC": "LTC",
+    "XMLN": "MLN",
+    "XREP": "REP",
+    "XXDG": "XDG",
+    "XXLM": "XLM",
+    "XXMR": "XMR",
+    "XXRP": "XRP",
+    "XZEC": "ZEC",
+    "XICN": "ICN",
+    "XNMC": "NMC",
+    "XXVN": "XVN",
+    "XDAO": "DAO",
+    "ZEUR": "EUR",
+    "ZUSD": "USD",
+    "ZGBP": "GBP",
+    "ZCAD": "CAD",
+    "ZJPY": "JPY",
+    "ZAUD": "AUD",
+    "ZKRW": "KRW",
+}
+
+
+class AssetNormalizer:
+
+    def __init__(self, mapping=None):
+        """mapping: additional/overriding Kraken code -> PP name entries (exact codes, suffixes included)"""
+        self._mapping = dict(mapping or {})
+        self._table = dict(KRAKEN_LEGACY_CODES)
+        self._table.update(self._mapping)
+        self._memo = {}
+
+    @classmethod
+    def from_file(cls, filename):
+        """Loads the additional mapping from a JSON object file, e.g. {"ETH2.S": "ETH", "XTZ": "XTZ"}"""
+        with open(filename, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __repr__(self):
+        return f"AssetNormalizer({json.dumps(self._mapping, sort_keys=True)})"
+
+    def _lookup(self, code):
+        if code in self._table:
+            return self._table[code]
+        if "." in code:
+            base = code.split(".")[0]
+            return self._table.get(base, base)
+        return code
+
+    def normalize(self, code):
+        name = self._memo.get(code)
+        if name is None:
+            name = self._memo[code] = self._lookup(code)
+        return name
+
+    def normalize_column(self, assets):
+        """normalize() for a pandas Series, evaluated once per distinct code"""
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = pd.factorize(assets)
+        # the appended None is picked by code -1 (missing values)
+        names = np.array([self.normalize(code) for code in uniques] + [None], dtype=object)
+        return pd.Series(names[codes], index=assets.index)
+
+
+DEFAULT_NORMALIZER = AssetNormalizer()
+
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Balance reconciliation module
+
+Every Kraken ledger row carries the balance of its asset after the row. The
+reconciler replays amount - fee per asset in time order (one groupby-cumsum)
+and compares the running sum to that column, so missing rows, duplicated rows
+or wrong amounts are found before the conversion instead of as wrong holdings
+in PP. For each asset the first divergence is reported with the refids of the
+surrounding rows. Sums are computed in fixed-point units, so they are exact.
+
+Exports need not start with the account: the running sum of each asset starts
+at the balance of its first row.
+
+Deposits and withdrawals appear twice: a pending row without txid and
+balance, and the settled row that changes the balance. Only the settled row
+is replayed (see pending_rows).
+
+Copyright 2022-05-16 AlexanderLill
+"""
+from .assets import DEFAULT_NORMALIZER
+from .fixed_point import column_to_units, from_units
+
+
+class BalanceMismatchError(ValueError):
+    pass
+
+
+def pending_rows(df):
+    """Boolean Series: pending deposit/withdrawal rows (empty txid and balance), repeated by their settled row"""
+    import pandas as pd
+
+    if "txid" not in df or "balance" not in df:
+        return pd.Series(False, index=df.index)
+    no_txid = df["txid"].isna() | (df["txid"].astype(str).str.strip() == "")
+    no_balance = pd.to_numeric(df["balance"], errors="coerce").isna()
+    return no_txid & no_balance
+
+
+def _replay_frame(df):
+    """Settled rows -> DataFrame (time, asset, delta, balance, has_balance), amounts in fixed-point units"""
+    import pandas as pd
+
+    df = df[~pending_rows(df)]
+    balance = pd.to_numeric(df["balance"], errors="coerce")
+    return pd.DataFrame({
+        "time": df["time"].astype(str),
+        "asset": df["asset"].astype(str),
+        "delta": column_to_units(pd.to_numeric(df["amount"], errors="coerce"))
+                 - column_to_units(pd.to_numeric(df["fee"], errors="coerce")),
+        "balance": column_to_units(balance),
+        "has_balance": balance.notna().to_numpy(),
+    }, index=df.index)
+
+
+def _replay(assets_sorted, delta, balances, has_balance):
+    """
+    Rows sorted by asset and time -> (block of each row, first position of each block, running sum of each row within
+    its block, start of each block: the balance before its first row, derived from its first row with balance)
+    """
+    import numpy as np
+
+    # the units may be int64 or Python ints (object arrays, see fixed_point), so the running sums per asset are
+    # plain numpy cumsums over the asset blocks
+    new_block = np.r_[True, assets_sorted[1:] != assets_sorted[:-1]]
+    block_start_positions = np.flatnonzero(new_block)
+    blocks = np.cumsum(new_block) - 1
+    cumulated = np.cumsum(delta)
+    running = cumulated - (cumulated - delta)[block_start_positions][blocks]
+
+    balance_positions = np.flatnonzero(has_balance)
+    balance_blocks = blocks[balance_positions]
+    first_balances = balance_positions[np.r_[True, balance_blocks[1:] != balance_blocks[:-1]][:len(balance_positions)]]
+    start = np.zeros(len(block_start_positions), dtype=running.dtype)
+    start[blocks[first_balances]] = balances[first_balances] - running[first_balances]
+    return blocks, block_start_positions, running, start
+
+
+def opening_balances(df):
+    """
+    {Kraken asset: units} held before the first row of each asset: the balance of its first row with balance minus
+    amount - fee of the rows up to it (exports need not start with the account), 0 for assets without balances
+    """
+    if df is None or len(df) == 0 or "balance" not in df:
+        return {}
+    # stable sort: rows of one timestamp keep the order of the export
+    frame = _replay_frame(df).sort_values(["asset", "time"], kind="stable")
+    if len(frame) == 0:
+        return {}
+    assets_sorted = frame["asset"].to_numpy()
+    _, block_start_positions, _, start = _replay(assets_sorted, frame["delta"].to_numpy(), frame["balance"].to_numpy(),
+                                                 frame["has_balance"].to_numpy())
+    return dict(zip(assets_sorted[block_start_positions], start))
+
+
+class BalanceDivergence:
+    """First row of an asset whose balance differs from the replayed amounts"""
+
+    def __init__(self, asset, time, refid, txid, expected, balance, context_refids, row):
+        self.asset = asset
+        self.time = time
+        self.refid = refid
+        self.txid = txid
+        self.expected = expected
+        self.balance = balance
+        self.context_refids = context_refids  # refids of the rows around it (same asset, time order)
+        self.row = row  # index of the row in the ledger DataFrame
+
+    def __str__(self):
+        return (f"{self.asset}: balance {self.balance} at {self.time} (refid {self.refid}, txid {self.txid}) "
+                f"differs from the replayed {self.expected} by {self.balance - self.expected}, "
+                f"surrounding refids: {', '.join(self.context_refids)}")
+
+
+class BalanceReconciler:
+
+    def __init__(self, context_rows=2, tolerance_units=0):
+        """
+        context_rows: rows before and after a divergence whose refids are reported
+        tolerance_units: accepted difference in units of 1e-10 (sums are exact, see fixed_point)
+        """
+        self._context_rows = context_rows
+        self._tolerance_units = tolerance_units
+
+    def reconcile(self, df, assets=None, asset_normalizer=None):
+        """
+        Returns a BalanceDivergence per asset whose balances do not match (ordered by time), [] when all match.
+        assets: only check these assets (Kraken or PP names), e.g. when the ledger holds only their rows completely.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if df is None or len(df) == 0 or "balance" not in df:
+            return []
+        df = df[~pending_rows(df)]
+        frame = _replay_frame(df)
+        if assets is not None:
+            normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+            assets = set(assets)
+            frame = frame[frame["asset"].isin(assets) | normalizer.normalize_column(frame["asset"]).isin(assets)]
+
+        # stable sort: rows of one timestamp keep the order of the export
+        frame = frame.sort_values(["asset", "time"], kind="stable")
+        assets_sorted = frame["asset"].to_numpy()
+        if len(frame) == 0:
+            return []
+
+        balances = frame["balance"].to_numpy()
+        has_balance = frame["has_balance"].to_numpy()
+        # the first balance of each asset is the starting point
+        blocks, block_start_positions, running, start = _replay(assets_sorted, frame["delta"].to_numpy(), balances, has_balance)
+        expected_values = running + start[blocks]
+
+        mismatch = has_balance & (np.abs(expected_values - balances) > self._tolerance_units).astype(bool)
+        if not mismatch.any():
+            return []
+
+        positions = np.flatnonzero(mismatch)
+        # first mismatching position per asset (positions are sorted by asset, then time)
+        first_positions = positions[np.r_[True, assets_sorted[positions[1:]] != assets_sorted[positions[:-1]]]]
+
+        block_sizes = np.diff(np.r_[block_start_positions, len(frame)])
+        refid_column = df["refid"] if "refid" in df else pd.Series("", index=df.index)
+        txid_column = df["txid"] if "txid" in df else pd.Series("", index=df.index)
+        refids = refid_column.reindex(frame.index).fillna("").astype(str).to_numpy()
+        txids = txid_column.reindex(frame.index).fillna("").astype(str).to_numpy()
+        times = frame["time"].to_numpy()
+
+        divergences = []
+        for position in first_positions:
+            block_start = block_start_positions[blocks[position]]
+            block_end = block_start + block_sizes[blocks[position]]
+            context = refids[max(block_start, position - self._context_rows):min(block_end, position + self._context_rows + 1)]
+            divergences.append(BalanceDivergence(assets_sorted[position], times[position], refids[position], txids[position],
+                                                 from_units(int(expected_values[position])), from_units(int(balances[position])),
+                                                 list(context), frame.index[position]))
+        return sorted(divergences, key=lambda divergence: divergence.time)
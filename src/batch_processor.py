@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+BatchProcessor module
+
+Converts many Kraken ledgers in one run, loading the rate provider and the
+translation table only once.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import glob
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .i18n import I18n
+from .ledger_processor import LedgerProcessor
+
+
+class BatchJob:
+    """One ledger of a batch, with the depot/account names and output directory to use"""
+
+    def __init__(self, ledger, out_dir, depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT", refids_to_ignore=""):
+        self.ledger = ledger
+        self.out_dir = out_dir
+        self.depot_current = depot_current
+        self.depot_new = depot_new
+        self.account = account
+        self.refids_to_ignore = refids_to_ignore
+
+
+class BatchResult:
+    def __init__(self, job, seconds, transaction_counts=None, error=None):
+        self.job = job
+        self.seconds = seconds
+        self.transaction_counts = transaction_counts or {}
+        self.error = error
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+# the rate provider and translations of a worker process, set once by _init_worker
+_worker_state = {}
+
+
+def _init_worker(rate_provider, i18n):
+    _worker_state["rate_provider"] = rate_provider
+    _worker_state["i18n"] = i18n
+
+
+def _run_in_worker(processor, job):
+    return processor._run_job(job, _worker_state["rate_provider"], _worker_state["i18n"])
+
+
+class BatchProcessor:
+    """
+    Runs LedgerProcessor for a list of BatchJobs, in worker processes when workers > 1.
+
+    Grouping is CPU-bound pure Python, so threads would not run in parallel (and
+    would share the process-wide locale that rendering sets). Each worker process
+    gets one copy of the loaded rate provider and translations when it starts,
+    with workers=1 the jobs run one after another in this process.
+    """
+
+    def __init__(self, rate_provider=None, fiat_currency="EUR", language="de", workers=4, i18n=None):
+        self._rate_provider = rate_provider
+        self._fiat_currency = fiat_currency
+        self._language = language
+        self._workers = max(1, workers)
+        self._i18n = i18n if i18n is not None else I18n(language)
+
+    def __getstate__(self):
+        # workers receive the rate provider and translations once, through _init_worker
+        state = dict(self.__dict__)
+        state["_rate_provider"] = state["_i18n"] = None
+        return state
+
+    @staticmethod
+    def jobs_from_manifest(manifest_file, **defaults):
+        """
+        Reads a JSON manifest, a list of objects like
+        {"ledger": "a/ledgers.csv", "out_dir": "out/a", "depot_old": "...", "depot_new": "...", "account": "...", "refids_to_ignore": "..."}
+        Relative paths are resolved against the directory of the manifest.
+        """
+        base_dir = Path(manifest_file).parent
+        with open(manifest_file, encoding="utf-8") as f:
+            entries = json.load(f)
+
+        jobs = []
+        for entry in entries:
+            settings = dict(defaults)
+            for key, setting in [("depot_old", "depot_current"), ("depot_new", "depot_new"),
+                                 ("account", "account"), ("refids_to_ignore", "refids_to_ignore")]:
+                if key in entry:
+                    settings[setting] = entry[key]
+            jobs.append(BatchJob(str(base_dir / entry["ledger"]), str(base_dir / entry.get("out_dir", ".")), **settings))
+        return jobs
+
+    @staticmethod
+    def jobs_from_glob(pattern, out_dir, **defaults):
+        """
+        Creates one job per matching ledger, writing to a subdirectory of out_dir named like the path of the ledger
+        below the directory all matches share, without extension: clients/*/ledgers.csv -> OUT_DIR/<client>/ledgers
+        """
+        ledgers = sorted(glob.glob(pattern))
+        if not ledgers:
+            return []
+        base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(ledger)) for ledger in ledgers])
+        return [BatchJob(ledger, str(Path(out_dir) / Path(os.path.relpath(os.path.abspath(ledger), base_dir)).with_suffix("")),
+                         **defaults)
+                for ledger in ledgers]
+
+    def _run_job(self, job, rate_provider, i18n):
+        start = time.perf_counter()
+        try:
+            lp = LedgerProcessor(filename=job.ledger,
+                                 rate_provider=rate_provider,
+                                 fiat_currency=self._fiat_currency,
+                                 refids_to_ignore=job.refids_to_ignore,
+                                 depot_current=job.depot_current,
+                                 depot_new=job.depot_new,
+                                 account=job.account,
+                                 language=self._language,
+                                 i18n=i18n)
+            os.makedirs(job.out_dir, exist_ok=True)
+            lp.store_transactions(job.out_dir)
+            counts = {key: len(value) for key, value in lp.get_transactions().items()}
+            return BatchResult(job, time.perf_counter() - start, transaction_counts=counts)
+        except Exception as e:  # a broken ledger must not stop the other conversions
+            error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+            return BatchResult(job, time.perf_counter() - start, error=error)
+
+    def run(self, jobs):
+        """Processes all jobs, returns one BatchResult per job (in the order of jobs)"""
+        out_dirs = [os.path.abspath(job.out_dir) for job in jobs]
+        collisions = sorted({out_dir for out_dir in out_dirs if out_dirs.count(out_dir) > 1})
+        if collisions:
+            raise ValueError(f"Several ledgers would be written to {', '.join(collisions)}")
+
+        if self._workers == 1 or len(jobs) <= 1:
+            return [self._run_job(job, self._rate_provider, self._i18n) for job in jobs]
+        with ProcessPoolExecutor(max_workers=min(self._workers, len(jobs)), initializer=_init_worker,
+                                 initargs=(self._rate_provider, self._i18n)) as executor:
+            return list(executor.map(_run_in_worker, [self] * len(jobs), jobs))
+
+    @staticmethod
+    def format_summary(results, verbose=False):
+        lines = []
+        for result in results:
+            if result.failed:
+                first_line = result.error.splitlines()[0]
+                lines.append(f"FAILED {result.seconds:8.3f}s  {result.job.ledger}: {first_line}")
+                if verbose:
+                    lines.append(result.error)
+            else:
+                counts = ", ".join(f"{key}={value}" for key, value in result.transaction_counts.items())
+                lines.append(f"OK     {result.seconds:8.3f}s  {result.job.ledger} -> {result.job.out_dir} ({counts})")
+
+        failed = sum(1 for result in results if result.failed)
+        total_seconds = sum(result.seconds for result in results)
+        lines.append(f"{len(results)} ledgers, {len(results) - failed} converted, {failed} failed, {total_seconds:.3f}s processing time")
+        return "\n".join(lines)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Compressed file module
+
+Opens ledgers, rate exports and output CSVs as text streams, transparently
+(de)compressing them based on the file extension: .gz, .zst (needs the optional
+zstandard package) and .zip (reading only, the archive must contain one CSV).
+Nothing is extracted to disk.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import gzip
+import io
+
+COMPRESSIONS = {"gz": ".gz", "zst": ".zst"}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading or writing .zst files needs the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+
+def _zip_member(archive):
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    csv_names = [name for name in names if name.lower().endswith(".csv")]
+    candidates = csv_names or names
+    if len(candidates) != 1:
+        raise ValueError(f"Expected exactly one CSV file in {archive.filename}, found: {', '.join(candidates) or 'none'}")
+    return candidates[0]
+
+
+def open_text(filename, mode="r", encoding="utf-8", newline=None):
+    """Like open(filename, mode) for text files, with compression chosen by the file extension"""
+    if mode not in ("r", "w"):
+        raise ValueError(f"Unsupported mode: {mode}")
+    name = str(filename).lower()
+
+    if name.endswith(".gz"):
+        return gzip.open(filename, mode + "t", encoding=encoding, newline=newline)
+    if name.endswith(".zst"):
+        zstandard = _zstandard()
+        return zstandard.open(filename, mode + "t", encoding=encoding, newline=newline)
+    if name.endswith(".zip"):
+        if mode != "r":
+            raise ValueError("Writing .zip files is not supported, use .gz or .zst")
+        import zipfile
+        archive = zipfile.ZipFile(filename)
+        stream = io.TextIOWrapper(archive.open(_zip_member(archive)), encoding=encoding, newline=newline)
+        # the member keeps its own handle to the archive file, it is closed together with the stream
+        archive.close()
+        return stream
+    return open(filename, mode, encoding=encoding, newline=newline)
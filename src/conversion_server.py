@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+ConversionServer module
+
+Long-running localhost HTTP server around LedgerProcessor, which keeps the
+rate provider and the translations loaded between conversions.
+
+    POST /convert?depot_old=..&depot_new=..&account=..&refids_to_ignore=..
+         body: kraken ledger csv
+         response: {"transactions_normal_depot.csv": "...", "transactions_special_depot.csv": "...",
+                    "transactions_account.csv": "...", "seconds": 0.01}
+    GET  /health
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+from .i18n import I18n
+from .ledger_processor import LedgerProcessor
+from .portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+
+
+class ReloadingRateProvider:
+    """PortfolioPerformanceRateProvider that re-reads the export only when its mtime changed"""
+
+    def __init__(self, export_file, **kwargs):
+        self._export_file = export_file
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._rate_provider = None
+        self.reload_count = 0
+
+    def current(self):
+        """Returns the up-to-date rate provider, a single os.stat() if the file did not change"""
+        mtime = os.stat(self._export_file).st_mtime_ns
+        with self._lock:
+            if mtime != self._mtime:
+                self._rate_provider = PortfolioPerformanceRateProvider(self._export_file, **self._kwargs)
+                self._mtime = mtime
+                self.reload_count += 1
+            return self._rate_provider
+
+    def get_rate(self, crypto_currency, timestr=None, timeobj=None):
+        return self.current().get_rate(crypto_currency, timestr, timeobj)
+
+
+class ConversionService:
+    """Converts ledgers with warm state, independent of the transport"""
+
+    OPTIONS = ["depot_old", "depot_new", "account", "refids_to_ignore"]
+
+    def __init__(self, rate_provider=None, fiat_currency="EUR", language="de"):
+        self._rate_provider = rate_provider
+        self._fiat_currency = fiat_currency
+        self._language = language
+        self._i18n = I18n(language)
+
+    def convert(self, ledger_csv, depot_old="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT", refids_to_ignore=""):
+        import pandas as pd
+
+        start = time.perf_counter()
+        rate_provider = self._rate_provider
+        if isinstance(rate_provider, ReloadingRateProvider):
+            rate_provider = rate_provider.current()  # one consistent export for the whole conversion
+
+        lp = LedgerProcessor(dataframe=pd.read_csv(StringIO(ledger_csv)),
+                             rate_provider=rate_provider,
+                             fiat_currency=self._fiat_currency,
+                             refids_to_ignore=refids_to_ignore,
+                             depot_current=depot_old,
+                             depot_new=depot_new,
+                             account=account,
+                             language=self._language,
+                             i18n=self._i18n)
+        result = lp.render_transactions()
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+
+class _ConversionRequestHandler(BaseHTTPRequestHandler):
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/convert":
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+            return
+
+        query = urllib.parse.parse_qs(url.query)
+        options = {key: values[-1] for key, values in query.items() if key in ConversionService.OPTIONS}
+        length = int(self.headers.get("Content-Length", 0))
+        ledger_csv = self.rfile.read(length).decode("utf-8")
+
+        try:
+            result = self.server.service.convert(ledger_csv, **options)
+        except Exception as e:  # report to the client, keep serving
+            self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """Serves a ConversionService on localhost, use port 0 to pick a free port"""
+
+    daemon_threads = True
+
+    def __init__(self, service, host="127.0.0.1", port=8765, verbose=False):
+        super().__init__((host, port), _ConversionRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class ConversionClient:
+    """Minimal client for ConversionServer"""
+
+    def __init__(self, url="http://127.0.0.1:8765", timeout=60):
+        self._url = url.rstrip("/")
+        self._timeout = timeout
+
+    def convert(self, ledger_csv, **options):
+        query = urllib.parse.urlencode(options)
+        request = urllib.request.Request(f"{self._url}/convert?{query}", data=ledger_csv.encode("utf-8"), method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            raise ValueError(json.loads(e.read().decode("utf-8")).get("error", str(e))) from e
+
+    def convert_file(self, ledger_file, out_dir, **options):
+        with open(ledger_file, encoding="utf-8") as f:
+            result = self.convert(f.read(), **options)
+        for filename in [LedgerProcessor.DEPOT_NORMAL_FILENAME, LedgerProcessor.DEPOT_SPECIAL_FILENAME, LedgerProcessor.ACCOUNT_FILENAME]:
+            with open(os.path.join(out_dir, filename), "w") as file:
+                file.write(result[filename])
+        return result
+
+    def health(self):
+        with urllib.request.urlopen(f"{self._url}/health", timeout=self._timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
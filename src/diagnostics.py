@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnostics module
+
+Collects the groups LedgerProcessor cannot handle (or deliberately ignores)
+per case code instead of printing every single one. A summary with counts and
+sample refids is logged at the end; full transaction dumps are only written
+to an optional JSON Lines diagnostics file.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Diagnostics:
+
+    STAKING_TRANSFER = "STAKING-TRANSFER"
+
+    def __init__(self, diagnostics_file=None, max_samples=5):
+        self._diagnostics_file = diagnostics_file
+        self._file = None
+        self._max_samples = max_samples
+        self._cases = {}  # code -> [message, count, sample refids, (parsing_info, types) combinations]
+
+    def _record(self, code, message, transaction_id, transaction):
+        case = self._cases.get(code)
+        if case is None:
+            case = self._cases[code] = [message, 0, [], set()]
+        case[1] += 1
+        if len(case[2]) < self._max_samples:
+            case[2].append(transaction_id)
+        case[3].add((transaction.get("meta", {}).get("parsing_info", ""), tuple(sorted(set(transaction.get("types", []))))))
+
+    def _dump(self, code, message, transaction_id, transaction):
+        if self._diagnostics_file is None:
+            return
+        if self._file is None:
+            self._file = open(self._diagnostics_file, "w")
+        entry = {"code": code, "message": message, "refid": transaction_id, "transaction": transaction}
+        self._file.write(json.dumps(entry, default=str) + "\n")
+
+    def unhandled(self, code, message, transaction_id, transaction):
+        """A group that could not be converted (it is skipped)"""
+        self._record(code, message, transaction_id, transaction)
+        logger.debug("%s [%s]: %s", message, code, transaction_id)
+        self._dump(code, message, transaction_id, transaction)
+
+    def staking_transfer(self, transaction_id, transaction):
+        """A transfer between spot and staking wallets, which is ignored on purpose"""
+        self._record(self.STAKING_TRANSFER, "Ignoring staking transfer", transaction_id, transaction)
+        logger.debug("Ignoring staking transfer %s", transaction_id)
+        self._dump(self.STAKING_TRANSFER, "Ignoring staking transfer", transaction_id, transaction)
+
+    def counts(self):
+        return {code: case[1] for code, case in self._cases.items()}
+
+    def samples(self, code):
+        return list(self._cases[code][2]) if code in self._cases else []
+
+    def log_summary(self):
+        for code, (message, count, samples, combinations) in sorted(self._cases.items()):
+            level = logging.INFO if code == self.STAKING_TRANSFER else logging.WARNING
+            combinations = ", ".join(f"({parsing_info}, {set(types)})" for parsing_info, types in sorted(combinations))
+            logger.log(level, "%s [%s] %s: %d groups, e.g. %s", message, code, combinations, count, ", ".join(samples))
+        if self._diagnostics_file is not None and self._cases:
+            logger.info("Details of all cases written to %s", self._diagnostics_file)
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
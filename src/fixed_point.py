@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed-point amounts
+
+Kraken amounts, fees and balances have at most 10 decimals. As integer
+multiples of 1e-10 ("units") they add up exactly, floats drift with every
+addition. Sums of ledger amounts and the values of amounts (amount * rate)
+are therefore computed in units and turned back into floats only for the
+transaction objects, which are rounded when rendered.
+
+Floats are converted through their shortest repr, which is the decimal
+string they were parsed from, so the conversion is exact. The vectorized
+conversion multiplies directly where that is still exact in float64 and only
+falls back to the repr for huge amounts. int64 holds amounts up to about
+922 million; columns whose absolute amounts add up to more than
+INT64_SAFE_UNITS are converted to Python ints (object arrays) instead, so
+their sums can neither overflow nor wrap around.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import decimal
+import numbers
+
+DECIMALS = 10
+SCALE = 10 ** DECIMALS
+
+# Below this absolute value the float error of value * SCALE stays under 0.3 units, so rint() is exact
+_EXACT_FLOAT_LIMIT = 2 ** 17
+
+# int64 columns stay below this in absolute sum, so a few of them can be summed, subtracted and added up
+INT64_SAFE_UNITS = 2 ** 60
+
+
+def _decimal(value):
+    if isinstance(value, numbers.Integral):
+        value = int(value)
+    elif isinstance(value, numbers.Real) and not isinstance(value, decimal.Decimal):
+        value = repr(float(value))  # also numpy floats, whose repr is "np.float64(...)"
+    return decimal.Decimal(value)
+
+
+def to_units(value):
+    """Amount as int multiple of 1e-10 (ints, floats, Decimals and numeric strings)"""
+    if isinstance(value, numbers.Integral):
+        return int(value) * SCALE
+    return int(_decimal(value).scaleb(DECIMALS).to_integral_value(decimal.ROUND_HALF_EVEN))
+
+
+def from_units(units):
+    """Float amount of int units (the one rounding step back to floats), also for arrays of units"""
+    result = units / SCALE
+    return result.astype(float) if getattr(result, "dtype", None) == object else result
+
+
+def add(*values):
+    """Exact sum of amounts, returned as float"""
+    return from_units(sum(to_units(value) for value in values))
+
+
+def multiply(value, factor):
+    """Exact product of an amount and e.g. a rate, rounded to units once and returned as float"""
+    return from_units(to_units(_decimal(value) * _decimal(factor)))
+
+
+def column_to_units(values):
+    """
+    Numpy array of units for a numeric pandas Series or array, NaN counts as 0.
+    int64, or object (Python ints) if the absolute sum of the column reaches INT64_SAFE_UNITS.
+    """
+    import numpy as np
+
+    values = np.nan_to_num(np.asarray(values, dtype=float), nan=0.0)
+    if np.abs(values).sum() * SCALE >= INT64_SAFE_UNITS:
+        return np.array([to_units(float(value)) for value in values], dtype=object)
+    units = np.rint(values * SCALE).astype(np.int64)
+    large = np.abs(values) >= _EXACT_FLOAT_LIMIT
+    if large.any():
+        units[large] = [to_units(float(value)) for value in values[large]]
+    return units
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+GroupCache module
+
+Persists the grouped ledger (the output of LedgerProcessor._parse_transactions)
+on disk. Grouping only depends on the ledger file, the refids to ignore and the
+grouping logic itself, so a re-run with other depot/account names, language or
+rates skips reading and grouping the Kraken CSV.
+
+The groups are flattened into one table (one row per ledger row plus the group
+id, the group type and parsing_info) and stored as JSON (column names and row
+values, data only, so a cache dir shared with others cannot run code like a
+pickle could), together with the balance divergences found in the ledger (None
+if it was not checked), so a re-run with balance check needs no ledger either.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from .balance_check import BalanceDivergence
+
+
+def _json_default(value):
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} in the group cache")
+
+
+class GroupCache:
+
+    # Bump whenever the grouping in LedgerProcessor._parse_transactions changes
+    GROUPING_VERSION = 3
+
+    GROUP_COLUMN = "_group"
+    TYPE_COLUMN = "_group_type"
+    PARSING_INFO_COLUMN = "_parsing_info"
+
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    @classmethod
+    def key(cls, filename, refids_to_ignore=(), csv_sep=",", settings=""):
+        """Cache key from the content of the ledger file(s) and all settings that influence grouping"""
+        digest = hashlib.sha256()
+        for name in [filename] if isinstance(filename, (str, os.PathLike)) else filename:
+            with open(name, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        settings = f"v{cls.GROUPING_VERSION}|sep={csv_sep}|ignore={','.join(sorted(refids_to_ignore))}|{settings}"
+        digest.update(settings.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, f"groups_{key}.json")
+
+    def load(self, key):
+        """Returns (grouped transactions, balance divergences or None) stored under key, or None"""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            columns, divergences = entry["columns"], entry["balance_divergences"]
+            rows = [dict(zip(columns, values)) for values in entry["rows"]]
+            if divergences is not None:
+                divergences = [BalanceDivergence(**divergence) for divergence in divergences]
+            return self._unflatten(rows), divergences
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # unreadable cache files are simply rebuilt
+
+    def store(self, key, transactions, balance_divergences=None):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        rows = self._flatten(transactions)
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        entry = {
+            "columns": columns,
+            "rows": [[row.get(column, float("nan")) for column in columns] for row in rows],
+            "balance_divergences": None if balance_divergences is None else [vars(d) for d in balance_divergences],
+        }
+        # write to a temporary file first, concurrent runs must never see a partial cache file
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, default=_json_default)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _flatten(self, transactions):
+        rows = []
+        for group_id, transaction in transactions.items():
+            parsing_info = transaction.get("meta", {}).get("parsing_info", "")
+            for entry, group_type in zip(transaction["raw"], transaction["types"]):
+                row = dict(entry)
+                row[self.GROUP_COLUMN] = group_id
+                row[self.TYPE_COLUMN] = group_type
+                row[self.PARSING_INFO_COLUMN] = parsing_info
+                rows.append(row)
+        return rows
+
+    def _unflatten(self, rows):
+        transactions = {}
+        for row in rows:
+            group_id = row.pop(self.GROUP_COLUMN)
+            group_type = row.pop(self.TYPE_COLUMN)
+            parsing_info = row.pop(self.PARSING_INFO_COLUMN)
+            transaction = transactions.get(group_id)
+            if transaction is None:
+                transaction = transactions[group_id] = {"raw": [], "types": [], "meta": {"parsing_info": parsing_info}}
+            transaction["raw"].append(row)
+            transaction["types"].append(group_type)
+        return transactions
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Daily holdings module
+
+Builds the (day x asset) matrix of holdings at the end of each day straight
+from the ledger rows (amount - fee in fixed-point units, summed per day and
+asset with one np.add.at and accumulated with one cumsum) and values it with
+the rate matrix of a PortfolioPerformanceRateProvider. The daily value per
+asset and in total can be compared with the portfolio chart in PP.
+
+Exports need not start with the account: each asset starts with its
+holdings before its first row, derived from its first balance (see
+balance_check.opening_balances). Like in the conversion, pending
+deposit/withdrawal rows (see balance_check.pending_rows), ignored refids and
+rows ignored by LedgerRules are left out.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import logging
+
+from .assets import DEFAULT_NORMALIZER
+from .balance_check import opening_balances, pending_rows
+from .fixed_point import INT64_SAFE_UNITS, column_to_units, from_units
+
+logger = logging.getLogger(__name__)
+
+TOTAL_COLUMN = "total"
+
+
+class DailyHoldings:
+
+    def __init__(self, ledger, asset_normalizer=None, date_to=None, refids_to_ignore=(), rules=None):
+        """
+        ledger: Kraken ledger DataFrame (time, asset, amount, fee), assets are merged by their PP name (XXBT and XBT.M are XBT)
+        date_to: last day of the series ("YYYY-MM-DD"), def=day of the last row
+        refids_to_ignore, rules (LedgerRules): rows to leave out, as in LedgerProcessor
+        """
+        import numpy as np
+        import pandas as pd
+
+        normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+        # the balances include the ignored rows, so they are taken from the whole ledger
+        openings = opening_balances(ledger)
+        ignored = pending_rows(ledger)
+        if refids_to_ignore and "refid" in ledger:
+            ignored |= ledger["refid"].isin(set(refids_to_ignore))
+        if rules is not None:
+            ignored |= rules.ignore_mask(ledger)
+        ledger = ledger[~ignored]
+
+        # exact fixed-point sums, converted to floats once at the end
+        delta = (column_to_units(pd.to_numeric(ledger["amount"], errors="coerce"))
+                 - column_to_units(pd.to_numeric(ledger["fee"], errors="coerce")))
+        days = pd.to_datetime(ledger["time"].astype(str).str[:10])
+        asset_codes, assets = pd.factorize(normalizer.normalize_column(ledger["asset"].astype(str)), sort=True)
+
+        if len(ledger) == 0:
+            self.days = pd.DatetimeIndex([])
+            self.assets = []
+            self.amounts = np.zeros((0, 0))
+            return
+
+        first_day = days.min()
+        last_day = max(days.max(), pd.Timestamp(date_to)) if date_to else days.max()
+        self.days = pd.date_range(first_day, last_day, freq="D")
+        self.assets = list(assets)
+
+        day_codes = ((days - first_day) // pd.Timedelta(days=1)).to_numpy()
+        flat = day_codes * len(self.assets) + asset_codes
+        # opening holdings per PP asset (XXBT and XBT.M have balances of their own), added on the first day
+        seeds = [0] * len(self.assets)
+        for kraken_asset in ledger["asset"].astype(str).unique():
+            seeds[self.assets.index(normalizer.normalize(kraken_asset))] += int(openings.get(kraken_asset, 0))
+        large = sum(abs(seed) for seed in seeds) >= INT64_SAFE_UNITS
+        changes = np.zeros(len(self.days) * len(self.assets), dtype=object if large else delta.dtype)  # int64 or Python ints
+        changes[:len(self.assets)] = seeds
+        np.add.at(changes, flat, delta)
+        self.amounts = from_units(changes.reshape(len(self.days), len(self.assets)).cumsum(axis=0))
+
+    def amounts_frame(self):
+        """Holdings at the end of each day, one column per asset"""
+        import pandas as pd
+
+        return pd.DataFrame(self.amounts, index=self.days, columns=self.assets).rename_axis("date")
+
+    def values_frame(self, rate_provider):
+        """Value of the holdings at the end of each day per asset plus their total, assets without rates are left out"""
+        import numpy as np
+        import pandas as pd
+
+        values = self.amounts * rate_provider.rate_matrix(self.assets, self.days)
+        # assets without any rate only matter if they are held at some point
+        unrated = np.isnan(values).all(axis=0) & (np.abs(self.amounts) > 0).any(axis=0)
+        if unrated.any():
+            logger.warning("No rates for %s, they are not included in the values", ", ".join(np.array(self.assets, dtype=object)[unrated]))
+        values = np.where(np.isnan(values) & (self.amounts == 0), 0.0, values)
+
+        frame = pd.DataFrame(values, index=self.days, columns=self.assets).rename_axis("date")
+        frame[TOTAL_COLUMN] = np.nansum(values, axis=1)
+        return frame
+
+    @staticmethod
+    def store(frame, output_filename):
+        """Writes a frame as CSV, or as Parquet for *.parquet files (needs pyarrow or fastparquet)"""
+        if str(output_filename).lower().endswith(".parquet"):
+            frame.to_parquet(output_filename)
+        else:
+            frame.to_csv(output_filename, sep=";")
@@ -1,6 +1,11 @@
+import logging
 import os
 from pathlib import Path
 
+from .java_properties import load_properties
+
+logger = logging.getLogger(__name__)
+
 class I18n:
 
     CSV_DEPOT_COLUMNS = [
@@ -36,7 +41,7 @@ class I18n:
 
     def __init__(self, language):
         self._res_dir = self._determine_resource_dir()
-        print(f"Loading translations from: {self._res_dir}")
+        logger.info("Loading translations from: %s", self._res_dir)
 
         self._constants = self._load_language(language)
 
@@ -51,7 +56,7 @@ class I18n:
         if key in self._constants:
             return self._constants[key]
         else:
-            print(f"Error: Could not find key: {key}")
+            logger.error("Could not find key: %s", key)
             return self._constants.get(key, key)
 
     def _load_language(self, language):
@@ -74,20 +79,11 @@ class I18n:
         return result
 
     def _load_from_file(self, filename):
-        result = {}
         try:
-            with open(filename, encoding='utf-8') as f:
-                rows = f.readlines()
-                for row in rows:
-                    if row.strip() and not row.startswith("#"):
-                        row = row.encode('utf-8').decode('unicode-escape')
-                        items = row.split(" = ")
-                        key = items[0]
-                        value = "".join(items[1:])
-                        result[key.strip()] = value.strip()
-        except Exception as e:
-            print(f"Error loading file {filename}: {e}")
-        return result
+            return load_properties(filename)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error("Error loading file %s: %s", filename, e)
+            return {}
 
     def _translate_array(self, array):
         result = []
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Parser for Java .properties files (as used for the PP translations)
+
+Implements the format described in java.util.Properties#load in a single
+streaming pass: '#' and '!' comments, '=', ':' and whitespace separators,
+backslash line continuations and the \\t, \\n, \\r, \\f and \\uXXXX escapes.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import re
+
+_WHITESPACE = " \t\f"
+_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "f": "\f"}
+_ESCAPE_PATTERN = re.compile(r"\\(u[0-9a-fA-F]{4}|.)", re.DOTALL)
+# escapes that Python's unicode_escape codec decodes exactly like Java does
+_CODEC_UNSAFE_ESCAPE_PATTERN = re.compile(r"\\(?![tnrf\\]|u[0-9a-fA-F]{4})", re.DOTALL)
+# key (may contain escaped separators), optional whitespace, one optional '=' or ':', optional whitespace, value
+_KEY_VALUE_PATTERN = re.compile(r"((?:[^\\=: \t\f]+|\\.)*)[ \t\f]*[=:]?[ \t\f]*(.*)", re.DOTALL)
+
+
+def _unescape_match(match):
+    escaped = match.group(1)
+    if len(escaped) == 5:
+        return chr(int(escaped[1:], 16))
+    return _ESCAPES.get(escaped, escaped)
+
+
+def _unescape(text):
+    if "\\" not in text:
+        return text
+    return _ESCAPE_PATTERN.sub(_unescape_match, text)
+
+
+def _ends_with_continuation(line):
+    backslashes = len(line) - len(line.rstrip("\\"))
+    return backslashes % 2 == 1
+
+
+def parse_properties(lines):
+    """Parses an iterable of lines into a dict of (unescaped) keys and values"""
+    result = {}
+    match_key_value = _KEY_VALUE_PATTERN.match
+    search_unsafe = _CODEC_UNSAFE_ESCAPE_PATTERN.search
+    parts = []
+    for line in lines:
+        line = line.rstrip("\r\n").lstrip(_WHITESPACE)
+        if not parts and (not line or line[0] in "#!"):
+            continue
+
+        if line.endswith("\\") and _ends_with_continuation(line):
+            parts.append(line[:-1])
+            continue
+
+        if parts:
+            parts.append(line)
+            line = "".join(parts)
+            parts = []
+        elif "\\" not in line:
+            # fast path for plain "key = value" lines, the bulk of the PP files
+            key, separator, value = line.partition("=")
+            if separator:
+                key = key.rstrip(_WHITESPACE)
+                if ":" not in key and " " not in key and "\t" not in key and "\f" not in key:
+                    result[key] = value.lstrip(_WHITESPACE)
+                    continue
+
+        key, value = match_key_value(line).groups()
+        if "\\" in line:
+            if search_unsafe(line) is None:
+                # fast path in C, raw_unicode_escape keeps non-ASCII characters intact
+                if "\\" in key:
+                    key = key.encode("raw_unicode_escape").decode("unicode_escape")
+                value = value.encode("raw_unicode_escape").decode("unicode_escape")
+            else:
+                key = _unescape(key)
+                value = _unescape(value)
+        result[key] = value
+
+    if parts:
+        key, value = match_key_value("".join(parts)).groups()
+        result[_unescape(key)] = _unescape(value)
+    return result
+
+
+def load_properties(filename, encoding="utf-8"):
+    """Loads a .properties file, streaming it line by line"""
+    with open(filename, encoding=encoding) as f:
+        return parse_properties(f)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+LedgerFilter module
+
+Restricts a conversion to a date range and/or a set of assets. Rows are
+selected while the ledger is read (in chunks), excluded rows are never
+collected. A refid group is kept completely as soon as one of its rows is
+selected, so groups straddling a boundary (or trades of a selected asset
+against fiat) stay intact.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import datetime
+
+from .assets import DEFAULT_NORMALIZER
+from .compressed_io import open_text
+
+# refids which do not identify a group (nondup rows without refid, the Kraken "Unknown" bug)
+UNGROUPED_REFIDS = {"", "Unknown"}
+
+
+class LedgerFilter:
+
+    CHUNK_ROWS = 100_000
+
+    # Rows of kept groups may lie a bit outside of the range, their rates are needed as well
+    RATE_MARGIN = datetime.timedelta(days=7)
+
+    def __init__(self, date_from=None, date_to=None, assets=None, asset_normalizer=None):
+        """date_from/date_to: inclusive "YYYY-MM-DD" strings, assets: Kraken (XXBT) or PP (XBT) names"""
+        self.date_from = date_from
+        self.date_to = date_to
+        self.assets = set(assets) if assets else None
+        self._asset_normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+
+    def __repr__(self):
+        assets = ",".join(sorted(self.assets)) if self.assets else ""
+        return f"LedgerFilter(from={self.date_from or ''},to={self.date_to or ''},assets={assets})"
+
+    def normalized_assets(self):
+        """PP names of the selected assets, e.g. for the rate columns (names may be given either way)"""
+        if self.assets is None:
+            return None
+        return self.assets | set(self._asset_normalizer.normalize(asset) for asset in self.assets)
+
+    def rate_range(self):
+        """(first, last) day whose rates may be needed, None for an open end"""
+        first = datetime.date.fromisoformat(self.date_from) - self.RATE_MARGIN if self.date_from else None
+        last = datetime.date.fromisoformat(self.date_to) + self.RATE_MARGIN if self.date_to else None
+        return first, last
+
+    def _matches(self, df):
+        """Boolean Series: rows selected by the filter on their own"""
+        days = df["time"].astype(str).str[:10]
+        mask = days == days  # all True
+        if self.date_from:
+            mask &= days >= self.date_from
+        if self.date_to:
+            mask &= days <= self.date_to
+        if self.assets is not None:
+            assets = df["asset"].astype(str)
+            mask &= assets.isin(self.assets) | self._asset_normalizer.normalize_column(assets).isin(self.assets)
+        return mask
+
+    def _group_refids(self, df, mask):
+        return set(df.loc[mask, "refid"].fillna("").astype(str)) - UNGROUPED_REFIDS
+
+    def _select(self, df, mask, refids):
+        return df[mask | df["refid"].isin(refids)]
+
+    def apply(self, df):
+        """Filters an already loaded ledger DataFrame"""
+        mask = self._matches(df)
+        return self._select(df, mask, self._group_refids(df, mask))
+
+    def read_csv(self, filename, csv_sep=","):
+        """
+        Reads only the selected rows (and their groups) of a ledger file. The first pass reads
+        the refid/time/asset columns to find the selected groups, the second keeps their rows.
+        """
+        import pandas as pd
+
+        refids = set()
+        with open_text(filename) as f:
+            for chunk in pd.read_csv(f, sep=csv_sep, usecols=["refid", "time", "asset"], chunksize=self.CHUNK_ROWS):
+                refids |= self._group_refids(chunk, self._matches(chunk))
+
+        with open_text(filename) as f:
+            chunks = [self._select(chunk, self._matches(chunk), refids)
+                      for chunk in pd.read_csv(f, sep=csv_sep, chunksize=self.CHUNK_ROWS)]
+        if not chunks:
+            with open_text(filename) as f:
+                return pd.read_csv(f, sep=csv_sep)
+        return pd.concat(chunks, ignore_index=True)
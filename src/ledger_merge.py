@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Ledger merge module
+
+Merges overlapping Kraken ledger exports into one time-ordered stream of rows
+and drops the rows exported more than once. Duplicates are identified by their
+txid, or by refid and time for rows without txid (e.g. the pending leg of
+deposits).
+
+Kraken does not always order its exports by time (e.g. by refid), so each
+file is read twice: the first pass buffers the rows that are earlier than a
+row before them, the second pass streams the other rows, which are in time
+order, and merges the sorted buffer into them (stable, rows of one timestamp
+keep their order). Memory is bounded by the out-of-order rows, nothing is
+buffered for exports sorted by time. Duplicates carry the same time, so
+during the merge only the keys seen at the current time are kept.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import csv
+import heapq
+
+from .compressed_io import open_text
+
+NUMERIC_COLUMNS = ["amount", "fee", "balance"]
+
+
+def _row_key(row):
+    txid = row.get("txid", "")
+    return ("txid", txid) if txid else ("refid", row.get("refid", ""), row["time"])
+
+
+def _time(row):
+    return row["time"]
+
+
+def _split_order(rows):
+    """Yields (row is in time order, row), rows earlier than the latest row before them are not"""
+    latest = ""
+    for row in rows:
+        in_order = row["time"] >= latest
+        if in_order:
+            latest = row["time"]
+        yield in_order, row
+
+
+class LedgerMerger:
+
+    def __init__(self, filenames, csv_sep=","):
+        self._filenames = list(filenames)
+        self._csv_sep = csv_sep
+        self.rows_read = 0
+        self.rows_buffered = 0  # out-of-order rows held in memory
+        self.duplicates = 0
+
+    def _ordered_rows(self, filename):
+        """The rows of one file ordered by time, only the out-of-order rows are buffered"""
+        with open_text(filename, newline="") as f:
+            out_of_order = sorted((row for in_order, row in _split_order(csv.DictReader(f, delimiter=self._csv_sep))
+                                   if not in_order), key=_time)
+        self.rows_buffered += len(out_of_order)
+        with open_text(filename, newline="") as f:
+            in_order = (row for in_order, row in _split_order(csv.DictReader(f, delimiter=self._csv_sep)) if in_order)
+            yield from heapq.merge(in_order, out_of_order, key=_time)
+
+    def rows(self):
+        """Yields the rows of all files ordered by time, without duplicates"""
+        current_time = None
+        seen = set()
+        streams = [self._ordered_rows(filename) for filename in self._filenames]
+        for row in heapq.merge(*streams, key=_time):
+            self.rows_read += 1
+            if row["time"] != current_time:
+                current_time = row["time"]
+                seen.clear()
+            key = _row_key(row)
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            yield row
+
+    def dataframe(self):
+        """The merged rows as DataFrame, with numeric columns like pandas.read_csv would return them"""
+        import pandas as pd
+
+        # filled column by column, the rows are not kept as dicts
+        columns = {}
+        for count, row in enumerate(self.rows()):
+            for column in row:
+                if column not in columns:
+                    columns[column] = [None] * count
+            for column, values in columns.items():
+                values.append(row.get(column))
+        df = pd.DataFrame(columns)
+        for column in NUMERIC_COLUMNS:
+            if column in df:
+                df[column] = pd.to_numeric(df[column], errors="coerce")
+        return df
+
+
+def read_ledger(filename, csv_sep=","):
+    """Reads one ledger file (as exported) or merges a list of overlapping exports into one DataFrame"""
+    if isinstance(filename, (list, tuple)):
+        if len(filename) != 1:
+            return LedgerMerger(filename, csv_sep).dataframe()
+        filename = filename[0]
+
+    import pandas as pd
+    with open_text(filename) as f:
+        return pd.read_csv(f, sep=csv_sep)
@@ -5,11 +5,26 @@ LedgerProcessor module
 Copyright 2022-05-16 AlexanderLill
 """
 from src.transactions import DepotTransaction, AccountTransaction
+from .assets import DEFAULT_NORMALIZER
+from .balance_check import BalanceMismatchError, BalanceReconciler
+from .compressed_io import COMPRESSIONS, open_text
+from .diagnostics import Diagnostics
+from . import fixed_point
+from .group_cache import GroupCache
+from .ledger_filter import LedgerFilter
+from .ledger_merge import read_ledger
+from .ledger_rules import ACTIONS, FORCED_BRANCH
+from .ledger_stats import LedgerStats
 from .i18n import I18n
+from .profiler import NO_STAGE
+from .rate_coverage import MISSING_RATE_NOTE, MissingRates, RateCoverageChecker, RateCoverageError
+from .trade_aggregator import AGGREGATED_ROWS, TradeAggregator
+from .transaction_frames import account_frame, depot_frame, store_frames
 
-import json
+import logging
 import numbers
-import pandas as pd
+
+logger = logging.getLogger(__name__)
 
 class IllegalArgumentError(ValueError):
     pass
@@ -20,16 +35,126 @@ class LedgerProcessor:
     DEPOT_NORMAL_TRANSACTIONS = "depot_normal_transactions"
     DEPOT_SPECIAL_TRANSACTIONS = "depot_special_transactions"
 
+    # (parsing_info values, group types) -> handler branch of _process_transaction
+    DISPATCH_TABLE = [
+        (("dup", "nondup"), {"deposit"}, "deposit"),
+        (("dup",), {"withdrawal"}, "withdrawal"),
+        (("dup", "nondup"), {"trade"}, "trade"),
+        (("dup",), {"spend", "receive"}, "trade"),
+        (("dup_asset_amount_match",), {"deposit", "staking"}, "staking"),
+        (("nondup",), {"staking"}, "staking"),
+        (("nondup",), {"earn"}, "staking"),
+        (("nondup",), {"transfer"}, "NDT"),
+        (("dup",), {"transfer", "withdrawal"}, "DTW-NS"),
+        (("dup",), {"deposit", "transfer"}, "DDT-NS"),
+        (("dup",), {"earn"}, "DE-NS"),
+        (("nondup",), {"withdrawal"}, "fiat_withdrawal"),
+    ]
+    _DISPATCH = {(parsing_info, frozenset(types)): branch
+                 for parsing_infos, types, branch in DISPATCH_TABLE for parsing_info in parsing_infos}
+
+    # Transfers are ignored, staking transfers on purpose (see STAKING_TRANSFER_SUBTYPES), others as unknown case
+    TRANSFER_BRANCHES = {"NDT", "DTW-NS", "DDT-NS", "DE-NS"}
+    STAKING_TRANSFER_SUBTYPES = {"spotfromfutures", "spottostaking", "stakingfromspot", "stakingtospot",
+                                 "spotfromstaking", "allocation", "deallocation", "migration"}
+
+    MISSING_RATE_NOTE = MISSING_RATE_NOTE
+
+    DEPOT_NORMAL_FILENAME = "transactions_normal_depot.csv"
+    DEPOT_SPECIAL_FILENAME = "transactions_special_depot.csv"
+    ACCOUNT_FILENAME = "transactions_account.csv"
+
     def __init__(self, filename=None, csv_sep=",", dataframe=None,
                  fiat_currency="EUR", rate_provider=None, refids_to_ignore="",
-                 depot_current="", depot_new="", account="", language="de"):
+                 depot_current="", depot_new="", account="", language="de", i18n=None, profiler=None,
+                 diagnostics=None, cache_dir=None, date_from=None, date_to=None, assets=None, asset_normalizer=None,
+                 balance_check=None, aggregate_trades=None, staking_rollup=None, rules=None, rate_check=None, dry_run=False):
+
+        # Optional StageProfiler, all instrumentation is skipped when it is None
+        self._profiler = profiler
+
+        # Unhandled groups are collected here, a shared instance is summarized by its owner
+        self._owns_diagnostics = diagnostics is None
+        self._diagnostics = diagnostics if diagnostics is not None else Diagnostics()
 
-        if dataframe is None:
+        refids_to_ignore = refids_to_ignore.split(",")
+        refids_to_ignore = filter(lambda id: len(id)>0, refids_to_ignore)
+        self._refids_to_ignore = set(refids_to_ignore)
+
+        # Kraken asset code -> PP name, optionally extended by a user mapping (see AssetNormalizer)
+        self._asset_normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+
+        # Force rules can name any branch of DISPATCH_TABLE
+        if rules is not None:
+            branches = dict.fromkeys(branch for _, _, branch in self.DISPATCH_TABLE)
+            unknown_branches = rules.branches() - set(branches)
+            if unknown_branches:
+                raise IllegalArgumentError(f"Unknown branch(es) in rules: {', '.join(sorted(unknown_branches))}, "
+                                           f"expected one of {', '.join(branches)}")
+
+        # Optional date range ("YYYY-MM-DD", inclusive) and assets, applied while reading the ledger
+        ledger_filter = None
+        if date_from or date_to or assets:
+            ledger_filter = LedgerFilter(date_from, date_to, assets, self._asset_normalizer)
+
+        # With a cache_dir the grouped ledger is persisted, re-runs with other rendering options skip loading and grouping
+        self._group_cache = None
+        self._cached_transactions = None
+        if cache_dir is not None and dataframe is None and filename is not None and not dry_run:
+            self._group_cache = GroupCache(cache_dir)
+            with self._stage("load"):
+                settings = [repr(ledger_filter)] if ledger_filter is not None else []
+                if self._asset_normalizer is not DEFAULT_NORMALIZER:
+                    settings.append(repr(self._asset_normalizer))
+                if rules is not None:
+                    settings.append(repr(rules))
+                self._group_cache_key = GroupCache.key(filename, self._refids_to_ignore, csv_sep, "|".join(settings))
+                cached = self._group_cache.load(self._group_cache_key)
+            # the balance check needs the divergences found when the entry was stored, otherwise the ledger is read again
+            if cached is not None and (balance_check is None or cached[1] is not None):
+                self._cached_transactions, cached_divergences = cached
+
+        if dataframe is None and self._cached_transactions is None:
             if filename is None:
                 raise IllegalArgumentError("Either filename or dataframe needs to be specified!")
-            dataframe = pd.read_csv(filename, sep=csv_sep)
+            with self._stage("load"):
+                if ledger_filter is not None and not isinstance(filename, (list, tuple)):
+                    dataframe = ledger_filter.read_csv(filename, csv_sep)
+                    ledger_filter = None  # already applied
+                else:
+                    # overlapping exports are merged by time and deduplicated
+                    dataframe = read_ledger(filename, csv_sep)
+        if dataframe is not None and ledger_filter is not None:
+            dataframe = ledger_filter.apply(dataframe)
+
+        # Optional pre-flight check of the balance column: "warn" logs the divergences, "strict" raises
+        self.balance_divergences = []
+        if balance_check not in (None, "warn", "strict"):
+            raise IllegalArgumentError(f"Unknown balance_check: {balance_check}")
+        self._balance_check = balance_check
+        if balance_check is not None:
+            if dataframe is not None:
+                with self._stage("reconcile"):
+                    self.balance_divergences = BalanceReconciler().reconcile(dataframe, assets, self._asset_normalizer)
+            else:
+                self.balance_divergences = cached_divergences
+            for divergence in self.balance_divergences:
+                logger.warning("Balance mismatch: %s", divergence)
+            if self.balance_divergences and balance_check == "strict":
+                raise BalanceMismatchError(f"Balances of {len(self.balance_divergences)} asset(s) do not match the ledger rows")
+
+        # Optional LedgerRules: ignored rows are dropped before grouping, forced branches override the dispatch
+        self._rules = rules
+        self._forced_branches = {}
+        if rules is not None and dataframe is not None:
+            with self._stage("rules"):
+                dataframe, self._forced_branches = rules.apply(dataframe)
         
-        self._i18n = I18n(language)
+        # An already loaded I18n can be shared between processors (e.g. in batch mode)
+        if i18n is None:
+            with self._stage("load_i18n"):
+                i18n = I18n(language)
+        self._i18n = i18n
         # shortcuts for i18n values
         self.DELIVERY_INBOUND = self._i18n.get("portfolio.DELIVERY_INBOUND")
         self.BUY = self._i18n.get("account.BUY")
@@ -42,22 +167,41 @@ class LedgerProcessor:
         self._df = dataframe
         self._fiat_currency = fiat_currency
         self._rate_provider = rate_provider
+
+        # Optional pre-flight check of the needed rates: "strict" raises on gaps, "mark" books the affected
+        # transactions without rates (and marks their notes)
+        if rate_check not in (None, "strict", "mark"):
+            raise IllegalArgumentError(f"Unknown rate_check: {rate_check}")
+        self._rate_check = rate_check
+        self.missing_rates = MissingRates()
+
+        # Optional window in seconds, trade fills of one asset and side within it are booked as one transaction
+        self._trade_aggregator = None
+        if aggregate_trades is not None:
+            self._trade_aggregator = TradeAggregator(aggregate_trades, fiat_currency, self._asset_normalizer)
+
+        # Optional StakingRollup, the deliveries created by _process_staking are collected and rolled up per period
+        self._staking_rollup = staking_rollup
+        self._staking_rewards = []
         
         self.depot_current = depot_current
         self.depot_new = depot_new
         self.account = account
 
-        refids_to_ignore = refids_to_ignore.split(",")
-        refids_to_ignore = filter(lambda id: len(id)>0, refids_to_ignore)
-        self._refids_to_ignore = list(refids_to_ignore)
+        # A dry run only loads the ledger for stats(), no transactions are built
+        self.account_transactions = []
+        self.depot_transactions = []
+        if not dry_run:
+            self._process_transactions()
 
-        self._process_transactions()
+    def stats(self):
+        """Row and group statistics of the loaded ledger (see LedgerStats), computed without converting"""
+        with self._stage("stats"):
+            return LedgerStats(self._df, self._refids_to_ignore, self._asset_normalizer).as_dict()
+
+    def _stage(self, name):
+        return self._profiler.stage(name) if self._profiler is not None else NO_STAGE
 
-    def __create_dateandtime(row):
-        row["Date"] = row["time"].split()[0]
-        row["Time"] = row["time"].split()[1].split(".")[0]
-        return row
-    
     def __get_abs_amount(self, orig_amount):
         if not isinstance(orig_amount, numbers.Number):
             return orig_amount
@@ -79,53 +223,93 @@ class LedgerProcessor:
                 return amount, 1
 
     def _get_ids_summary(self, transactions):
-        ids = {}
-        for idt in ["refid", "txid"]:
-            ids[idt] = []
-            for t in transactions:
-                if idt in t and len(t[idt]) > 0:
-                    ids[idt].append(t[idt])
-            ids[idt] = list(set(ids[idt]))
-
-        result = ",".join(sorted(ids["refid"]))
-        if len(ids["txid"]) > 0:
-            result += "," + ",".join(sorted(ids["txid"]))
-        return result
+        """Note text "refid(s),txid(s)" of a group, each part unique and sorted"""
+        if len(transactions) == 1:
+            # most groups (nondup rows: staking, earn, transfers) consist of one row
+            refid, txid = transactions[0].get("refid"), transactions[0].get("txid")
+            if txid:
+                return f"{refid},{txid}" if refid else f",{txid}"
+            return refid or ""
+
+        refids = ",".join(sorted({t["refid"] for t in transactions if t.get("refid")}))
+        txids = sorted({t["txid"] for t in transactions if t.get("txid")})
+        return refids + "," + ",".join(txids) if txids else refids
 
     def _generate_csv_from(self, transactions):
-        result_csv = "\n"
-        for t in transactions:
-            result_csv = result_csv + t.to_csv() + "\n"
-        return result_csv
+        return "\n" + "".join(t.to_csv() + "\n" for t in transactions)
 
-    def store_depot_normal_transactions(self, output_filename):
+    def render_depot_normal_transactions(self):
         transactions = self.get_transactions().get(self.DEPOT_NORMAL_TRANSACTIONS, [])
-        csv_output = self._depot_csv_header + self._generate_csv_from(transactions)
+        with self._stage("render"):
+            return self._depot_csv_header + self._generate_csv_from(transactions)
 
-        with open(output_filename, "w") as file:
-            file.write(csv_output)
-    
-    def store_depot_special_transactions(self, output_filename):
+    def render_depot_special_transactions(self):
         transactions = self.get_transactions().get(self.DEPOT_SPECIAL_TRANSACTIONS, [])
-        csv_output = self._depot_csv_header + self._generate_csv_from(transactions)
+        with self._stage("render"):
+            csv_output = self._depot_csv_header + self._generate_csv_from(transactions)
 
         # This is necessary as inbound deliveries are not supported by PP CSV Import
         # During the import in PP check the box to transform buys into inbound deliveries (see README.md)
-        csv_output = csv_output.replace(
+        return csv_output.replace(
             f";{self.DELIVERY_INBOUND};",
             f";{self.BUY};"
         )
 
-        with open(output_filename, "w") as file:
-            file.write(csv_output)
-    
-    def store_account_transactions(self, output_filename):
+    def render_account_transactions(self):
         transactions = self.get_transactions().get(self.ACCOUNT_TRANSACTIONS, [])
-        csv_output = self._account_csv_header + self._generate_csv_from(transactions)
+        with self._stage("render"):
+            return self._account_csv_header + self._generate_csv_from(transactions)
 
-        with open(output_filename, "w") as file:
+    def render_transactions(self):
+        """Returns the content of all three CSV files, keyed by their default file name"""
+        return {
+            self.DEPOT_NORMAL_FILENAME: self.render_depot_normal_transactions(),
+            self.DEPOT_SPECIAL_FILENAME: self.render_depot_special_transactions(),
+            self.ACCOUNT_FILENAME: self.render_account_transactions(),
+        }
+
+    def store_depot_normal_transactions(self, output_filename):
+        csv_output = self.render_depot_normal_transactions()
+        with self._stage("write"), open_text(output_filename, "w", encoding=None) as file:
             file.write(csv_output)
     
+    def store_depot_special_transactions(self, output_filename):
+        csv_output = self.render_depot_special_transactions()
+        with self._stage("write"), open_text(output_filename, "w", encoding=None) as file:
+            file.write(csv_output)
+    
+    def store_account_transactions(self, output_filename):
+        csv_output = self.render_account_transactions()
+        with self._stage("write"), open_text(output_filename, "w", encoding=None) as file:
+            file.write(csv_output)
+
+    def store_transactions(self, out_dir, compression=None):
+        """compression: None, "gz" or "zst" (appended to the file names)"""
+        suffix = COMPRESSIONS[compression] if compression is not None else ""
+        self.store_depot_normal_transactions(f"{out_dir}/{self.DEPOT_NORMAL_FILENAME}{suffix}")
+        self.store_depot_special_transactions(f"{out_dir}/{self.DEPOT_SPECIAL_FILENAME}{suffix}")
+        self.store_account_transactions(f"{out_dir}/{self.ACCOUNT_FILENAME}{suffix}")
+
+    def to_frames(self):
+        """The transactions as DataFrames with typed columns (see transaction_frames), keyed like get_transactions()"""
+        transactions = self.get_transactions()
+        with self._stage("frames"):
+            return {
+                self.ACCOUNT_TRANSACTIONS: account_frame(transactions[self.ACCOUNT_TRANSACTIONS]),
+                self.DEPOT_NORMAL_TRANSACTIONS: depot_frame(transactions[self.DEPOT_NORMAL_TRANSACTIONS]),
+                self.DEPOT_SPECIAL_TRANSACTIONS: depot_frame(transactions[self.DEPOT_SPECIAL_TRANSACTIONS]),
+            }
+
+    def store_frames(self, out_dir, format="parquet"):
+        """Writes to_frames() as parquet, feather or arrow files, named like the CSV files (needs pyarrow)"""
+        frames = self.to_frames()
+        with self._stage("write"):
+            store_frames({
+                self.DEPOT_NORMAL_FILENAME: frames[self.DEPOT_NORMAL_TRANSACTIONS],
+                self.DEPOT_SPECIAL_FILENAME: frames[self.DEPOT_SPECIAL_TRANSACTIONS],
+                self.ACCOUNT_FILENAME: frames[self.ACCOUNT_TRANSACTIONS],
+            }, out_dir, format)
+
     def _process_fiat_deposit(self, transaction_id, transaction):
         raw_transactions = list(sorted(transaction["raw"], key=lambda item: item["time"], reverse=True))
 
@@ -215,13 +399,14 @@ class LedgerProcessor:
         time = lt["Time"]
         amount = lt["amount"]
         asset_normalized = self.__normalize_currency_abbreviation(lt["asset"])
+        note_ids = self._mark_missing_rate(note_ids, asset_normalized, date_time)
 
         rate = "DUMMYRATE"
         value = "DUMMYVAL"
         total = "DUMMYTOTAL"
-        if self._rate_provider:
+        if self._has_rate(asset_normalized, date_time):
             rate = self._rate_provider.get_rate(asset_normalized, date_time)
-            value = round(amount * rate, 8)
+            value = fixed_point.multiply(amount, rate)
             total = value
 
         dt = DepotTransaction(date,
@@ -253,12 +438,7 @@ class LedgerProcessor:
         return ats, dts
 
     def __normalize_currency_abbreviation(self, crypto_currency):
-        if crypto_currency[0] == 'Z' or crypto_currency[0] == 'X':
-            return crypto_currency[1:]
-        elif "." in crypto_currency:
-            return crypto_currency.split(".")[0]
-        else:
-            return crypto_currency
+        return self._asset_normalizer.normalize(crypto_currency)
     
     def __are_same_currency(self, observed_currency, expected_currency):
         if expected_currency in observed_currency:
@@ -278,7 +458,7 @@ class LedgerProcessor:
         tcrypto_transactions = list(filter(lambda t: not self.__are_same_currency(t["asset"], self._fiat_currency), raw_transactions))
 
         if len(tfiat_transactions) != 1 or len(tcrypto_transactions) != 1:
-            self.__print_transaction_debug_info("Trade does not consist of 1 fiat and 1 crypto transaction, skipping...", transaction)
+            self._diagnostics.unhandled("TRADE", "Trade does not consist of 1 fiat and 1 crypto transaction, skipping", transaction_id, transaction)
             return [], []
 
         tfiat = tfiat_transactions[0]
@@ -317,7 +497,8 @@ class LedgerProcessor:
         }
         """
 
-        note_ids = self._get_ids_summary(raw_transactions)
+        # aggregated fills keep the ids of all their ledger rows
+        note_ids = self._get_ids_summary(transaction.get("meta", {}).get(AGGREGATED_ROWS, raw_transactions))
         crypto_currency = self.__normalize_currency_abbreviation(tcrypto["asset"])
 
         date = tcrypto["Date"]
@@ -341,9 +522,9 @@ class LedgerProcessor:
         
         if isinstance(fiat_amount, numbers.Number) and isinstance(fee_fiat, numbers.Number):
             if is_buy_transaction:
-                total = fiat_amount + fee_fiat
+                total = fixed_point.add(fiat_amount, fee_fiat)
             else:
-                total = fiat_amount - fee_fiat
+                total = fixed_point.add(fiat_amount, -fee_fiat)
         elif isinstance(fiat_amount, numbers.Number):
             total = fiat_amount
         else:
@@ -352,7 +533,7 @@ class LedgerProcessor:
         transaction_type = self.BUY if is_buy_transaction else self.SELL
 
         if fee_crypto != "":
-            fee_value = round(fee_crypto * rate, 8)
+            fee_value = fixed_point.multiply(fee_crypto, rate)
         else:
             fee_value = ""
         
@@ -504,19 +685,19 @@ class LedgerProcessor:
         transaction_total = "DUMMYTOTAL"
         fee_total = "DUMMYFEES"
 
-        if self._rate_provider:
+        if self._has_rate(asset_normalized, date_time):
             rate = self._rate_provider.get_rate(asset_normalized, date_time)
 
             # Transfer
-            transaction_value = round(transaction_amount * rate, 8)
+            transaction_value = fixed_point.multiply(transaction_amount, rate)
             transaction_total = transaction_value
 
             # Fees
             fee_f = transaction_fee
-            fee_value = round(fee_f * rate, 8)
+            fee_value = fixed_point.multiply(fee_f, rate)
             fee_total = fee_value
 
-        note_ids = self._get_ids_summary(raw_transactions)
+        note_ids = self._mark_missing_rate(self._get_ids_summary(raw_transactions), asset_normalized, date_time)
 
         transfert = DepotTransaction(date,
                                      time,
@@ -607,13 +788,13 @@ class LedgerProcessor:
         value = "DUMMYVAL"
         total = "DUMMYTOTAL"
 
-        if self._rate_provider:
+        if self._has_rate(asset_normalized, date_time):
             rate = self._rate_provider.get_rate(asset_normalized, date_time)
 
-            value = round(amount * rate, 8)
+            value = fixed_point.multiply(amount, rate)
             total = value
 
-        note_ids = self._get_ids_summary(raw_transactions)
+        note_ids = self._mark_missing_rate(self._get_ids_summary(raw_transactions), asset_normalized, date_time)
 
         dt = DepotTransaction(date,
                               time,
@@ -630,80 +811,53 @@ class LedgerProcessor:
                               note_ids
                              )
 
+        if self._staking_rollup is not None:
+            self._staking_rewards.append(dt)
         return [], [dt]
     
     def __is_staking_transfer(self, transaction):
-        for t in transaction.get("raw", []):
-            subtype = t.get("subtype", "")
-            if subtype == "spotfromfutures" or \
-                subtype == "spottostaking" or \
-                subtype == "stakingfromspot" or \
-                subtype == "stakingtospot" or \
-                subtype == "spotfromstaking" or \
-                subtype == "allocation" or \
-                subtype == "deallocation" or \
-                subtype == "migration":
-                return True
-        return False
+        return any(t.get("subtype", "") in self.STAKING_TRANSFER_SUBTYPES for t in transaction.get("raw", []))
 
-    def __print_transaction_debug_info(self, message, transaction):
-        print(message + ", detailed transaction:", json.dumps(transaction))
+    def __process_transfer(self, code, transaction_id, transaction):
+        if self.__is_staking_transfer(transaction):
+            self._diagnostics.staking_transfer(transaction_id, transaction)
+        else:
+            self._diagnostics.unhandled(code, "Can't process unknown case", transaction_id, transaction)
+        return [], []
 
-    def _process_transaction(self, transaction_id, transaction):
+    def _branch(self, transaction):
         parsing_info = transaction.get("meta", {}).get("parsing_info", "")
         transaction_types = set(transaction.get("types", []))
+        return transaction.get("meta", {}).get(FORCED_BRANCH) or self.dispatch_branch(parsing_info, transaction_types)
 
-        if parsing_info in ["dup", "nondup"] and transaction_types == {"deposit"}:
+    def _process_transaction(self, transaction_id, transaction):
+        branch = self._branch(transaction)
+        if branch == "deposit":
             return self._process_deposit(transaction_id, transaction)
-        elif parsing_info == "dup" and transaction_types == {"withdrawal"}:
+        elif branch == "withdrawal":
             return self._process_withdrawal(transaction_id, transaction)
-        elif parsing_info in ["dup", "nondup"] and transaction_types == {"trade"}:
+        elif branch == "trade":
             return self._process_trade(transaction_id, transaction)
-        elif parsing_info == "dup" and transaction_types == {"spend","receive"}:
-            return self._process_trade(transaction_id, transaction)
-        elif parsing_info == "dup_asset_amount_match" and transaction_types == {"deposit","staking"}:
-            return self._process_staking(transaction_id, transaction)
-        elif parsing_info == "nondup" and transaction_types == {"staking"}:
+        elif branch == "staking":
             return self._process_staking(transaction_id, transaction)
-        elif parsing_info == "nondup" and transaction_types == {"earn"}:
-            return self._process_staking(transaction_id, transaction)
-        elif parsing_info == "nondup" and transaction_types == {"transfer"}:
-            if self.__is_staking_transfer(transaction):
-                print(f"Ignoring staking transfer... ({parsing_info}, {transaction_types})")
-                return [], []
-            else:
-                self.__print_transaction_debug_info(f"Can't process unknown case [NDT] ({parsing_info}, {transaction_types})", transaction)
-                return [], []
-        elif parsing_info == "dup" and transaction_types == {"transfer", "withdrawal"}:
-            if self.__is_staking_transfer(transaction):
-                print(f"Ignoring staking transfer... ({parsing_info}, {transaction_types})")
-                return [], []
-            else:
-                self.__print_transaction_debug_info(f"Can't process unknown case [DTW-NS] ({parsing_info}, {transaction_types})", transaction)
-                return [], []
-        elif parsing_info == "dup" and transaction_types == {"deposit", "transfer"}:
-            if self.__is_staking_transfer(transaction):
-                print(f"Ignoring staking transfer... ({parsing_info}, {transaction_types})")
-                return [], []
-            else:
-                self.__print_transaction_debug_info(f"Can't process unknown case [DDT-NS] ({parsing_info}, {transaction_types}): ", transaction)
-                return [], []
-        elif parsing_info == "dup" and transaction_types == {"earn"}:
-            if self.__is_staking_transfer(transaction):
-                print(f"Ignoring staking transfer... ({parsing_info}, {transaction_types})")
-                return [], []
-            else:
-                self.__print_transaction_debug_info(f"Can't process unknown case [DE-NS] ({parsing_info}, {transaction_types}): ", transaction)
-                return [], []
-        elif parsing_info == "nondup" and transaction_types == {"withdrawal"}:
+        elif branch in self.TRANSFER_BRANCHES:
+            return self.__process_transfer(branch, transaction_id, transaction)
+        elif branch == "fiat_withdrawal":
             return self._process_fiat_withdrawal(transaction_id, transaction)
+        elif branch == "FP":
+            self._diagnostics.unhandled("FP", "Can't process unknown case, but could be false positive", transaction_id, transaction)
+            return [], []
         else:
-            if parsing_info == "dup_asset_amount_match":
-                self.__print_transaction_debug_info(f"Can't process unknown case, but could be false positive [FP] ({parsing_info}, {transaction_types})", transaction)
-                return [], []
-            else:
-                self.__print_transaction_debug_info(f"Can't process unknown case [ELSE] ({parsing_info}, {transaction_types})", transaction)
-                return [], []
+            self._diagnostics.unhandled("ELSE", "Can't process unknown case", transaction_id, transaction)
+            return [], []
+
+    @classmethod
+    def dispatch_branch(cls, parsing_info, transaction_types):
+        """Handler branch of a group: a key of DISPATCH_TABLE, FP (unmatched dup_asset_amount_match) or ELSE"""
+        branch = cls._DISPATCH.get((parsing_info, frozenset(transaction_types)))
+        if branch is not None:
+            return branch
+        return "FP" if parsing_info == "dup_asset_amount_match" else "ELSE"
     
     def get_transactions(self):
         account_transactions = self.account_transactions
@@ -716,16 +870,123 @@ class LedgerProcessor:
             self.DEPOT_SPECIAL_TRANSACTIONS: depot_special_transactions,
         }
     
+    def _required_rates(self, transactions):
+        """
+        (PP asset name, day) of every rate the handlers will look up: staking, crypto deposits and withdrawals,
+        plus the delivery days of rolled-up staking rewards valued at the end of their period
+        """
+        pairs = []
+        staking_pairs = []
+        for transaction in transactions.values():
+            branch = self._branch(transaction)
+            if branch not in ("deposit", "withdrawal", "staking"):
+                continue
+            raw_transactions = transaction["raw"]
+            currencies = set(t["asset"] for t in raw_transactions)
+            # same fiat detection as _process_deposit and _process_withdrawal
+            if branch == "deposit" and len(currencies) == 1 and self.__currency_is_in_set(currencies, self._fiat_currency):
+                continue
+            if branch == "withdrawal" and self.__currency_is_in_set(currencies, self._fiat_currency):
+                continue
+            lt = max(raw_transactions, key=lambda item: item["time"])
+            pair = (self.__normalize_currency_abbreviation(lt["asset"]), str(lt["time"])[:10])
+            pairs.append(pair)
+            if branch == "staking":
+                staking_pairs.append(pair)
+        if self._staking_rollup is not None:
+            pairs += self._staking_rollup.required_rates(staking_pairs)
+        return pairs
+
+    def _has_rate(self, asset_normalized, date_time):
+        return bool(self._rate_provider) and (asset_normalized, str(date_time)[:10]) not in self.missing_rates.pairs
+
+    def _mark_missing_rate(self, note, asset_normalized, date_time):
+        if (asset_normalized, str(date_time)[:10]) in self.missing_rates.pairs:
+            return f"{self.MISSING_RATE_NOTE} {note}"
+        return note
+
+    def _force_branches(self, transactions):
+        """Marks the groups containing a row matched by a force rule with the rule's branch"""
+        if self._cached_transactions is not None:
+            # the ledger was not loaded, the rules are matched against the cached rows
+            import pandas as pd
+            rows = [row for transaction in transactions.values() for row in transaction["raw"]]
+            self._forced_branches = self._rules.forced_branches(pd.DataFrame(rows)) if rows else {}
+        if not self._forced_branches:
+            return
+        for transaction in transactions.values():
+            for row in transaction["raw"]:
+                branch = self._forced_branches.get(row["refid"]) or self._forced_branches.get(row["txid"])
+                if branch is not None:
+                    transaction.setdefault("meta", {})[FORCED_BRANCH] = branch
+                    break
+
     def _process_transactions(self):
-        transactions = self._parse_transactions()
+        profiler = self._profiler
+
+        if self._cached_transactions is not None:
+            transactions = self._cached_transactions
+            if profiler is not None:
+                profiler.count("group_cache_hits")
+        else:
+            with self._stage("parse_group"):
+                transactions = self._parse_transactions()
+            if self._group_cache is not None:
+                with self._stage("cache_store"):
+                    self._group_cache.store(self._group_cache_key, transactions,
+                                            self.balance_divergences if self._balance_check is not None else None)
+
+        if self._rules is not None:
+            with self._stage("rules"):
+                self._force_branches(transactions)
+            # with cached groups the ignore rules were applied when they were built
+            self._rules.log_match_counts(("force",) if self._cached_transactions is not None else ACTIONS)
+
+        if self._trade_aggregator is not None:
+            with self._stage("aggregate_trades"):
+                transactions = self._trade_aggregator.aggregate(transactions)
+            if profiler is not None:
+                profiler.count("aggregated_trade_groups", self._trade_aggregator.merged_groups)
+
+        if self._rate_check is not None and self._rate_provider is not None:
+            with self._stage("rate_coverage"):
+                self.missing_rates = RateCoverageChecker(self._rate_provider).check(self._required_rates(transactions))
+            if self.missing_rates and self._rate_check == "strict":
+                raise RateCoverageError(str(self.missing_rates))
+            if self.missing_rates:
+                logger.warning("%s\nThe affected transactions are booked without rates, their notes start with %s",
+                               self.missing_rates, self.MISSING_RATE_NOTE)
 
         account_transactions = []
         depot_transactions = []
 
-        for transaction_id, transaction in transactions.items():
-            new_account_transactions, new_depot_transactions = self._process_transaction(transaction_id, transaction)
-            account_transactions.extend(new_account_transactions)
-            depot_transactions.extend(new_depot_transactions)
+        with self._stage("process"):
+            for transaction_id, transaction in transactions.items():
+                if profiler is not None:
+                    parsing_info = transaction.get("meta", {}).get("parsing_info", "")
+                    combination = f"{parsing_info}:{'+'.join(sorted(set(transaction.get('types', []))))}"
+                    profiler.count(f"groups[{combination}]")
+                    profiler.count(f"rows[{combination}]", len(transaction.get("raw", [])))
+                new_account_transactions, new_depot_transactions = self._process_transaction(transaction_id, transaction)
+                account_transactions.extend(new_account_transactions)
+                depot_transactions.extend(new_depot_transactions)
+
+        if self._staking_rollup is not None and self._staking_rewards:
+            with self._stage("staking_rollup"):
+                rewards = set(map(id, self._staking_rewards))
+                depot_transactions = ([t for t in depot_transactions if id(t) not in rewards]
+                                      + self._staking_rollup.roll_up(self._staking_rewards, self.missing_rates.pairs))
+            self._staking_rewards = []
+
+        if profiler is not None:
+            if self._df is not None:
+                profiler.count("rows", len(self._df))
+            profiler.count("groups", len(transactions))
+            profiler.count("account_transactions", len(account_transactions))
+            profiler.count("depot_transactions", len(depot_transactions))
+
+        if self._owns_diagnostics:
+            self._diagnostics.log_summary()
         
         self.account_transactions = account_transactions
         self.depot_transactions = depot_transactions
@@ -733,14 +994,17 @@ class LedgerProcessor:
     def _parse_transactions(self):
         df = self._df
         df = df.fillna("")
-        df = df.apply(LedgerProcessor.__create_dateandtime, axis=1)
+        # "YYYY-MM-DD HH:MM:SS[.ffff]" -> Date and Time (without fractions), column-wise
+        times = df["time"].astype(str).str.split()
+        df["Date"] = times.str[0]
+        df["Time"] = times.str[1].str.split(".").str[0]
         df = df.sort_values(['refid', 'time'], ascending = [True, True])
 
         raw_ledger = df.to_dict('records')    
 
         refid_dups = df.groupby('refid').count()
         refid_dups = refid_dups[refid_dups["txid"] > 1]
-        refid_dups = list(refid_dups.index)
+        refid_dups = set(refid_dups.index)
 
         transactions = {}
 
@@ -768,25 +1032,29 @@ class LedgerProcessor:
             transactions[refid]["meta"]["parsing_info"] = "dup"
 
         # Process transactions classified as dups which have a missing refid
-        unknown_nondups = []
+        unknown_nondups = set()
         if "Unknown" in transactions:
             unknown_transactions = transactions["Unknown"]
             del transactions["Unknown"]
 
             # unknown_dups can be ignored, they are transactions that add and subtract same amount of same asset
             # let's search for unknown nondups, which are real transactions with wrong refid due to a Kraken bug.
-
-            unknown_df = pd.DataFrame(unknown_transactions.get("raw", []))
-            unknown_df["abs_amount"] = unknown_df["amount"].apply(self.__get_abs_amount)
-            unknown_df["norm_asset"] = unknown_df["asset"].apply(self.__normalize_currency_abbreviation)
-            unknown_nondups = unknown_df.groupby(["abs_amount", "norm_asset"], as_index=False).agg({'txid':'first', 'refid':'count'})
-            unknown_nondups = unknown_nondups[unknown_nondups["refid"] < 2]
-            unknown_nondups = list(unknown_nondups["txid"])
-
-            unknown_nondups_to_process = list(filter(lambda item: item["txid"] in unknown_nondups, raw_ledger))
-            for entry in unknown_nondups_to_process:
+            # Only the Unknown rows are looked at, with column operations instead of per-row calls.
+
+            import pandas as pd
+            unknown_raw = unknown_transactions.get("raw", [])
+            unknown_df = pd.DataFrame(unknown_raw, columns=["txid", "asset", "amount"])
+            amounts = pd.to_numeric(unknown_df["amount"], errors="coerce")
+            unknown_df["abs_amount"] = amounts.abs().where(amounts.notna(), unknown_df["amount"])
+            unknown_df["norm_asset"] = self._asset_normalizer.normalize_column(unknown_df["asset"])
+            is_unknown_nondup = ~unknown_df.duplicated(["abs_amount", "norm_asset"], keep=False)
+
+            for entry, is_nondup in zip(unknown_raw, is_unknown_nondup):
+                if not is_nondup:
+                    continue
                 entry["refid"] = entry["txid"]
                 refid = entry["refid"]
+                unknown_nondups.add(refid)
 
                 if refid not in transactions:
                     transactions[refid] = {}
@@ -795,7 +1063,7 @@ class LedgerProcessor:
                     transactions[refid]["meta"] = {}
 
                     transactions[refid]["raw"].append(entry)
-                    transactions[refid]["types"].append(etype)
+                    transactions[refid]["types"].append(entry["type"])
                     transactions[refid]["meta"]["parsing_info"] = "nondup"
                 else:
                     pass  # It is enough to add these once, as they are the same entry twice
@@ -804,6 +1072,11 @@ class LedgerProcessor:
             return item["refid"] not in refid_dups and item["refid"] != "Unknown"
         
         nondups_to_process = list(filter(dupfilter, raw_ledger))
+        # only rows of the same asset, amount and day can match, so each row is compared with those instead of all rows
+        same_asset_amount_date = {}
+        for other_entry in nondups_to_process:
+            same_asset_amount_date.setdefault((other_entry["asset"], other_entry["amount"], other_entry["Date"]), []).append(other_entry)
+
         for entry in nondups_to_process:
             refid = entry["refid"]
             etype = entry["type"]
@@ -819,7 +1092,7 @@ class LedgerProcessor:
 
             found_matching_transactions = refid in unknown_nondups
 
-            for other_entry in nondups_to_process:
+            for other_entry in same_asset_amount_date[(asset, amount, date)]:
                 other_refid = other_entry["refid"]
                 other_etype = other_entry["type"]
                 other_txid = other_entry["txid"]
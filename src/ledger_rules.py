@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Ledger rules module
+
+Rules ignore ledger rows before grouping, or force the groups of the matched
+rows into a handler branch of LedgerProcessor (e.g. "staking" or "trade").
+A rule matches a row when all of its fields match: refid, txid, asset
+(compared by PP name, so XXBT also matches XBT.M), type, subtype and an
+inclusive from/to day range. Rules are read from JSON, YAML (needs the
+optional PyYAML package) or CSV files:
+
+    [{"action": "ignore", "refid": "QGEAOWO-KDDLPS-SEZYR4"},
+     {"action": "ignore", "asset": "XTZ", "type": "transfer", "to": "2021-12-31"},
+     {"action": "force", "refid": "ABCDEF-GHIJK-LMNOPQ", "branch": "staking"}]
+
+Rules are compiled into one hash map per combination of fields, so matching
+costs one lookup per row and combination, however many rules there are.
+Rules with equal fields and values (e.g. several day ranges of one asset) are
+spread over a few lookups. The number of rows matched by each rule is
+reported.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import csv
+import hashlib
+import json
+import logging
+
+from .assets import DEFAULT_NORMALIZER
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("refid", "txid", "asset", "type", "subtype")
+ACTIONS = ("ignore", "force")
+# meta entry of a group forced into a branch by a rule
+FORCED_BRANCH = "forced_branch"
+_KEY_SEP = "\x1f"
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("Reading YAML rules needs the PyYAML package (pip install pyyaml), or use JSON/CSV") from None
+    return yaml
+
+
+class LedgerRules:
+
+    def __init__(self, rules, asset_normalizer=None):
+        """rules: list of dicts with an action ("ignore"/"force"), any of FIELDS, from/to ("YYYY-MM-DD") and branch (force)"""
+        self._asset_normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+        self._rules = []
+        for number, rule in enumerate(rules, start=1):
+            rule = {key: str(value) for key, value in rule.items() if value not in (None, "")}
+            unknown = set(rule) - set(FIELDS) - {"action", "from", "to", "branch"}
+            if unknown:
+                raise ValueError(f"Rule {number}: unknown field(s) {', '.join(sorted(unknown))}")
+            if rule.get("action") not in ACTIONS:
+                raise ValueError(f"Rule {number}: action must be one of {', '.join(ACTIONS)}")
+            if (rule["action"] == "force") != ("branch" in rule):
+                raise ValueError(f"Rule {number}: force rules (and only they) need a branch")
+            if "asset" in rule:
+                rule["asset"] = self._asset_normalizer.normalize(rule["asset"])
+            self._rules.append(rule)
+        self._counts = [0] * len(self._rules)
+        self._compiled = {action: self._compile(action) for action in ACTIONS}
+
+    @classmethod
+    def from_file(cls, filename, asset_normalizer=None):
+        name = str(filename).lower()
+        with open(filename, encoding="utf-8", newline="" if name.endswith(".csv") else None) as f:
+            if name.endswith(".csv"):
+                rules = list(csv.DictReader(f))
+            elif name.endswith((".yaml", ".yml")):
+                rules = _yaml().safe_load(f) or []
+            else:
+                rules = json.load(f)
+        return cls(rules, asset_normalizer)
+
+    def __repr__(self):
+        digest = hashlib.sha256(json.dumps(self._rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return f"LedgerRules({len(self._rules)} rules, {digest})"
+
+    def __len__(self):
+        return len(self._rules)
+
+    def branches(self):
+        """Branches named by the force rules"""
+        return {rule["branch"] for rule in self._rules if rule["action"] == "force"}
+
+    def _compile(self, action):
+        """[(fields, [layer: {key: rule index}])], the n-th layer holds the n-th rule of each key"""
+        signatures = {}
+        for index, rule in enumerate(self._rules):
+            if rule["action"] != action:
+                continue
+            fields = tuple(field for field in FIELDS if field in rule)
+            key = _KEY_SEP.join(rule[field] for field in fields)
+            layers = signatures.setdefault(fields, [])
+            for layer in layers:
+                if key not in layer:
+                    layer[key] = index
+                    break
+            else:
+                layers.append({key: index})
+        return list(signatures.items())
+
+    def _columns(self, df):
+        import pandas as pd
+
+        columns = {field: df[field].fillna("").astype(str) if field in df else pd.Series("", index=df.index)
+                   for field in FIELDS}
+        columns["asset"] = self._asset_normalizer.normalize_column(columns["asset"])
+        columns["day"] = df["time"].astype(str).str[:10].to_numpy(dtype=object)
+        return columns
+
+    def _matches(self, action, columns):
+        """Yields (row positions, rule indexes) of all matches of the rules of one action"""
+        import numpy as np
+        import pandas as pd
+
+        days = columns["day"]
+        for fields, layers in self._compiled[action]:
+            if fields:
+                keys = columns[fields[0]]
+                for field in fields[1:]:
+                    keys = keys + _KEY_SEP + columns[field]
+            else:
+                keys = pd.Series("", index=columns["refid"].index)
+            for layer in layers:
+                indexes = keys.map(layer).fillna(-1).astype(np.int64).to_numpy()
+                hit = indexes >= 0
+                if not hit.any():
+                    continue
+                positions = np.flatnonzero(hit)
+                rules = indexes[positions]
+                starts = np.array([self._rules[index].get("from", "") for index in rules], dtype=object)
+                ends = np.array([self._rules[index].get("to", "9999-99-99") for index in rules], dtype=object)
+                in_range = (days[positions] >= starts) & (days[positions] <= ends)
+                yield positions[in_range], rules[in_range]
+
+    def _count(self, rules):
+        import numpy as np
+
+        for index, count in enumerate(np.bincount(rules, minlength=len(self._rules))):
+            self._counts[index] += int(count)
+
+    def ignore_mask(self, df):
+        """Boolean numpy array: rows matched by an ignore rule"""
+        import numpy as np
+
+        mask = np.zeros(len(df), dtype=bool)
+        if not self._compiled["ignore"]:
+            return mask
+        columns = self._columns(df)
+        for positions, rules in self._matches("ignore", columns):
+            mask[positions] = True
+            self._count(rules)
+        return mask
+
+    def forced_branches(self, df):
+        """{refid or txid: branch} of the rows matched by force rules (the first matching rule wins)"""
+        import numpy as np
+
+        if not self._compiled["force"]:
+            return {}
+        columns = self._columns(df)
+        first_rule = np.full(len(df), len(self._rules), dtype=np.int64)
+        for positions, rules in self._matches("force", columns):
+            first_rule[positions] = np.minimum(first_rule[positions], rules)
+            self._count(rules)
+
+        forced = {}
+        for position in np.flatnonzero(first_rule < len(self._rules)):
+            branch = self._rules[first_rule[position]]["branch"]
+            for field in ("refid", "txid"):
+                value = columns[field].iat[position]
+                if value:
+                    forced[value] = branch
+        return forced
+
+    def apply(self, df):
+        """(df without the ignored rows, forced branches of the remaining rows)"""
+        df = df[~self.ignore_mask(df)]
+        return df, self.forced_branches(df)
+
+    def match_counts(self):
+        """[(rule, number of matched rows)] in file order"""
+        return list(zip(self._rules, self._counts))
+
+    def log_match_counts(self, actions=ACTIONS):
+        for number, (rule, count) in enumerate(self.match_counts(), start=1):
+            if rule["action"] not in actions:
+                continue
+            log = logger.warning if count == 0 else logger.info
+            log("Rule %d %s matched %d row(s)", number, json.dumps(rule, sort_keys=True), count)
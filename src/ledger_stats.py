@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Ledger statistics module
+
+Summarizes what a conversion would do without converting: rows per
+type/subtype and asset, the covered time range, and the groups per
+parsing_info and per handler branch of LedgerProcessor, including the groups
+that would end up as unknown cases. The grouping of
+LedgerProcessor._parse_transactions is reproduced with column operations
+(group sizes, duplicate masks and per-group type bitmasks), no transaction
+objects are built and no rates are looked up.
+
+Groups of nondup rows with the same asset, amount and day
+(dup_asset_amount_match) are counted per asset and amount like in
+LedgerProcessor; their types are the types of all such rows.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+from .assets import DEFAULT_NORMALIZER
+from .diagnostics import Diagnostics
+
+UNKNOWN_REFID = "Unknown"
+
+
+class LedgerStats:
+
+    def __init__(self, df, refids_to_ignore=(), asset_normalizer=None):
+        self._df = df
+        self._refids_to_ignore = set(refids_to_ignore)
+        self._asset_normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+
+    def _group_rows(self, pd):
+        """One row per (group, ledger row): the group key, its parsing_info, the row type and subtype"""
+        df = pd.DataFrame({
+            column: self._df[column].fillna("").astype(str) if column in self._df else ""
+            for column in ["refid", "txid", "type", "subtype", "asset"]
+        })
+        df["amount"] = self._df["amount"]
+        df["day"] = self._df["time"].astype(str).str[:10]
+
+        ignored = df["refid"].isin(self._refids_to_ignore)
+        dup = df.groupby("refid")["refid"].transform("size") > 1
+        unknown = df["refid"] == UNKNOWN_REFID
+        parts = []
+
+        # dups: all rows of a refid with more than one row
+        rows = df[dup & ~unknown & ~ignored]
+        parts.append(rows.assign(key="dup:" + rows["refid"], parsing_info="dup"))
+
+        # rows with the Unknown refid (a Kraken bug): the ones without counterpart are nondups of their own
+        unknown_nondup_txids = set()
+        if (dup & unknown).any() and UNKNOWN_REFID not in self._refids_to_ignore:
+            rows = df[unknown]
+            abs_amounts = pd.to_numeric(rows["amount"], errors="coerce").abs()
+            assets = self._asset_normalizer.normalize_column(rows["asset"])
+            rows = rows[~pd.DataFrame({"amount": abs_amounts, "asset": assets}).duplicated(keep=False)]
+            unknown_nondup_txids = set(rows["txid"])
+            parts.append(rows.drop_duplicates("txid").assign(key="unknown:" + rows["txid"], parsing_info="nondup"))
+
+        # nondups: matched to other nondups with the same asset, amount and day, otherwise groups of their own
+        nondup = ~dup & ~unknown
+        amounts = df["amount"].astype(str)
+        matched = nondup & df[nondup].duplicated(["asset", "amount", "day"], keep=False).reindex(df.index, fill_value=False)
+        rows = df[matched]
+        match_keys = "match:" + rows["asset"] + "_" + amounts[matched]
+        keys_with_entries = set(match_keys[~ignored[matched]])
+        rows = rows.assign(key=match_keys, parsing_info="dup_asset_amount_match")
+        parts.append(rows[rows["key"].isin(keys_with_entries)])
+
+        rows = df[nondup & ~matched & ~ignored & ~df["refid"].isin(unknown_nondup_txids)]
+        parts.append(rows.assign(key="nondup:" + rows["refid"], parsing_info="nondup"))
+
+        return pd.concat(parts, ignore_index=True)
+
+    def _groups(self, pd):
+        """One row per group: parsing_info, bitmask of its types, whether it contains a staking transfer subtype"""
+        from .ledger_processor import LedgerProcessor
+
+        rows = self._group_rows(pd)
+        type_codes, types = pd.factorize(rows["type"])
+        rows["type_bits"] = 2 ** type_codes
+        rows["staking_subtype"] = rows["subtype"].isin(LedgerProcessor.STAKING_TRANSFER_SUBTYPES)
+
+        by_group = rows.groupby("key", sort=False)
+        groups = pd.DataFrame({
+            "parsing_info": by_group["parsing_info"].first(),
+            "staking_subtype": by_group["staking_subtype"].any(),
+        })
+        # a group's types as bitmask: OR of the distinct type bits (sum over the distinct ones)
+        distinct = rows.drop_duplicates(["key", "type_bits"])
+        groups["type_bits"] = distinct.groupby("key", sort=False)["type_bits"].sum()
+        return groups, list(types)
+
+    def as_dict(self):
+        import pandas as pd
+
+        from .ledger_processor import LedgerProcessor
+
+        df = self._df
+        stats = {"rows": len(df)}
+        if len(df) == 0:
+            return stats
+
+        times = df["time"].astype(str)
+        stats["first_time"], stats["last_time"] = times.min(), times.max()
+        subtypes = df["subtype"].fillna("").astype(str) if "subtype" in df else ""
+        type_subtype = df["type"].fillna("").astype(str) + "/" + subtypes
+        stats["rows_per_type"] = {key: int(count) for key, count in type_subtype.value_counts().sort_index().items()}
+        stats["rows_per_asset"] = {key: int(count) for key, count in df["asset"].astype(str).value_counts().sort_index().items()}
+        stats["ignored_rows"] = int(df["refid"].isin(self._refids_to_ignore).sum())
+
+        groups, types = self._groups(pd)
+        stats["groups"] = len(groups)
+        stats["groups_per_parsing_info"] = {key: int(count) for key, count in groups["parsing_info"].value_counts().sort_index().items()}
+
+        branches = {}
+        combinations = groups.groupby(["parsing_info", "type_bits", "staking_subtype"]).size()
+        for (parsing_info, type_bits, staking_subtype), count in combinations.items():
+            group_types = {name for code, name in enumerate(types) if int(type_bits) >> code & 1}
+            branch = LedgerProcessor.dispatch_branch(parsing_info, group_types)
+            if branch in LedgerProcessor.TRANSFER_BRANCHES and staking_subtype:
+                branch = Diagnostics.STAKING_TRANSFER
+            branches[branch] = branches.get(branch, 0) + int(count)
+        stats["groups_per_branch"] = dict(sorted(branches.items()))
+        stats["unknown_case_groups"] = sum(count for branch, count in branches.items()
+                                           if branch in LedgerProcessor.TRANSFER_BRANCHES or branch in ("FP", "ELSE"))
+        return stats
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+FIFO lot engine
+
+Consumes the DepotTransactions produced by LedgerProcessor (buys, sells,
+staking deliveries and the fee sells of trades and withdrawals) and keeps the
+open lots per asset in first-in-first-out order. Every sale is matched against
+the oldest lots and reported with its proceeds, cost basis and gain, split by
+the one-year holding period relevant for German taxes (§ 23 EStG).
+
+Lots are stored in array-backed queues (amount, cost per unit, acquisition
+day) with a moving head, so millions of tiny staking lots cost a few bytes
+each and every lot is touched a constant number of times.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import datetime
+import logging
+import numbers
+from array import array
+
+from .transactions import CSV_SEP, _format_number
+
+logger = logging.getLogger(__name__)
+
+# Amounts below this are rounding leftovers (Kraken amounts have 10 decimals)
+EPSILON = 1e-11
+
+
+def _one_year_before(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:  # 29th of February
+        return day.replace(year=day.year - 1, day=28)
+
+
+class _LotQueue:
+
+    def __init__(self):
+        self.amounts = array("d")
+        self.costs = array("d")  # cost per unit
+        self.days = array("l")  # acquisition day as date ordinal
+        self.head = 0
+
+    def __len__(self):
+        return len(self.amounts) - self.head
+
+    def append(self, amount, cost_per_unit, day):
+        self.amounts.append(amount)
+        self.costs.append(cost_per_unit)
+        self.days.append(day)
+
+    def take(self, amount, long_term_before):
+        """
+        Removes amount from the oldest lots, returns (taken, cost, long_term_amount, long_term_cost).
+        Lots acquired before the day ordinal long_term_before count as held for more than a year.
+        """
+        taken = cost = long_term_amount = long_term_cost = 0.0
+        amounts, costs, days = self.amounts, self.costs, self.days
+        head = self.head
+        while amount > EPSILON and head < len(amounts):
+            lot_amount = amounts[head]
+            used = lot_amount if lot_amount <= amount + EPSILON else amount
+            used_cost = used * costs[head]
+            if days[head] < long_term_before:
+                long_term_amount += used
+                long_term_cost += used_cost
+            taken += used
+            cost += used_cost
+            amount -= used
+            if lot_amount - used > EPSILON:
+                amounts[head] = lot_amount - used
+            else:
+                head += 1
+        self.head = head
+        self._compact()
+        return taken, cost, long_term_amount, long_term_cost
+
+    def _compact(self):
+        # drop consumed lots once they make up half of the arrays (amortized O(1) per lot)
+        if self.head > 1024 and self.head * 2 > len(self.amounts):
+            del self.amounts[:self.head]
+            del self.costs[:self.head]
+            del self.days[:self.head]
+            self.head = 0
+
+    def totals(self):
+        amounts, costs = self.amounts, self.costs
+        amount = sum(amounts[self.head:])
+        cost = sum(amounts[i] * costs[i] for i in range(self.head, len(amounts)))
+        return amount, cost
+
+
+class RealizedGain:
+    """One sale matched against FIFO lots"""
+
+    HEADER = CSV_SEP.join(["date", "time", "asset", "amount", "proceeds", "cost_basis", "gain",
+                           "amount_over_one_year", "gain_over_one_year", "uncovered_amount", "note"])
+
+    def __init__(self, date, time, asset, amount, proceeds, cost_basis, amount_over_one_year, gain_over_one_year,
+                 uncovered_amount=0.0, note=""):
+        self.date = date
+        self.time = time
+        self.asset = asset
+        self.amount = amount
+        self.proceeds = proceeds
+        self.cost_basis = cost_basis
+        self.gain = proceeds - cost_basis
+        self.amount_over_one_year = amount_over_one_year
+        self.gain_over_one_year = gain_over_one_year
+        self.uncovered_amount = uncovered_amount  # sold without matching lots (cost basis 0)
+        self.note = note
+
+    @property
+    def taxable_gain(self):
+        return self.gain - self.gain_over_one_year
+
+    def to_csv(self):
+        values = [self.amount, self.proceeds, self.cost_basis, self.gain,
+                  self.amount_over_one_year, self.gain_over_one_year, self.uncovered_amount]
+        return CSV_SEP.join([self.date, self.time, self.asset] + [_format_number(value) for value in values] + [self.note])
+
+
+class FifoLotEngine:
+
+    def __init__(self, inbound_types, outbound_types):
+        """
+        inbound_types: transaction types creating lots (e.g. LedgerProcessor.BUY and DELIVERY_INBOUND)
+        outbound_types: transaction types realizing lots (e.g. LedgerProcessor.SELL)
+        Other types (transfers between own depots) keep the lots untouched.
+        """
+        self._inbound_types = set(inbound_types)
+        self._outbound_types = set(outbound_types)
+        self._lots = {}  # asset -> _LotQueue
+        self.realized_gains = []
+
+    @classmethod
+    def for_processor(cls, ledger_processor):
+        return cls(inbound_types=[ledger_processor.BUY, ledger_processor.DELIVERY_INBOUND],
+                   outbound_types=[ledger_processor.SELL])
+
+    @staticmethod
+    def _value(transaction):
+        value = transaction.total if transaction.total != "" else transaction.value
+        if not isinstance(value, numbers.Number) or not isinstance(transaction.amount, numbers.Number):
+            raise ValueError(f"Transaction {transaction.note} has no value, FIFO lots need a rate provider")
+        return float(value)
+
+    def process(self, depot_transactions):
+        """Feeds all transactions in time order (the order of one timestamp is kept), returns the realized gains"""
+        for transaction in sorted(depot_transactions, key=lambda t: (t.date, t.time)):
+            self.feed(transaction)
+        return self.realized_gains
+
+    def feed(self, transaction):
+        if transaction.type in self._inbound_types:
+            amount = float(transaction.amount)
+            if amount > 0:
+                day = datetime.date.fromisoformat(transaction.date).toordinal()
+                self._lots.setdefault(transaction.asset, _LotQueue()).append(amount, self._value(transaction) / amount, day)
+        elif transaction.type in self._outbound_types:
+            self._sell(transaction)
+
+    def _sell(self, transaction):
+        amount = float(transaction.amount)
+        if amount <= EPSILON:
+            return
+        proceeds = self._value(transaction)
+        sale_day = datetime.date.fromisoformat(transaction.date)
+        lots = self._lots.get(transaction.asset)
+        if lots is None:
+            taken = cost = long_term_amount = long_term_cost = 0.0
+        else:
+            taken, cost, long_term_amount, long_term_cost = lots.take(amount, _one_year_before(sale_day).toordinal())
+
+        uncovered = amount - taken if amount - taken > EPSILON else 0.0
+        if uncovered:
+            logger.warning("Sale %s of %s %s exceeds the open lots by %s, assuming cost basis 0",
+                           transaction.note, amount, transaction.asset, uncovered)
+
+        long_term_proceeds = proceeds * long_term_amount / amount
+        self.realized_gains.append(RealizedGain(transaction.date, transaction.time, transaction.asset, amount, proceeds, cost,
+                                                long_term_amount, long_term_proceeds - long_term_cost, uncovered,
+                                                transaction.note))
+
+    def holdings(self):
+        """asset -> (open amount, cost basis of the open lots)"""
+        return {asset: lots.totals() for asset, lots in self._lots.items() if len(lots)}
+
+    def render_report(self):
+        return RealizedGain.HEADER + "\n" + "".join(gain.to_csv() + "\n" for gain in self.realized_gains)
+
+    def store_report(self, output_filename):
+        with open(output_filename, "w") as file:
+            file.write(self.render_report())
@@ -5,11 +5,20 @@ PortfolioPerformanceRateProvider
 Copyright 2022-05-16 AlexanderLill
 """
 import datetime
-import pandas as pd
 import locale
 
+from .compressed_io import open_text
+from .profiler import NO_STAGE
+
 class PortfolioPerformanceRateProvider:
-    def __init__(self, export_file, fiat_currency="EUR", time_format="%Y-%m-%d %H:%M:%S", language="de", currency_mapping=None):
+    CHUNK_ROWS = 10_000
+
+    def __init__(self, export_file, fiat_currency="EUR", time_format="%Y-%m-%d %H:%M:%S", language="de", currency_mapping=None, profiler=None,
+                 date_from=None, date_to=None, currencies=None):
+        """
+        date_from/date_to (datetime.date, inclusive) and currencies (e.g. ["XBT", "ETH"]) restrict
+        the loaded rates to the days and columns a partial conversion needs (None loads everything)
+        """
         if language == "en":
             self._thousands = ","
             self._decimal = "."
@@ -21,12 +30,86 @@ class PortfolioPerformanceRateProvider:
         self._export_file = export_file
         self._fiat_currency = fiat_currency
         self._time_format = time_format
-        self.__df = pd.read_csv(export_file, sep=self._sep, index_col=0, parse_dates=[0], thousands=self._thousands, decimal=self._decimal)
+        self._profiler = profiler
+        self._rate_cache = {}  # (crypto_currency, day) -> rate
+
+        import pandas as pd
+        with profiler.stage("load_rates") if profiler is not None else NO_STAGE:
+            if date_from is None and date_to is None and currencies is None:
+                with open_text(export_file) as f:
+                    self.__df = pd.read_csv(f, sep=self._sep, index_col=0, parse_dates=[0], thousands=self._thousands, decimal=self._decimal)
+            else:
+                self.__df = self._read_partial(pd, export_file, currency_mapping or {}, date_from, date_to, currencies)
         if currency_mapping is not None:
             self.__df.rename(columns=currency_mapping, inplace=True)
         locale.setlocale(locale.LC_ALL, 'de_DE.UTF-8')  # TODO: Cleanup locale stuff
 
+    def _read_partial(self, pd, export_file, currency_mapping, date_from, date_to, currencies):
+        usecols = None
+        if currencies is not None:
+            with open_text(export_file) as f:
+                date_column = f.readline().split(self._sep)[0].strip()
+            columns = set(f"{currency}-{self._fiat_currency}" for currency in currencies)
+            usecols = lambda column: column == date_column or currency_mapping.get(column, column) in columns
+
+        chunks = []
+        with open_text(export_file) as f:
+            for chunk in pd.read_csv(f, sep=self._sep, index_col=0, parse_dates=[0], thousands=self._thousands, decimal=self._decimal,
+                                     usecols=usecols, chunksize=self.CHUNK_ROWS):
+                if date_from is not None:
+                    chunk = chunk[chunk.index >= pd.Timestamp(date_from)]
+                if date_to is not None:
+                    chunk = chunk[chunk.index < pd.Timestamp(date_to) + pd.Timedelta(days=1)]
+                chunks.append(chunk)
+        return pd.concat(chunks)
+
+    def rate_matrix(self, currencies, days):
+        """
+        Rates of all currencies on all days as (len(days) x len(currencies)) float array, e.g. for valuations.
+        days: pandas DatetimeIndex of midnights. Days without rate take the last rate before them, the fiat
+        currency is 1.0, NaN where a currency has no column or no earlier rate.
+        """
+        import numpy as np
+
+        df = self.__df
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        columns = [f"{currency}-{self._fiat_currency}" for currency in currencies]
+        rates = df.reindex(columns=columns).astype(float)
+        rates = rates.reindex(rates.index.union(days)).ffill().reindex(days).to_numpy()
+        fiat = np.array([currency == self._fiat_currency for currency in currencies], dtype=bool)
+        rates[:, fiat] = 1.0
+        return rates
+
+    def missing_rates(self, currencies, days):
+        """
+        Checks (currency, day) pairs at once (equal length sequences, days as "YYYY-MM-DD"), returns three boolean
+        arrays: the currency has no column, the day has no row, the rate is empty. get_rate fails for the pairs
+        with one of the first two set and returns NaN for the third.
+        """
+        import numpy as np
+        import pandas as pd
+
+        df = self.__df
+        df = df[~df.index.duplicated(keep="last")]
+        column_positions = df.columns.get_indexer([f"{currency}-{self._fiat_currency}" for currency in currencies])
+        day_positions = df.index.get_indexer(pd.to_datetime(list(days), format="%Y-%m-%d"))
+        no_column, no_day = column_positions < 0, day_positions < 0
+
+        found = ~no_column & ~no_day
+        # only the columns of the found pairs are converted
+        used_columns, used_positions = np.unique(column_positions[found], return_inverse=True)
+        rates = df.iloc[:, used_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        empty = np.zeros(len(column_positions), dtype=bool)
+        empty[found] = np.isnan(rates[day_positions[found], used_positions])
+        return no_column, no_day, empty
+
     def get_rate(self, crypto_currency, timestr=None, timeobj=None):
+        if self._profiler is not None:
+            with self._profiler.stage("rate_lookup"):
+                return self._get_rate(crypto_currency, timestr, timeobj)
+        return self._get_rate(crypto_currency, timestr, timeobj)
+
+    def _get_rate(self, crypto_currency, timestr=None, timeobj=None):
         
         if timestr:
             t = datetime.datetime.strptime(timestr, self._time_format)
@@ -35,6 +118,16 @@ class PortfolioPerformanceRateProvider:
             t = timeobj
         
         formatted_datetime = t.strftime("%Y-%m-%d")
+
+        if self._profiler is not None:
+            self._profiler.count("rate_lookups")
+
+        cache_key = (crypto_currency, formatted_datetime)
+        if cache_key in self._rate_cache:
+            if self._profiler is not None:
+                self._profiler.count("rate_cache_hits")
+            return self._rate_cache[cache_key]
+
         column_name = f"{crypto_currency}-{self._fiat_currency}"
 
         if formatted_datetime in self.__df.index:
@@ -50,4 +143,5 @@ class PortfolioPerformanceRateProvider:
         # TODO: Cleanup locale stuff
         # rate = rate.replace(self._thousands, "")  # Need to remove thousands-sep, locale stuff does not work ... 15.426,75
         # return locale.atof(rate)
+        self._rate_cache[cache_key] = rate
         return rate
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+StageProfiler module
+
+Lightweight instrumentation for the conversion pipeline: wall time per stage,
+counters and peak RSS. Components take an optional profiler and skip all
+bookkeeping when it is None.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import contextlib
+import json
+import sys
+import time
+
+NO_STAGE = contextlib.nullcontext()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:  # e.g. Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class StageProfiler:
+
+    def __init__(self):
+        self._stages = {}
+        self._counters = {}
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds, calls = self._stages.get(name, (0.0, 0))
+            self._stages[name] = (seconds + time.perf_counter() - start, calls + 1)
+
+    def count(self, name, value=1):
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def report(self):
+        return {
+            "total_seconds": time.perf_counter() - self._start,
+            "stages": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self._stages.items()},
+            "counters": dict(sorted(self._counters.items())),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def dump(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=2)
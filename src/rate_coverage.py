@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Rate coverage module
+
+Staking rewards and crypto deposits/withdrawals are valued with the rate of
+their day from the PP export. A missing rate used to abort the conversion at
+the first affected transaction. The coverage check looks up all needed
+(asset, day) pairs in one go before any transaction is processed and reports
+every gap: currencies without column, days without row and empty rates, the
+days grouped into contiguous ranges.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+
+# note prefix of transactions booked without rate (rate_check="mark")
+MISSING_RATE_NOTE = "MISSING RATE:"
+
+
+class RateCoverageError(ValueError):
+    pass
+
+
+def day_ranges(days):
+    """Sorted unique "YYYY-MM-DD" days -> [(first, last)] of their contiguous ranges"""
+    import numpy as np
+
+    days = np.unique(np.array(list(days), dtype="datetime64[D]"))
+    if len(days) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(days) != np.timedelta64(1, "D")) + 1
+    starts, ends = np.r_[0, breaks], np.r_[breaks - 1, len(days) - 1]
+    return [(str(days[start]), str(days[end])) for start, end in zip(starts, ends)]
+
+
+def _format_ranges(ranges):
+    return ", ".join(first if first == last else f"{first}..{last}" for first, last in ranges)
+
+
+class MissingRates:
+
+    def __init__(self, pairs=(), no_column=(), no_day=(), empty=()):
+        """pairs: all missing (currency, day) pairs, the others the pairs per reason"""
+        self.pairs = set(pairs)
+        self._no_column, self._no_day, self._empty = list(no_column), list(no_day), list(empty)
+
+    def __bool__(self):
+        return bool(self.pairs)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @staticmethod
+    def _by_currency(pairs):
+        by_currency = {}
+        for currency, day in pairs:
+            by_currency.setdefault(currency, []).append(day)
+        return sorted(by_currency.items())
+
+    def lines(self):
+        """One line per currency without column, day range without rows and currency with empty rates"""
+        lines = [f"no column for {currency} (needed on {_format_ranges(day_ranges(days))})"
+                 for currency, days in self._by_currency(self._no_column)]
+        currencies_per_range = {}
+        for currency, days in self._by_currency(self._no_day):
+            for day_range in day_ranges(days):
+                currencies_per_range.setdefault(day_range, []).append(currency)
+        lines += [f"no rates on {_format_ranges([day_range])} (needed for {', '.join(currencies)})"
+                  for day_range, currencies in sorted(currencies_per_range.items())]
+        lines += [f"empty rates for {currency} on {_format_ranges(day_ranges(days))}"
+                  for currency, days in self._by_currency(self._empty)]
+        return lines
+
+    def __str__(self):
+        return f"Missing rates for {len(self.pairs)} (asset, day) pair(s):\n  " + "\n  ".join(self.lines())
+
+
+class RateCoverageChecker:
+
+    def __init__(self, rate_provider):
+        """rate_provider: PortfolioPerformanceRateProvider (needs missing_rates())"""
+        self._rate_provider = rate_provider
+
+    def check(self, pairs):
+        """pairs: needed (PP asset name, "YYYY-MM-DD") pairs, returns MissingRates"""
+        pairs = sorted(set(pairs))
+        if not pairs:
+            return MissingRates()
+        currencies, days = zip(*pairs)
+        no_column, no_day, empty = self._rate_provider.missing_rates(currencies, days)
+        no_day &= ~no_column
+        missing = no_column | no_day | empty
+        return MissingRates(
+            [pair for pair, flag in zip(pairs, missing) if flag],
+            [pair for pair, flag in zip(pairs, no_column) if flag],
+            [pair for pair, flag in zip(pairs, no_day) if flag],
+            [pair for pair, flag in zip(pairs, empty) if flag],
+        )
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Staking roll-up module
+
+Assets like DOT.S or ATOM.S pay staking/earn rewards daily or more often, one
+delivery per reward in the special depot. The roll-up books all rewards of an
+asset within a period (daily, weekly or monthly, configurable per asset) as
+one delivery, dated on the last day of the period (or on its last reward, if
+the period reaches beyond the newest reward, i.e. has not ended within the
+ledger).
+
+The delivery is valued either with the sum of the reward values (each valued
+with the rate of its day, as without roll-up) or with the rate of the
+delivery day. A delivery is only valued if all its rewards (and, valued at the
+period end, its delivery day) have rates; otherwise it keeps the placeholders
+and, with rates missing in the rate coverage check, is marked like the rewards.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import calendar
+import datetime
+import numbers
+
+from . import fixed_point
+from .rate_coverage import MISSING_RATE_NOTE
+from .transactions import DepotTransaction
+
+PERIODS = ("daily", "weekly", "monthly")
+VALUATIONS = ("sum", "period_end")
+
+
+def parse_periods(spec):
+    """
+    "monthly" or "monthly,DOT=daily,ATOM=weekly" -> (default period, {asset: period}),
+    assets are PP names (as in the output)
+    """
+    default, per_asset = None, {}
+    for item in [item.strip() for item in spec.split(",") if item.strip()]:
+        asset, _, period = item.rpartition("=")
+        if period not in PERIODS:
+            raise ValueError(f"Unknown roll-up period '{period}', expected one of {', '.join(PERIODS)}")
+        if asset:
+            per_asset[asset] = period
+        else:
+            default = period
+    return default, per_asset
+
+
+def _period_end(day, period):
+    if period == "daily":
+        return day
+    if period == "weekly":
+        return day + datetime.timedelta(days=6 - day.weekday())
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+class StakingRollup:
+
+    def __init__(self, period="monthly", periods_per_asset=None, valuation="sum", rate_provider=None):
+        """
+        period: default period (daily/weekly/monthly) or None to keep the rewards of other assets unchanged
+        periods_per_asset: {PP asset name: period} overriding the default
+        valuation: "sum" (of the reward values) or "period_end" (rate of the delivery day, needs rate_provider)
+        """
+        if valuation not in VALUATIONS:
+            raise ValueError(f"Unknown valuation '{valuation}', expected one of {', '.join(VALUATIONS)}")
+        self._period = period
+        self._periods_per_asset = dict(periods_per_asset or {})
+        self._valuation = valuation
+        self._rate_provider = rate_provider
+
+    def _groups(self, items):
+        """
+        items: (asset, day, item) -> ({(asset, period end): [item]}, [items of assets without period])
+        """
+        groups, unchanged = {}, []
+        for asset, day, item in items:
+            period = self._periods_per_asset.get(asset, self._period)
+            if period is None:
+                unchanged.append(item)
+                continue
+            period_end = _period_end(datetime.date.fromisoformat(day), period)
+            groups.setdefault((asset, period_end), []).append(item)
+        return groups, unchanged
+
+    def required_rates(self, pairs):
+        """(asset, day) pairs of the rewards -> (asset, day) pairs of the delivery days whose rates valuation needs"""
+        if self._valuation != "period_end":
+            return []
+        newest = max((day for _, day in pairs), default="")
+        groups, _ = self._groups([(asset, day, day) for asset, day in pairs])
+        return [(asset, period_end.isoformat()) for (asset, period_end), group in groups.items()
+                if len(group) > 1 and period_end.isoformat() <= newest]
+
+    def roll_up(self, rewards, missing_rates=()):
+        """
+        Returns the rolled-up deliveries for a list of reward DepotTransactions, ordered by date.
+        missing_rates: (asset, day) pairs without rate (see rate_coverage), their deliveries are not valued
+        """
+        newest = max((reward.date for reward in rewards), default="")
+        groups, result = self._groups([(reward.asset, reward.date, reward) for reward in rewards])
+        for (asset, period_end), group in groups.items():
+            result.append(self._delivery(asset, period_end, newest, group, missing_rates) if len(group) > 1 else group[0])
+        return sorted(result, key=lambda transaction: (transaction.date, transaction.time, transaction.asset))
+
+    def _delivery(self, asset, period_end, newest, rewards, missing_rates):
+        rewards = sorted(rewards, key=lambda reward: (reward.date, reward.time))
+        last = rewards[-1]
+        if period_end.isoformat() <= newest:
+            date, time = period_end.isoformat(), "23:59:59"
+        else:
+            date, time = last.date, last.time
+        amount = fixed_point.add(*[reward.amount for reward in rewards])
+
+        marked = [reward for reward in rewards if reward.note.startswith(MISSING_RATE_NOTE)]
+        if self._valuation == "period_end" and (asset, date) in missing_rates:
+            marked.append(last)
+        rate, value, total = "DUMMYRATE", "DUMMYVAL", "DUMMYTOTAL"
+        if marked or not all(isinstance(reward.value, numbers.Number) for reward in rewards):
+            pass  # some rewards (or the delivery day) have no rate, the delivery keeps the placeholders
+        elif self._valuation == "period_end":
+            rate = self._rate_provider.get_rate(asset, timeobj=datetime.datetime.fromisoformat(f"{date} {time}"))
+            value = total = fixed_point.multiply(amount, rate)
+        else:
+            value = total = fixed_point.add(*[reward.value for reward in rewards])
+            rate = value / amount
+
+        notes = [reward.note.removeprefix(MISSING_RATE_NOTE).lstrip() for reward in (rewards[0], last)]
+        note = f"{len(rewards)} rewards {rewards[0].date}..{last.date}: {notes[0]} .. {notes[1]}"
+        if marked:
+            note = f"{MISSING_RATE_NOTE} {note}"
+        return DepotTransaction(date, time, last.type, asset, amount, rate, value, "", "", total,
+                                last.account, last.other_account, note)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+StreamProcessor module
+
+Converts a Kraken ledger that arrives as a stream of rows (CSV or JSON Lines)
+with bounded buffering. Rows are buffered per day; as soon as the stream has
+moved `window_days` past a day, the refid groups of that day are complete and
+are converted with LedgerProcessor and emitted.
+
+A day is a safe unit: dup groups share a refid (held back while any of their
+rows is still buffered) and LedgerProcessor only pairs nondup rows of the same
+day. The "Unknown" refid workaround only sees the rows of one flush.
+
+The pending leg of a deposit/withdrawal (no txid and balance) can be settled
+on a later day, after other rows of that day have arrived. A day with a
+pending leg that is neither settled nor matched by another row of its day
+(same asset and amount, like staking deposits) is held back for `pending_days`
+more days. Rows of a refid whose pending leg was already emitted are reported.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import bisect
+import csv
+import json
+import logging
+import math
+from collections import Counter
+
+from .diagnostics import Diagnostics
+from .i18n import I18n
+from .ledger_merge import NUMERIC_COLUMNS
+from .ledger_processor import LedgerProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def read_csv_rows(stream):
+    """Yields kraken ledger rows (dicts) from a CSV text stream"""
+    for row in csv.DictReader(stream):
+        yield row
+
+
+def read_jsonl_rows(stream):
+    """Yields kraken ledger rows (dicts) from a JSON Lines text stream"""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _is_pending(row):
+    """Pending deposit/withdrawal leg: no txid and no balance"""
+    balance = row.get("balance")
+    no_balance = balance is None or str(balance).strip() == "" or (isinstance(balance, float) and math.isnan(balance))
+    return not str(row.get("txid") or "").strip() and no_balance
+
+
+def _asset_amount(row):
+    try:
+        return row["asset"], abs(float(row["amount"]))
+    except (TypeError, ValueError):
+        return row["asset"], row["amount"]
+
+
+class StreamProcessor:
+
+    KINDS = [LedgerProcessor.DEPOT_NORMAL_FILENAME, LedgerProcessor.DEPOT_SPECIAL_FILENAME, LedgerProcessor.ACCOUNT_FILENAME]
+
+    def __init__(self, outputs, rate_provider=None, fiat_currency="EUR", refids_to_ignore="",
+                 depot_current="", depot_new="", account="", language="de", i18n=None,
+                 window_days=1, max_buffered_rows=100_000, diagnostics=None, pending_days=1):
+        """
+        outputs: either a dict mapping the output file names (see KINDS) to text files (e.g. named FIFOs),
+                 or a single text file (e.g. sys.stdout) receiving all rows prefixed with "<file name>;".
+                 Kinds missing in the dict are discarded.
+        """
+        self._outputs = outputs
+        self._processor_args = {
+            "rate_provider": rate_provider,
+            "fiat_currency": fiat_currency,
+            "refids_to_ignore": refids_to_ignore,
+            "depot_current": depot_current,
+            "depot_new": depot_new,
+            "account": account,
+            "language": language,
+        }
+        self._i18n = i18n if i18n is not None else I18n(language)
+        # one summary for the whole stream instead of one per emitted window
+        self._diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+        self._window_days = window_days
+        self._pending_days = pending_days
+        self._max_buffered_rows = max_buffered_rows
+
+        self._buffer = {}  # date -> rows
+        self._buffered_rows = 0
+        # kept up to date on every feed, so no call has to scan the whole buffer
+        self._dates = []  # buffered dates, sorted
+        self._buffered_refids = Counter()  # refid -> buffered rows
+        self._settled_refids = Counter()  # refid -> buffered rows that are not pending legs
+        self._pending_legs = {}  # date -> [(refid, (asset, amount))] of its pending legs
+        self._partners = {}  # date -> {(asset, amount)} of its other rows
+        self._header_written = set()
+        self._last_flushed_date = None
+        self._emitted_pending_refids = set()  # refids of emitted pending legs, to report their late rows
+        self.rows_read = 0
+        self.rows_emitted = 0
+
+    def process(self, rows):
+        for row in rows:
+            self.feed(row)
+        self.finish()
+
+    def feed(self, row):
+        self.rows_read += 1
+        date = str(row["time"])[:10]
+        if row.get("refid") in self._emitted_pending_refids:
+            logger.warning("Row %s/%s arrived after the pending leg of its refid was emitted, both are converted separately",
+                           row.get('txid', ''), row.get('refid', ''))
+        elif self._last_flushed_date is not None and date <= self._last_flushed_date and date not in self._buffer:
+            logger.warning("Row %s/%s arrived after its day was flushed, it is converted on its own",
+                           row.get('txid', ''), row.get('refid', ''))
+        if date not in self._buffer:
+            self._buffer[date] = []
+            bisect.insort(self._dates, date)
+            self._pending_legs[date] = []
+            self._partners[date] = set()
+        self._buffer[date].append(row)
+        self._register(date, row)
+        self._buffered_rows += 1
+
+        dates = self._dates
+        complete_dates = dates[:-self._window_days] if self._window_days > 0 else list(dates)
+        if complete_dates:
+            complete_dates = self._without_unsettled(complete_dates)
+        if complete_dates:
+            self._flush(complete_dates)
+        elif self._buffered_rows > self._max_buffered_rows:
+            logger.warning("More than %d rows buffered, flushing early", self._max_buffered_rows)
+            self._flush(self._dates[:-1] or list(self._dates))
+
+    def _register(self, date, row):
+        self._buffered_refids[row["refid"]] += 1
+        if _is_pending(row):
+            self._pending_legs[date].append((row["refid"], _asset_amount(row)))
+        else:
+            self._settled_refids[row["refid"]] += 1
+            self._partners[date].add(_asset_amount(row))
+
+    def _unregister(self, row):
+        for counter in [self._buffered_refids] + ([] if _is_pending(row) else [self._settled_refids]):
+            counter[row["refid"]] -= 1
+            if counter[row["refid"]] == 0:
+                del counter[row["refid"]]
+
+    def _without_unsettled(self, complete_dates):
+        """complete_dates without the days whose unsettled pending legs are held back (for up to pending_days)"""
+        result = []
+        for position, date in enumerate(complete_dates):
+            age = len(self._dates) - 1 - position  # in buffered days, complete_dates is a prefix of them
+            if age < self._window_days + self._pending_days:
+                partners = self._partners[date]
+                if any(refid not in self._settled_refids and asset_amount not in partners
+                       for refid, asset_amount in self._pending_legs[date]):
+                    continue
+            result.append(date)
+        return result
+
+    def finish(self):
+        if self._buffer:
+            self._flush(list(self._dates))
+        self._diagnostics.log_summary()
+
+    def _flush(self, dates):
+        rows = []
+        for date in dates:
+            rows.extend(self._buffer.pop(date))
+            self._dates.remove(date)
+            del self._pending_legs[date], self._partners[date]
+        for row in rows:
+            self._unregister(row)
+
+        if self._buffer:
+            # refid groups which still have rows in the buffered days are kept together
+            def is_open(row):
+                return row["refid"] in self._buffered_refids and row["refid"] not in ("", "Unknown")
+
+            held_back = [row for row in rows if is_open(row)]
+            if held_back:
+                rows = [row for row in rows if not is_open(row)]
+                target = self._dates[0]
+                self._buffer[target][:0] = held_back
+                for row in held_back:
+                    self._register(target, row)
+
+        self._buffered_rows = sum(len(buffered) for buffered in self._buffer.values())
+        self._last_flushed_date = max([date for date in [self._last_flushed_date] + dates if date is not None])
+
+        self._emitted_pending_refids.update(row["refid"] for row in rows if _is_pending(row))
+        if rows:
+            self._emit(rows)
+
+    def _emit(self, rows):
+        import pandas as pd
+
+        df = pd.DataFrame.from_records(rows)
+        for column in NUMERIC_COLUMNS:
+            if column in df:
+                df[column] = pd.to_numeric(df[column], errors="coerce")
+
+        lp = LedgerProcessor(dataframe=df, i18n=self._i18n, diagnostics=self._diagnostics, **self._processor_args)
+        touched = set()
+        for kind, csv_output in lp.render_transactions().items():
+            if isinstance(self._outputs, dict):
+                output, prefix = self._outputs.get(kind), ""
+            else:
+                output, prefix = self._outputs, f"{kind};"
+            if output is None:
+                continue
+
+            header, *lines = csv_output.rstrip("\n").split("\n")
+            if kind not in self._header_written:
+                output.write(f"{prefix}{header}\n")
+                self._header_written.add(kind)
+            for line in lines:
+                output.write(f"{prefix}{line}\n")
+            self.rows_emitted += len(lines)
+            touched.add(output)
+
+        # hand completed groups downstream right away
+        for output in touched:
+            output.flush()
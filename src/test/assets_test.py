@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the Kraken asset code normalization
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.assets import AssetNormalizer
+
+
+class AssetNormalizerTest(unittest.TestCase):
+    """Test case implementation for AssetNormalizer"""
+
+    def test_legacy_codes_and_suffixes(self):
+        normalizer = AssetNormalizer()
+        for code, name in [("XXBT", "XBT"), ("XETH", "ETH"), ("XXRP", "XRP"), ("ZEUR", "EUR"), ("DOT", "DOT"),
+                           ("DOT.S", "DOT"), ("ATOM.S", "ATOM"), ("ETH2.S", "ETH2"), ("XBT.M", "XBT"),
+                           ("SOL.F", "SOL"), ("KSM.P", "KSM"), ("EUR.HOLD", "EUR")]:
+            self.assertEqual(normalizer.normalize(code), name)
+
+    def test_tickers_starting_with_x_or_z_are_kept(self):
+        normalizer = AssetNormalizer()
+        for ticker in ["XTZ", "XRP", "ZRX", "XCN", "ZEUS", "XTZ.S"]:
+            self.assertEqual(normalizer.normalize(ticker), ticker.split(".")[0])
+
+    def test_user_mapping_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mapping_file = os.path.join(tmp_dir, "assets.json")
+            with open(mapping_file, "w") as f:
+                json.dump({"ETH2.S": "ETH", "ETH2": "ETH", "XXBT": "BTC"}, f)
+            normalizer = AssetNormalizer.from_file(mapping_file)
+
+        self.assertEqual(normalizer.normalize("ETH2.S"), "ETH")
+        self.assertEqual(normalizer.normalize("ETH2.M"), "ETH")
+        self.assertEqual(normalizer.normalize("XXBT"), "BTC")
+        self.assertEqual(normalizer.normalize("XETH"), "ETH")
+        self.assertNotEqual(repr(normalizer), repr(AssetNormalizer()))
+
+    def test_normalize_column(self):
+        assets = pd.Series(["XXBT", "DOT.S", None, "XXBT", "XTZ"], index=[5, 6, 7, 8, 9])
+        result = AssetNormalizer().normalize_column(assets)
+
+        self.assertEqual(list(result.index), [5, 6, 7, 8, 9])
+        self.assertEqual(list(result.drop(7)), ["XBT", "DOT", "XBT", "XTZ"])
+        self.assertTrue(pd.isna(result[7]))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the balance reconciliation module
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import unittest
+
+import pandas as pd
+
+from src.balance_check import BalanceMismatchError, BalanceReconciler
+from src.ledger_processor import LedgerProcessor
+from src.test.ledger_rows import ledger_row
+
+
+class BalanceCheckTest(unittest.TestCase):
+    """Test case implementation for BalanceReconciler"""
+
+    ROWS = [
+        ledger_row("R1", "2022-01-01 10:00:00", "deposit", "XXBT", 1.0, balance=1.5),  # the export starts with 0.5 XBT
+        ledger_row("R2", "2022-01-02 10:00:00", "deposit", "ZEUR", 100.0, fee=1.0, balance=99.0),
+        ledger_row("R3", "2022-01-03 10:00:00", "deposit", "XXBT", 0.5, fee=0.1, balance=1.9),
+        ledger_row("R4", "2022-01-04 10:00:00", "deposit", "XXBT", -1.0, balance=0.9),
+    ]
+
+    def test_matching_balances(self):
+        self.assertEqual(BalanceReconciler().reconcile(pd.DataFrame(self.ROWS)), [])
+
+    def test_first_divergence_per_asset(self):
+        rows = self.ROWS + [
+            ledger_row("R6", "2022-01-06 10:00:00", "deposit", "XXBT", 0.1, balance=2.5),  # a row before it is missing
+            ledger_row("R5", "2022-01-05 10:00:00", "deposit", "XXBT", 1.0, balance=1.9),
+            ledger_row("R7", "2022-01-07 10:00:00", "deposit", "XXBT", 0.1, balance=2.6),
+            ledger_row("R8", "2022-01-08 10:00:00", "deposit", "ZEUR", 5.0, balance=105.0),
+        ]
+        divergences = BalanceReconciler(context_rows=1).reconcile(pd.DataFrame(rows))
+
+        self.assertEqual([(d.asset, d.refid) for d in divergences], [("XXBT", "R6"), ("ZEUR", "R8")])
+        self.assertAlmostEqual(divergences[0].expected, 2.0)
+        self.assertEqual(divergences[0].context_refids, ["R5", "R6", "R7"])
+        self.assertEqual(divergences[1].context_refids, ["R2", "R8"])
+
+    def test_large_amounts(self):
+        # int64 units end at about 922 million, the sums are exact beyond that
+        rows = [
+            ledger_row("R1", "2022-01-01 10:00:00", "deposit", "SHIB", 1_500_000_000.0, balance=1_500_000_000.0),
+            ledger_row("R2", "2022-01-02 10:00:00", "deposit", "SHIB", 8_000_000_000.5, fee=0.5, balance=9_500_000_000.0),
+            ledger_row("R3", "2022-01-03 10:00:00", "deposit", "SHIB", 0.0000000001, balance=9_500_000_000.0),
+        ]
+        divergences = BalanceReconciler().reconcile(pd.DataFrame(rows))
+        self.assertEqual([(d.refid, d.expected) for d in divergences], [("R3", 9_500_000_000.0000000001)])
+
+    def test_missing_balances_are_skipped(self):
+        rows = [dict(row) for row in self.ROWS]
+        rows[2]["balance"] = None
+        self.assertEqual(BalanceReconciler().reconcile(pd.DataFrame(rows)), [])
+
+    def test_pending_rows(self):
+        # history before the two-row XXBT withdrawal of the fixture: only its settled row changes the balance
+        withdrawal = pd.read_csv("./testdata/kraken_withdrawal.csv")
+        withdrawal = withdrawal[withdrawal["asset"] == "XXBT"]
+        deposit = pd.DataFrame([ledger_row("R0", "2021-11-01 10:00:00", "deposit", "XXBT", 1.0, balance=1.0)])
+        df = pd.concat([deposit, withdrawal], ignore_index=True)
+        self.assertEqual(BalanceReconciler().reconcile(df.assign(balance=[1.0, None, 0.96909])), [])
+
+        divergences = BalanceReconciler().reconcile(df.assign(balance=[1.0, None, 0.9]))
+        self.assertEqual([(d.asset, d.txid) for d in divergences], [("XXBT", "LU6WLT-MWUUY-BVWZ6E")])
+        self.assertAlmostEqual(divergences[0].expected, 0.96909)
+
+    def test_selected_assets(self):
+        rows = self.ROWS + [ledger_row("R5", "2022-01-05 10:00:00", "deposit", "ZEUR", 5.0, balance=1.0)]
+        self.assertEqual(BalanceReconciler().reconcile(pd.DataFrame(rows), assets=["XBT"]), [])
+
+    def test_ledger_processor(self):
+        rows = self.ROWS + [ledger_row("R5", "2022-01-05 10:00:00", "deposit", "ZEUR", 5.0, balance=1.0)]
+
+        with self.assertLogs("src.ledger_processor", level="WARNING"):
+            lp = LedgerProcessor(dataframe=pd.DataFrame(rows), balance_check="warn")
+        self.assertEqual([d.refid for d in lp.balance_divergences], ["R5"])
+
+        with self.assertLogs("src.ledger_processor", level="WARNING"), self.assertRaises(BalanceMismatchError):
+            LedgerProcessor(dataframe=pd.DataFrame(rows), balance_check="strict")
+
+
+if __name__ == '__main__':
+    unittest.main()
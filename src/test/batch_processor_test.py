@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the BatchProcessor module
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from src.batch_processor import BatchProcessor, BatchJob
+from src.i18n import I18n
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+
+
+class BatchProcessorTest(unittest.TestCase):
+    """Test case implementation for BatchProcessor"""
+
+    KRAKEN_INPUT_FILE = "./testdata/kraken_withdrawal.csv"
+    PORTFOLIO_PERFORMANCE_RATE_EXPORT = "./testdata/Alle_historischen_Kurse.csv"
+
+    def setUp(self):
+        self.rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT,
+                                                              currency_mapping={"BTC-EUR": "XBT-EUR"})
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _read(self, filename):
+        with open(filename, encoding="utf-8") as f:
+            return f.read()
+
+    def test_batch_matches_single_conversion(self):
+        out_dirs = [os.path.join(self.tmp_dir.name, name) for name in ["a", "b", "c"]]
+        jobs = [BatchJob(self.KRAKEN_INPUT_FILE, out_dir) for out_dir in out_dirs]
+
+        bp = BatchProcessor(rate_provider=self.rate_provider, workers=2)
+        results = bp.run(jobs)
+
+        self.assertEqual([result.failed for result in results], [False, False, False])
+        self.assertEqual(results[0].transaction_counts[LedgerProcessor.DEPOT_NORMAL_TRANSACTIONS], 6)
+
+        single_dir = os.path.join(self.tmp_dir.name, "single")
+        os.makedirs(single_dir)
+        lp = LedgerProcessor(filename=self.KRAKEN_INPUT_FILE, rate_provider=self.rate_provider,
+                             depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+        lp.store_transactions(single_dir)
+
+        for out_dir in out_dirs:
+            for filename in [LedgerProcessor.DEPOT_NORMAL_FILENAME, LedgerProcessor.DEPOT_SPECIAL_FILENAME, LedgerProcessor.ACCOUNT_FILENAME]:
+                self.assertEqual(self._read(os.path.join(out_dir, filename)),
+                                 self._read(os.path.join(single_dir, filename)))
+
+    def test_failures_are_reported_without_stopping_the_batch(self):
+        jobs = [BatchJob("./testdata/does_not_exist.csv", os.path.join(self.tmp_dir.name, "missing")),
+                BatchJob(self.KRAKEN_INPUT_FILE, os.path.join(self.tmp_dir.name, "ok"))]
+
+        results = BatchProcessor(rate_provider=self.rate_provider, i18n=I18n("de")).run(jobs)
+
+        self.assertTrue(results[0].failed)
+        self.assertIn("FileNotFoundError", results[0].error)
+        self.assertFalse(results[1].failed)
+
+        summary = BatchProcessor.format_summary(results)
+        self.assertIn("2 ledgers, 1 converted, 1 failed", summary)
+
+    def test_jobs_from_manifest(self):
+        manifest = os.path.join(self.tmp_dir.name, "manifest.json")
+        with open(manifest, "w", encoding="utf-8") as f:
+            json.dump([{"ledger": "client1.csv", "out_dir": "out/client1", "depot_old": "D1", "account": "A1"},
+                       {"ledger": "client2.csv"}], f)
+
+        jobs = BatchProcessor.jobs_from_manifest(manifest, depot_current="DEPOT", account="ACCOUNT")
+
+        self.assertEqual(jobs[0].ledger, os.path.join(self.tmp_dir.name, "client1.csv"))
+        self.assertEqual(jobs[0].out_dir, os.path.join(self.tmp_dir.name, "out/client1"))
+        self.assertEqual((jobs[0].depot_current, jobs[0].account), ("D1", "A1"))
+        self.assertEqual((jobs[1].depot_current, jobs[1].account), ("DEPOT", "ACCOUNT"))
+
+    def test_jobs_from_glob(self):
+        jobs = BatchProcessor.jobs_from_glob("./testdata/kraken_*.csv", "out")
+        ledgers = [os.path.basename(job.ledger) for job in jobs]
+
+        self.assertIn("kraken_withdrawal.csv", ledgers)
+        self.assertIn(os.path.join("out", "kraken_withdrawal"), [job.out_dir for job in jobs])
+
+    def test_jobs_from_glob_with_equal_file_names(self):
+        # Kraken names every export ledgers.csv
+        for client in ["client1", "client2"]:
+            os.makedirs(os.path.join(self.tmp_dir.name, "clients", client))
+            with open(os.path.join(self.tmp_dir.name, "clients", client, "ledgers.csv"), "w") as f:
+                f.write(self._read(self.KRAKEN_INPUT_FILE))
+        out_dir = os.path.join(self.tmp_dir.name, "out")
+
+        jobs = BatchProcessor.jobs_from_glob(os.path.join(self.tmp_dir.name, "clients", "*", "ledgers.csv"), out_dir)
+        self.assertEqual([job.out_dir for job in jobs],
+                         [os.path.join(out_dir, "client1", "ledgers"), os.path.join(out_dir, "client2", "ledgers")])
+
+        results = BatchProcessor(rate_provider=self.rate_provider, workers=1).run(jobs)
+        self.assertEqual([result.failed for result in results], [False, False])
+
+    def test_colliding_out_dirs_are_rejected(self):
+        jobs = [BatchJob(self.KRAKEN_INPUT_FILE, os.path.join(self.tmp_dir.name, "out")) for _ in range(2)]
+        with self.assertRaises(ValueError):
+            BatchProcessor(rate_provider=self.rate_provider).run(jobs)
+
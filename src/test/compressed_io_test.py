@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for reading and writing compressed ledgers, rate exports and outputs
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import gzip
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from src.compressed_io import open_text
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+
+
+class CompressedIoTest(unittest.TestCase):
+    """Test case implementation for compressed inputs and outputs"""
+
+    KRAKEN_INPUT_FILE = "./testdata/kraken_withdrawal.csv"
+    PORTFOLIO_PERFORMANCE_RATE_EXPORT = "./testdata/Alle_historischen_Kurse.csv"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _gzip(self, filename):
+        target = os.path.join(self.tmp_dir, os.path.basename(filename) + ".gz")
+        with open(filename, "rb") as source, gzip.open(target, "wb") as f:
+            shutil.copyfileobj(source, f)
+        return target
+
+    def _zip(self, filename, *extra_members):
+        target = os.path.join(self.tmp_dir, os.path.basename(filename) + ".zip")
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(filename, "ledgers.csv")
+            for member in extra_members:
+                archive.writestr(member, "")
+        return target
+
+    def _process(self, ledger, rates):
+        rate_provider = PortfolioPerformanceRateProvider(rates, currency_mapping={"BTC-EUR": "XBT-EUR"})
+        return LedgerProcessor(filename=ledger, rate_provider=rate_provider,
+                               depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+
+    def test_compressed_inputs(self):
+        expected = self._process(self.KRAKEN_INPUT_FILE, self.PORTFOLIO_PERFORMANCE_RATE_EXPORT).render_transactions()
+        rates = self._gzip(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT)
+        for ledger in [self._gzip(self.KRAKEN_INPUT_FILE), self._zip(self.KRAKEN_INPUT_FILE)]:
+            with self.subTest(ledger=ledger):
+                self.assertEqual(self._process(ledger, rates).render_transactions(), expected)
+
+    def test_zip_needs_exactly_one_csv(self):
+        with open_text(self._zip(self.KRAKEN_INPUT_FILE, "README.txt")) as f:
+            self.assertTrue(f.readline().startswith('"txid"'))
+        with self.assertRaises(ValueError):
+            open_text(self._zip(self.KRAKEN_INPUT_FILE, "other.csv"))
+
+    def test_compressed_outputs(self):
+        lp = self._process(self.KRAKEN_INPUT_FILE, self.PORTFOLIO_PERFORMANCE_RATE_EXPORT)
+        lp.store_transactions(self.tmp_dir, compression="gz")
+
+        for filename, content in lp.render_transactions().items():
+            with gzip.open(os.path.join(self.tmp_dir, filename + ".gz"), "rt") as f:
+                self.assertEqual(f.read(), content)
+
+    @unittest.skipUnless(importlib.util.find_spec("zstandard"), "zstandard is not installed")
+    def test_zstd_roundtrip(self):
+        filename = os.path.join(self.tmp_dir, "rows.csv.zst")
+        with open_text(filename, "w") as f:
+            f.write("a;b\n1;2\n")
+        with open_text(filename) as f:
+            self.assertEqual(f.read(), "a;b\n1;2\n")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the ConversionServer module (runs offline against 127.0.0.1)
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from src.conversion_server import ConversionClient, ConversionServer, ConversionService, ReloadingRateProvider
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+
+
+class ConversionServerTest(unittest.TestCase):
+    """Test case implementation for ConversionServer"""
+
+    KRAKEN_INPUT_FILE = "./testdata/kraken_withdrawal.csv"
+    PORTFOLIO_PERFORMANCE_RATE_EXPORT = "./testdata/Alle_historischen_Kurse.csv"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.rates_file = os.path.join(self.tmp_dir.name, "rates.csv")
+        shutil.copy(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT, self.rates_file)
+        self.rate_provider = ReloadingRateProvider(self.rates_file, currency_mapping={"BTC-EUR": "XBT-EUR"})
+
+        self.server = ConversionServer(ConversionService(rate_provider=self.rate_provider), port=0)
+        thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.client = ConversionClient(self.server.url)
+
+        with open(self.KRAKEN_INPUT_FILE, encoding="utf-8") as f:
+            self.ledger_csv = f.read()
+
+    def test_health(self):
+        self.assertEqual(self.client.health(), {"status": "ok"})
+
+    def test_convert_matches_ledger_processor(self):
+        result = self.client.convert(self.ledger_csv, depot_old="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+
+        rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT,
+                                                         currency_mapping={"BTC-EUR": "XBT-EUR"})
+        lp = LedgerProcessor(filename=self.KRAKEN_INPUT_FILE, rate_provider=rate_provider,
+                             depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+
+        for filename, csv in lp.render_transactions().items():
+            self.assertEqual(result[filename], csv)
+
+    def test_convert_file(self):
+        self.client.convert_file(self.KRAKEN_INPUT_FILE, self.tmp_dir.name)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir.name, LedgerProcessor.ACCOUNT_FILENAME)))
+
+    def test_rates_are_reloaded_only_when_mtime_changes(self):
+        self.client.convert(self.ledger_csv)
+        self.client.convert(self.ledger_csv)
+        self.assertEqual(self.rate_provider.reload_count, 1)
+
+        stat = os.stat(self.rates_file)
+        os.utime(self.rates_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.client.convert(self.ledger_csv)
+        self.assertEqual(self.rate_provider.reload_count, 2)
+
+    def test_errors_are_reported_to_client(self):
+        self.assertRaises(ValueError, self.client.convert, "not,a,ledger\n1,2,3\n")
+        self.assertEqual(self.client.health(), {"status": "ok"})
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the Diagnostics module and its use in LedgerProcessor
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+import pandas as pd
+
+from src.diagnostics import Diagnostics
+from src.ledger_processor import LedgerProcessor
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+class DiagnosticsTest(unittest.TestCase):
+    """Test case implementation for Diagnostics"""
+
+    ROWS = [
+        ledger_row("R1", "2022-01-01 10:00:00", "transfer", "DOT", 1.0),
+        ledger_row("R2", "2022-01-01 11:00:00", "transfer", "DOT", 2.0),
+        ledger_row("R3", "2022-01-01 12:00:00", "transfer", "DOT", -3.0, subtype="spottostaking"),
+    ]
+
+    def _process(self, diagnostics=None):
+        output = StringIO()
+        with contextlib.redirect_stdout(output), self.assertLogs("src.diagnostics", level="INFO") as logs:
+            LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=MockRateProvider(), diagnostics=diagnostics,
+                            depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+            if diagnostics is not None:
+                diagnostics.log_summary()
+        self.assertEqual(output.getvalue(), "")
+        return logs.output
+
+    def test_cases_are_aggregated(self):
+        diagnostics = Diagnostics(max_samples=1)
+        logs = self._process(diagnostics)
+
+        self.assertEqual(diagnostics.counts(), {"NDT": 2, Diagnostics.STAKING_TRANSFER: 1})
+        self.assertEqual(diagnostics.samples("NDT"), ["R1"])
+        self.assertEqual(diagnostics.samples("FP"), [])
+        self.assertEqual(len(logs), 2)
+        self.assertTrue(logs[0].startswith("WARNING:src.diagnostics:Can't process unknown case [NDT]"))
+        self.assertIn("2 groups", logs[0])
+        self.assertTrue(logs[1].startswith("INFO:src.diagnostics:Ignoring staking transfer"))
+
+    def test_summary_logged_by_own_diagnostics(self):
+        logs = self._process()
+        self.assertEqual(len(logs), 2)
+
+    def test_diagnostics_file(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            diagnostics_file = os.path.join(out_dir, "diagnostics.jsonl")
+            self._process(Diagnostics(diagnostics_file))
+            with open(diagnostics_file) as f:
+                entries = [json.loads(line) for line in f]
+
+        self.assertEqual([entry["refid"] for entry in entries], ["R1", "R2", "R3"])
+        self.assertEqual([entry["code"] for entry in entries], ["NDT", "NDT", Diagnostics.STAKING_TRANSFER])
+        self.assertEqual(entries[0]["transaction"]["raw"][0]["asset"], "DOT")
+
+    def test_no_file_without_cases(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            diagnostics_file = os.path.join(out_dir, "diagnostics.jsonl")
+            Diagnostics(diagnostics_file).log_summary()
+            self.assertFalse(os.path.exists(diagnostics_file))
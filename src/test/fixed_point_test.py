@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the fixed_point module
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import unittest
+
+import numpy as np
+
+from src import fixed_point
+
+
+class FixedPointTest(unittest.TestCase):
+    """Test case implementation for fixed-point amounts"""
+
+    def test_to_units(self):
+        self.assertEqual(fixed_point.to_units(0.1), 1_000_000_000)
+        self.assertEqual(fixed_point.to_units(-1499.9999), -14_999_999_000_000)
+        self.assertEqual(fixed_point.to_units("0.0000000001"), 1)
+        self.assertEqual(fixed_point.to_units(3), 30_000_000_000)
+
+    def test_add_is_exact(self):
+        self.assertNotEqual(1499.9999 + 2.4, 1502.3999)
+        self.assertEqual(fixed_point.add(1499.9999, 2.4), 1502.3999)
+        self.assertEqual(fixed_point.add(0.1, 0.2), 0.3)
+
+    def test_column_to_units(self):
+        values = [0.1, 0.00015, float("nan"), -1499.9999, 12345678.1234]
+        units = fixed_point.column_to_units(values)
+
+        self.assertEqual(units.dtype, np.int64)
+        self.assertEqual(list(units), [fixed_point.to_units(0.1), 1_500_000, 0, fixed_point.to_units(-1499.9999),
+                                       fixed_point.to_units(12345678.1234)])
+        self.assertEqual(fixed_point.from_units(units[:4].sum()), -1499.89975)
+
+    def test_large_amounts(self):
+        # 1.5e9 SHIB do not fit into int64 units, the column is converted to Python ints
+        values = [1_500_000_000.5, -1_499_999_999.25, 0.0000000001]
+        units = fixed_point.column_to_units(values)
+
+        self.assertEqual(units.dtype, object)
+        self.assertEqual(list(units), [15_000_000_005_000_000_000, -14_999_999_992_500_000_000, 1])
+        self.assertEqual(fixed_point.from_units(units.cumsum()).dtype, np.float64)
+        self.assertEqual(fixed_point.from_units(units.sum()), 1.2500000001)
+
+    def test_multiply(self):
+        self.assertNotEqual(0.1 * 3, 0.3)
+        self.assertEqual(fixed_point.multiply(0.1, 3), 0.3)
+        self.assertEqual(fixed_point.multiply(np.float64(0.1), np.int64(3)), 0.3)
+        self.assertEqual(fixed_point.multiply(0.01746069, 28637.5), 500.030509875)
+
+
+if __name__ == '__main__':
+    unittest.main()
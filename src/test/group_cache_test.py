@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the GroupCache module and its use in LedgerProcessor
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.balance_check import BalanceMismatchError
+from src.group_cache import GroupCache
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.profiler import StageProfiler
+
+
+class GroupCacheTest(unittest.TestCase):
+    """Test case implementation for GroupCache"""
+
+    KRAKEN_INPUT_FILE = "./testdata/kraken_withdrawal.csv"
+    PORTFOLIO_PERFORMANCE_RATE_EXPORT = "./testdata/Alle_historischen_Kurse.csv"
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT,
+                                                              currency_mapping={"BTC-EUR": "XBT-EUR"})
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _process(self, profiler=None, cache_dir=None, refids_to_ignore="", depot="DEPOT"):
+        return LedgerProcessor(filename=self.KRAKEN_INPUT_FILE, rate_provider=self.rate_provider,
+                               refids_to_ignore=refids_to_ignore, profiler=profiler, cache_dir=cache_dir,
+                               depot_current=depot, depot_new="DEPOT_NEW", account="ACCOUNT")
+
+    def test_cached_groups_render_identically(self):
+        expected = self._process().render_transactions()
+
+        first_profiler = StageProfiler()
+        self.assertEqual(self._process(first_profiler, self.cache_dir).render_transactions(), expected)
+        self.assertIn("parse_group", first_profiler.report()["stages"])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        second_profiler = StageProfiler()
+        self.assertEqual(self._process(second_profiler, self.cache_dir).render_transactions(), expected)
+        report = second_profiler.report()
+        self.assertNotIn("parse_group", report["stages"])
+        self.assertEqual(report["counters"]["group_cache_hits"], 1)
+
+    def test_rendering_options_reuse_cache(self):
+        self._process(cache_dir=self.cache_dir)
+        profiler = StageProfiler()
+        output = self._process(profiler, self.cache_dir, depot="OTHER").render_depot_normal_transactions()
+        self.assertIn("OTHER", output)
+        self.assertEqual(profiler.report()["counters"]["group_cache_hits"], 1)
+
+    def test_key_depends_on_grouping_settings(self):
+        key = GroupCache.key(self.KRAKEN_INPUT_FILE)
+        self.assertEqual(key, GroupCache.key(self.KRAKEN_INPUT_FILE))
+        self.assertNotEqual(key, GroupCache.key(self.KRAKEN_INPUT_FILE, ["AGB76R3-DWC5SC-UCBGGX"]))
+        self.assertNotEqual(key, GroupCache.key(self.KRAKEN_INPUT_FILE, csv_sep=";"))
+
+    def test_unreadable_cache_is_rebuilt(self):
+        key = GroupCache.key(self.KRAKEN_INPUT_FILE)
+        with open(os.path.join(self.cache_dir, f"groups_{key}.json"), "w") as f:
+            f.write("{\"columns\": [")
+
+        self.assertIsNone(GroupCache(self.cache_dir).load(key))
+        self.assertEqual(self._process(cache_dir=self.cache_dir).render_transactions(), self._process().render_transactions())
+        self.assertIsNotNone(GroupCache(self.cache_dir).load(key))
+
+    def test_balance_check_with_cache(self):
+        ledger = os.path.join(self.cache_dir, "ledger.csv")
+        with open(self.KRAKEN_INPUT_FILE) as f, open(ledger, "w") as out:
+            # the XBT balance after the withdrawal does not match the deposit before it
+            out.write(f.read() + '"LDEP-1","RDEP-1","2021-11-01 10:00:00","deposit","","currency","XXBT",1.0,0,1.0\n')
+        cache_dir = os.path.join(self.cache_dir, "cache")
+
+        def process(balance_check):
+            profiler = StageProfiler()
+            lp = LedgerProcessor(filename=ledger, rate_provider=self.rate_provider, cache_dir=cache_dir,
+                                 balance_check=balance_check, profiler=profiler)
+            return lp, profiler.report()
+
+        # an entry stored without balance check is not used for a checked run
+        process(None)
+        lp, report = process("warn")
+        self.assertIn("reconcile", report["stages"])
+        self.assertEqual([d.asset for d in lp.balance_divergences], ["XXBT"])
+
+        # the divergences are stored with the entry
+        with self.assertLogs("src.ledger_processor", level="WARNING"):
+            lp, report = process("warn")
+        self.assertNotIn("reconcile", report["stages"])
+        self.assertEqual(report["counters"]["group_cache_hits"], 1)
+        self.assertEqual([(d.asset, d.balance) for d in lp.balance_divergences], [("XXBT", 0.00000601)])
+        with self.assertRaises(BalanceMismatchError):
+            process("strict")
+
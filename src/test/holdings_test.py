@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the DailyHoldings module
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.holdings import TOTAL_COLUMN, DailyHoldings
+from src.ledger_rules import LedgerRules
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.test.ledger_rows import ledger_row
+
+
+class MockRateMatrixProvider:
+    def __init__(self, rates):
+        self._rates = rates  # currency -> rate
+
+    def rate_matrix(self, currencies, days):
+        return np.array([[self._rates.get(currency, math.nan) for currency in currencies] for _ in days], dtype=float)
+
+
+class HoldingsTest(unittest.TestCase):
+    """Test case implementation for DailyHoldings"""
+
+    LEDGER = pd.DataFrame([
+        ledger_row("R1", "2022-01-01 10:00:00", "deposit", "ZEUR", 1000.0, fee=1.0, balance=None),
+        ledger_row("R2", "2022-01-01 11:00:00", "trade", "ZEUR", -500.0, balance=None),
+        ledger_row("R2", "2022-01-01 11:00:00", "trade", "XXBT", 0.02, balance=None),
+        ledger_row("R3", "2022-01-03 09:00:00", "transfer", "XBT.M", 0.01, fee=0.001, balance=None),
+    ])
+
+    def test_amounts(self):
+        holdings = DailyHoldings(self.LEDGER, date_to="2022-01-04")
+        frame = holdings.amounts_frame()
+
+        self.assertEqual(list(frame.columns), ["EUR", "XBT"])
+        self.assertEqual([str(day.date()) for day in frame.index], ["2022-01-01", "2022-01-02", "2022-01-03", "2022-01-04"])
+        self.assertEqual(list(frame["EUR"]), [499.0] * 4)
+        np.testing.assert_allclose(frame["XBT"], [0.02, 0.02, 0.029, 0.029])
+
+    def test_values(self):
+        holdings = DailyHoldings(self.LEDGER)
+        with self.assertLogs("src.holdings", level="WARNING"):
+            frame = holdings.values_frame(MockRateMatrixProvider({"EUR": 1.0}))
+        self.assertEqual(list(frame[TOTAL_COLUMN]), [499.0] * 3)
+
+        frame = holdings.values_frame(MockRateMatrixProvider({"EUR": 1.0, "XBT": 10000.0}))
+        np.testing.assert_allclose(frame[TOTAL_COLUMN], [699.0, 699.0, 789.0])
+
+    def test_large_amounts(self):
+        ledger = pd.DataFrame([
+            ledger_row("R1", "2022-01-01 10:00:00", "deposit", "SHIB", 1_500_000_000.0, balance=None),
+            ledger_row("R2", "2022-01-02 10:00:00", "deposit", "SHIB", 1_500_000_000.25, fee=0.125, balance=None),
+        ])
+        amounts = DailyHoldings(ledger).amounts_frame()
+        self.assertEqual(list(amounts["SHIB"]), [1_500_000_000.0, 3_000_000_000.125])
+
+    def test_pending_rows(self):
+        # every withdrawal of the fixture has a pending and a settled row, only the settled one counts
+        ledger = pd.read_csv("./testdata/kraken_withdrawal.csv")
+        amounts = DailyHoldings(ledger).amounts_frame().iloc[-1]
+        np.testing.assert_allclose(amounts[["DOT", "ETH", "XBT"]], [0.0, 0.00000568, 0.00000601])
+
+    def test_partial_export(self):
+        # the export starts within the account: each asset starts at its first balance before that row
+        ledger = pd.DataFrame([
+            ledger_row("R1", "2022-01-01 10:00:00", "deposit", "XXBT", 0.01, fee=0.0001, balance=0.5099),
+            ledger_row("R2", "2022-01-02 10:00:00", "withdrawal", "XXBT", -0.2, txid="", balance=None),  # pending leg
+            ledger_row("R2", "2022-01-02 11:00:00", "withdrawal", "XXBT", -0.2, balance=0.3099),
+            ledger_row("R3", "2022-01-02 12:00:00", "transfer", "XBT.M", 0.1, balance=1.1),
+            ledger_row("R4", "2022-01-03 09:00:00", "withdrawal", "ZEUR", -50.0, fee=0.5, balance=949.5),
+        ])
+        amounts = DailyHoldings(ledger).amounts_frame()
+
+        np.testing.assert_allclose(amounts["XBT"], [0.5099 + 1.0, 0.3099 + 1.1, 0.3099 + 1.1])  # XXBT + XBT.M
+        self.assertEqual(list(amounts["EUR"]), [1000.0, 1000.0, 949.5])
+
+    def test_ignored_rows(self):
+        ledger = pd.read_csv("./testdata/kraken_withdrawal.csv")
+        rules = LedgerRules([{"action": "ignore", "asset": "DOT"}])
+        amounts = DailyHoldings(ledger, refids_to_ignore=["A2BEPJY-DA4STX-EUIDDR"], rules=rules).amounts_frame()
+        self.assertEqual(list(amounts.columns), ["XBT"])
+
+    def test_rate_provider_matrix(self):
+        rp = PortfolioPerformanceRateProvider("./testdata/Alle_historischen_Kurse.csv")
+        days = pd.date_range("2022-12-30", "2023-01-02", freq="D")
+        rates = rp.rate_matrix(["BTC", "EUR", "UNKNOWN"], days)
+
+        self.assertEqual(rates.shape, (4, 3))
+        self.assertEqual(rates[1, 0], rp.get_rate("BTC", "2022-12-31 00:00:00"))
+        self.assertEqual(list(rates[:, 1]), [1.0] * 4)
+        self.assertTrue(np.isnan(rates[:, 2]).all())
+
+    def test_store_csv(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            filename = os.path.join(out_dir, "values.csv")
+            DailyHoldings.store(DailyHoldings(self.LEDGER).amounts_frame(), filename)
+            self.assertEqual(len(pd.read_csv(filename, sep=";")), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
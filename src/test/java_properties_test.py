@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the java_properties module
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import unittest
+from pathlib import Path
+from textwrap import dedent
+
+from src.java_properties import parse_properties, load_properties
+
+PP_RESOURCE_DIR = Path(__file__).parents[2] / "resources/portfolio"
+
+
+def _pp_properties_files():
+    # a checked out submodule has a .git file, other files in its place are not the PP translations
+    if not (PP_RESOURCE_DIR / ".git").exists():
+        return []
+    return sorted(list(PP_RESOURCE_DIR.glob("name.abuchen.portfolio*/src/**/messages*.properties")) +
+                  list(PP_RESOURCE_DIR.glob("name.abuchen.portfolio*/src/**/labels*.properties")))
+
+
+class JavaPropertiesTest(unittest.TestCase):
+    """Test case implementation for the .properties parser"""
+
+    def _parse(self, text):
+        return parse_properties(dedent(text).splitlines(keepends=True))
+
+    def test_separators(self):
+        result = self._parse("""
+        a = 1
+        b=2
+        c:3
+        d 4
+        e	:	5
+        """)
+        self.assertEqual(result, {"a": "1", "b": "2", "c": "3", "d": "4", "e": "5"})
+
+    def test_comments_and_blank_lines(self):
+        result = self._parse("""
+        # comment = no
+        ! comment = no
+
+           key = value
+        """)
+        self.assertEqual(result, {"key": "value"})
+
+    def test_line_continuation(self):
+        result = self._parse("""
+        key = first \\
+              second \\
+              third
+        next = value
+        """)
+        self.assertEqual(result, {"key": "first second third", "next": "value"})
+
+    def test_escaped_backslash_is_not_a_continuation(self):
+        result = self._parse("""
+        path = C:\\\\
+        next = value
+        """)
+        self.assertEqual(result, {"path": "C:\\", "next": "value"})
+
+    def test_unicode_and_character_escapes(self):
+        result = self._parse("""
+        account.FEES = Geb\\u00FChren
+        multi = a\\tb\\nc
+        other = \\q
+        """)
+        self.assertEqual(result, {"account.FEES": "Gebühren", "multi": "a\tb\nc", "other": "q"})
+
+    def test_first_separator_ends_the_key(self):
+        result = self._parse("""
+        a:b = c
+        d e=f
+        url = http://host?x=1
+        """)
+        self.assertEqual(result, {"a": "b = c", "d": "e=f", "url": "http://host?x=1"})
+
+    def test_escaped_separator_in_key(self):
+        result = self._parse("""
+        key\\=with\\:sep\\ space = value = with = equals
+        """)
+        self.assertEqual(result, {"key=with:sep space": "value = with = equals"})
+
+    def test_empty_value(self):
+        result = self._parse("""
+        empty =
+        alone
+        """)
+        self.assertEqual(result, {"empty": "", "alone": ""})
+
+    def test_pp_style_file(self):
+        result = load_properties("./testdata/pp_messages_de.properties")
+        self.assertEqual(result["CSVColumn_Fees"], "Gebühren")
+        self.assertEqual(result["CSVColumn_Shares"], "Stück")
+        self.assertEqual(result["MsgDeleteConfirm"], "Wollen Sie {0} wirklich löschen?")
+        self.assertEqual(result["LabelInfo"], "Zeile eins\nZeile zwei")
+        self.assertEqual(result["LabelLong"], "Ein langer Text über mehrere Zeilen")
+        self.assertNotIn("# Kommentar", result)
+        self.assertEqual(len(result), 5)
+
+    def test_missing_file_raises(self):
+        self.assertRaises(OSError, load_properties, "./testdata/does_not_exist.properties")
+
+    @unittest.skipUnless(_pp_properties_files(), "PP submodule not checked out (git submodule init)")
+    def test_real_pp_files(self):
+        for filename in _pp_properties_files():
+            with self.subTest(file=filename.name):
+                result = load_properties(filename)
+                self.assertTrue(len(result) > 0)
+
+                with open(filename, encoding="utf-8") as f:
+                    is_continuation = False
+                    for row in f:
+                        row = row.rstrip("\r\n")
+                        is_simple = not is_continuation and " = " in row and "\\" not in row
+                        is_continuation = row.endswith("\\")
+                        # Simple "key = value" rows must map exactly as written
+                        if not is_simple or row.lstrip().startswith(("#", "!")):
+                            continue
+                        key, value = row.split(" = ", 1)
+                        self.assertEqual(result[key.strip()], value.lstrip())
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for date range and asset filters of partial conversions
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import datetime
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from benchmarks.ledger_generator import LedgerGenerator, write_ledger_csv
+from src.ledger_filter import LedgerFilter
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+class LedgerFilterTest(unittest.TestCase):
+    """Test case implementation for LedgerFilter"""
+
+    PORTFOLIO_PERFORMANCE_RATE_EXPORT = "./testdata/Alle_historischen_Kurse.csv"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rows = LedgerGenerator(seed=3).generate(2000)
+        self.ledger_file = os.path.join(self.tmp_dir.name, "ledgers.csv")
+        write_ledger_csv(self.ledger_file, self.rows)
+        self.date_from = self.rows[500]["time"][:10]
+        self.date_to = self.rows[1500]["time"][:10]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _process(self, **kwargs):
+        return LedgerProcessor(filename=self.ledger_file, rate_provider=MockRateProvider(),
+                               depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT", **kwargs)
+
+    @staticmethod
+    def _lines(lp):
+        return set(line for output in lp.render_transactions().values() for line in output.split("\n")[1:] if line)
+
+    def test_chunked_read_equals_in_memory_filter(self):
+        ledger_filter = LedgerFilter(self.date_from, self.date_to, ["XBT", "ZEUR"])
+        ledger_filter.CHUNK_ROWS = 97
+        expected = ledger_filter.apply(pd.read_csv(self.ledger_file))
+
+        result = ledger_filter.read_csv(self.ledger_file)
+        self.assertEqual(list(result["txid"].fillna("")), list(expected["txid"].fillna("")))
+        self.assertLess(len(result), len(self.rows))
+
+    def test_date_range(self):
+        full = self._lines(self._process())
+        partial = self._process(date_from=self.date_from, date_to=self.date_to)
+
+        # groups crossing the boundaries may add lines dated outside of the range
+        inside = set(line for line in full if self.date_from < line[:10] < self.date_to)
+        self.assertTrue(inside)
+        self.assertLessEqual(inside, self._lines(partial))
+        self.assertLessEqual(self._lines(partial), full)
+
+    def test_groups_straddling_the_boundary_stay_complete(self):
+        rows = [
+            ledger_row("D1", "2021-12-31 23:50:00", "deposit", "ZEUR", 100.0, txid="", balance=""),
+            ledger_row("D1", "2022-01-01 00:10:00", "deposit", "ZEUR", 100.0, txid="T1", balance=100.0),
+            ledger_row("D2", "2021-12-30 10:00:00", "deposit", "ZEUR", 50.0, txid="T2", balance=50.0),
+        ]
+        result = LedgerFilter(date_from="2022-01-01").apply(pd.DataFrame(rows))
+        self.assertEqual(list(result["refid"]), ["D1", "D1"])
+
+    def test_assets_keep_fiat_legs_of_trades(self):
+        lp = self._process(assets=["XBT"])
+        depot_lines = [line for line in lp.render_depot_normal_transactions().split("\n")[1:] if line]
+
+        self.assertTrue(depot_lines)
+        self.assertTrue(all(";XBT;" in line for line in depot_lines))
+        # the EUR legs of XBT trades are kept, otherwise no buy or sell could be converted
+        self.assertTrue(any(";Kauf;" in line or ";Verkauf;" in line for line in depot_lines))
+
+    def test_rate_provider_loads_only_needed_days_and_columns(self):
+        rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT,
+                                                         currency_mapping={"BTC-EUR": "XBT-EUR"},
+                                                         date_from=datetime.date(2022, 12, 1),
+                                                         date_to=datetime.date(2022, 12, 31),
+                                                         currencies={"XBT"})
+        full_rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT,
+                                                              currency_mapping={"BTC-EUR": "XBT-EUR"})
+
+        self.assertEqual(rate_provider.get_rate("XBT", "2022-12-31 20:46:17"),
+                         full_rate_provider.get_rate("XBT", "2022-12-31 20:46:17"))
+        with self.assertRaises(ValueError):
+            rate_provider.get_rate("XBT", "2022-11-30 10:00:00")
+        with self.assertRaises(ValueError):
+            rate_provider.get_rate("ETH", "2022-12-31 10:00:00")
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the synthetic ledger generator used by the benchmarks
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import datetime
+import unittest
+
+import pandas as pd
+
+from benchmarks.ledger_generator import LedgerGenerator, LEDGER_COLUMNS, PATTERNS
+from src.diagnostics import Diagnostics
+from src.ledger_processor import LedgerProcessor
+from src.test.ledger_rows import MockRateProvider
+
+
+class LedgerGeneratorTest(unittest.TestCase):
+    """Test case implementation for LedgerGenerator"""
+
+    def test_seeded_generation_is_deterministic(self):
+        self.assertEqual(LedgerGenerator(seed=42).generate(500), LedgerGenerator(seed=42).generate(500))
+        self.assertNotEqual(LedgerGenerator(seed=42).generate(500), LedgerGenerator(seed=43).generate(500))
+
+    def test_rows_are_sorted_and_complete(self):
+        rows = LedgerGenerator().generate(1000)
+
+        self.assertGreaterEqual(len(rows), 1000)
+        self.assertEqual([row["time"] for row in rows], sorted(row["time"] for row in rows))
+        self.assertTrue(all(list(row) == LEDGER_COLUMNS for row in rows))
+
+    def test_staking_with_deposit_stays_on_one_day(self):
+        for seed in range(100):
+            generator = LedgerGenerator(seed=seed, start=datetime.datetime(2020, 1, 1, 23, 45))
+            deposit, staking = generator.staking_with_deposit()
+
+            self.assertEqual(staking["time"][:10], deposit["time"][:10])
+            self.assertLessEqual(deposit["time"], staking["time"])
+
+    def test_every_pattern_is_handled_by_ledger_processor(self):
+        generator = LedgerGenerator(seed=1)
+        rows = []
+        for pattern in PATTERNS:
+            rows.extend(getattr(generator, pattern)())
+
+        diagnostics = Diagnostics()
+        lp = LedgerProcessor(dataframe=pd.DataFrame(rows), rate_provider=MockRateProvider(), diagnostics=diagnostics,
+                             depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+
+        self.assertEqual(set(diagnostics.counts()) - {Diagnostics.STAKING_TRANSFER}, set())
+        transactions = lp.get_transactions()
+        self.assertTrue(all(len(transactions[kind]) > 0 for kind in transactions))
+
+    def test_rates_cover_all_symbols(self):
+        generator = LedgerGenerator()
+        rates = generator.generate_rates(datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 31))
+
+        self.assertEqual(len(rates), 32)
+        self.assertEqual(rates[0][1:], [f"{symbol}-EUR" for symbol in generator.symbols()])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for merging overlapping Kraken ledger exports
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import os
+import tempfile
+import unittest
+
+from benchmarks.ledger_generator import LedgerGenerator, write_ledger_csv
+from src.ledger_merge import LedgerMerger
+from src.ledger_processor import LedgerProcessor
+from src.test.ledger_rows import MockRateProvider
+
+
+class LedgerMergeTest(unittest.TestCase):
+    """Test case implementation for LedgerMerger"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rows = LedgerGenerator(seed=7).generate(600)
+        self.full_file = self._write("full.csv", self.rows)
+        # three exports with overlapping time ranges
+        self.parts = [self._write("part1.csv", self.rows[:300]),
+                      self._write("part2.csv", self.rows[200:500]),
+                      self._write("part3.csv", self.rows[450:])]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, rows):
+        filename = os.path.join(self.tmp_dir.name, name)
+        write_ledger_csv(filename, rows)
+        return filename
+
+    def _process(self, filename):
+        return LedgerProcessor(filename=filename, rate_provider=MockRateProvider(),
+                               depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+
+    def test_merge_drops_overlap(self):
+        merger = LedgerMerger(self.parts)
+        rows = list(merger.rows())
+
+        self.assertEqual(len(rows), len(self.rows))
+        self.assertEqual(merger.duplicates, 150)
+        self.assertEqual(merger.rows_buffered, 0)  # sorted exports are streamed
+        self.assertEqual([row["time"] for row in rows], sorted(row["time"] for row in self.rows))
+        self.assertEqual(sorted((row["txid"], row["refid"]) for row in rows),
+                         sorted((row["txid"], row["refid"]) for row in self.rows))
+
+    def test_blank_txid_rows_are_deduplicated(self):
+        blank_txid_rows = [row for row in self.rows if not row["txid"]]
+        self.assertTrue(blank_txid_rows)
+        rows = list(LedgerMerger([self.full_file, self.full_file]).rows())
+        self.assertEqual(len(rows), len(self.rows))
+
+    def test_merged_conversion_equals_single_export(self):
+        self.assertEqual(self._process(self.parts).render_transactions(),
+                         self._process(self.full_file).render_transactions())
+
+    def test_unsorted_export_is_merged(self):
+        unsorted_file = self._write("unsorted.csv", list(reversed(self.rows)))
+        merger = LedgerMerger([unsorted_file, self.full_file])
+        rows = list(merger.rows())
+        self.assertEqual(len(rows), len(self.rows))
+        # all rows but those of the latest time come after a later row
+        self.assertEqual(merger.rows_buffered, sum(1 for row in self.rows if row["time"] < self.rows[-1]["time"]))
+        self.assertEqual([row["time"] for row in rows], sorted(row["time"] for row in self.rows))
+
+    def test_only_out_of_order_rows_are_buffered(self):
+        # two rows of the middle of the export swapped
+        rows = list(self.rows)
+        rows[300], rows[301] = rows[301], rows[300]
+        swapped_file = self._write("swapped.csv", rows)
+        merger = LedgerMerger([swapped_file])
+        merged = list(merger.rows())
+
+        self.assertLessEqual(merger.rows_buffered, 1)
+        self.assertEqual([row["time"] for row in merged], sorted(row["time"] for row in self.rows))
+        self.assertEqual(len(merger.dataframe()), len(self.rows))
+
+    def test_kraken_export_order(self):
+        # Kraken orders exports by refid, the pending and settled legs of a withdrawal are hours apart
+        merger = LedgerMerger(["./testdata/kraken_withdrawal.csv"] * 2)
+        rows = list(merger.rows())
+
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(merger.duplicates, 6)
+        self.assertEqual([row["time"] for row in rows], sorted(row["time"] for row in rows))
+        self.assertEqual(self._process(["./testdata/kraken_withdrawal.csv"] * 2).render_transactions(),
+                         self._process("./testdata/kraken_withdrawal.csv").render_transactions())
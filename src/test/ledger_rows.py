@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers of the unit tests: Kraken ledger rows and a constant rate provider
+
+Copyright 2022-05-16 AlexanderLill
+"""
+
+
+class MockRateProvider:
+    """Same rate for every currency and day"""
+
+    def __init__(self, rate=100.00):
+        self._rate = rate
+
+    def get_rate(self, crypto_currency, timestr=None, timeobj=None):
+        return self._rate
+
+
+def ledger_row(refid, time, type, asset, amount, txid=None, subtype="", fee=0.0, balance=0.0):
+    """One Kraken ledger row (dict with the columns of the CSV export), txid def=T<refid>"""
+    return {"txid": txid if txid is not None else f"T{refid}", "refid": refid, "time": time, "type": type,
+            "subtype": subtype, "aclass": "currency", "asset": asset, "amount": amount, "fee": fee, "balance": balance}
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the LedgerRules module and its use in LedgerProcessor
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import IllegalArgumentError, LedgerProcessor
+from src.ledger_rules import LedgerRules
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+class LedgerRulesTest(unittest.TestCase):
+    """Test case implementation for LedgerRules"""
+
+    ROWS = [
+        ledger_row("R1", "2021-06-01 10:00:00", "trade", "ZEUR", -100.0, txid="T1"),
+        ledger_row("R1", "2021-06-01 10:00:00", "trade", "XXBT", 0.01, txid="T2"),
+        ledger_row("R3", "2021-12-31 23:00:00", "transfer", "XTZ.S", 1.5, txid="T3", subtype="spottostaking"),
+        ledger_row("R4", "2022-01-01 00:00:00", "transfer", "XTZ", 1.0, txid="T4"),
+        ledger_row("R5", "2022-02-01 00:00:00", "staking", "DOT.S", 0.5, txid="T5"),
+    ]
+
+    def _df(self):
+        return pd.DataFrame(self.ROWS)
+
+    def test_ignore_mask(self):
+        rules = LedgerRules([
+            {"action": "ignore", "refid": "R1"},
+            {"action": "ignore", "txid": "T5"},
+            {"action": "ignore", "asset": "XTZ", "type": "transfer", "to": "2021-12-31"},  # XTZ.S is XTZ in PP
+            {"action": "ignore", "refid": "R9"},
+        ])
+        self.assertEqual(list(rules.ignore_mask(self._df())), [True, True, True, False, True])
+        self.assertEqual([count for _, count in rules.match_counts()], [2, 1, 1, 0])
+
+    def test_rules_with_equal_keys(self):
+        # same fields and values, different day ranges: a row can match several of them
+        rules = LedgerRules([
+            {"action": "ignore", "type": "transfer", "to": "2021-12-31"},
+            {"action": "ignore", "type": "transfer", "from": "2022-01-01"},
+            {"action": "ignore", "type": "transfer"},
+            {"action": "ignore", "from": "2022-02-01"},
+        ])
+        self.assertEqual(list(rules.ignore_mask(self._df())), [False, False, True, True, True])
+        self.assertEqual([count for _, count in rules.match_counts()], [1, 1, 2, 1])
+
+    def test_forced_branches(self):
+        rules = LedgerRules([
+            {"action": "force", "refid": "R4", "branch": "staking"},
+            {"action": "force", "asset": "XTZ", "branch": "deposit"},
+        ])
+        self.assertEqual(rules.forced_branches(self._df()),
+                         {"R3": "deposit", "T3": "deposit", "R4": "staking", "T4": "staking"})
+        self.assertEqual(rules.branches(), {"staking", "deposit"})
+
+    def test_invalid_rules(self):
+        for rule in [{"action": "drop", "refid": "R1"}, {"action": "ignore", "refids": "R1"},
+                     {"action": "force", "refid": "R1"}, {"action": "ignore", "refid": "R1", "branch": "trade"}]:
+            with self.assertRaises(ValueError):
+                LedgerRules([rule])
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = os.path.join(tmp_dir, "rules.csv")
+            with open(csv_file, "w") as f:
+                f.write("action,refid,txid,asset,type,subtype,from,to,branch\n"
+                        "ignore,,,,transfer,spottostaking,,,\n"
+                        "force,R4,,,,,,,staking\n")
+            json_file = os.path.join(tmp_dir, "rules.json")
+            with open(json_file, "w") as f:
+                json.dump([{"action": "ignore", "type": "transfer", "subtype": "spottostaking"},
+                           {"action": "force", "refid": "R4", "branch": "staking"}], f)
+
+            csv_rules, json_rules = LedgerRules.from_file(csv_file), LedgerRules.from_file(json_file)
+        self.assertEqual(repr(csv_rules), repr(json_rules))
+        self.assertEqual(list(csv_rules.ignore_mask(self._df())), [False, False, True, False, False])
+
+    def test_ledger_processor(self):
+        rules = LedgerRules([
+            {"action": "ignore", "txid": "T5"},
+            {"action": "force", "refid": "R4", "branch": "staking"},
+        ])
+        lp = LedgerProcessor(dataframe=self._df(), rate_provider=MockRateProvider(),
+                             depot_current="DEPOT", account="ACCOUNT", rules=rules)
+
+        # the XTZ transfer is booked as staking delivery, the DOT reward is ignored
+        deliveries = [t for t in lp.depot_transactions if t.type == lp.DELIVERY_INBOUND]
+        self.assertEqual([(t.asset, t.amount) for t in deliveries], [("XTZ", 1.0)])
+        self.assertEqual([count for _, count in rules.match_counts()], [1, 1])
+
+    def test_ledger_processor_unknown_branch(self):
+        rules = LedgerRules([{"action": "force", "refid": "R4", "branch": "lending"}])
+        with self.assertRaises(IllegalArgumentError):
+            LedgerProcessor(dataframe=self._df(), rate_provider=MockRateProvider(), rules=rules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the LedgerStats module and the LedgerProcessor dry run
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import unittest
+
+import pandas as pd
+
+from benchmarks.ledger_generator import LedgerGenerator, PATTERNS
+from src.diagnostics import Diagnostics
+from src.ledger_processor import LedgerProcessor
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+class FailingRateProvider:
+    def get_rate(self, crypto_currency, timestr=None, timeobj=None):
+        raise AssertionError("a dry run must not look up rates")
+
+
+class LedgerStatsTest(unittest.TestCase):
+    """Test case implementation for LedgerStats"""
+
+    ROWS = [
+        ledger_row("R1", "2022-01-01 10:00:00", "trade", "ZEUR", -100.0, txid="T1"),
+        ledger_row("R1", "2022-01-01 10:00:00", "trade", "XXBT", 0.01, txid="T2"),
+        ledger_row("R2", "2022-01-02 10:00:00", "staking", "DOT.S", 0.5, txid="T3"),
+        ledger_row("R3", "2022-01-03 10:00:00", "transfer", "DOT", -1.0, txid="T4", subtype="spottostaking"),
+        ledger_row("R4", "2022-01-04 10:00:00", "transfer", "DOT", 2.0, txid="T5"),
+        ledger_row("R5", "2022-01-05 10:00:00", "deposit", "ETH", 3.0, txid="T6"),
+        ledger_row("R6", "2022-01-05 11:00:00", "staking", "ETH", 3.0, txid="T7"),
+        ledger_row("R7", "2022-01-06 10:00:00", "margin", "ZEUR", 1.0, txid="T8"),
+    ]
+
+    def test_stats(self):
+        lp = LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=FailingRateProvider(), refids_to_ignore="R7",
+                             dry_run=True)
+        stats = lp.stats()
+
+        self.assertEqual(lp.depot_transactions, [])
+        self.assertEqual(stats["rows"], 8)
+        self.assertEqual((stats["first_time"], stats["last_time"]), ("2022-01-01 10:00:00", "2022-01-06 10:00:00"))
+        self.assertEqual(stats["rows_per_type"]["transfer/spottostaking"], 1)
+        self.assertEqual(stats["rows_per_asset"]["ZEUR"], 2)
+        self.assertEqual(stats["ignored_rows"], 1)
+        self.assertEqual(stats["groups_per_parsing_info"], {"dup": 1, "dup_asset_amount_match": 1, "nondup": 3})
+        self.assertEqual(stats["groups_per_branch"], {"NDT": 1, Diagnostics.STAKING_TRANSFER: 1, "staking": 2, "trade": 1})
+        self.assertEqual(stats["unknown_case_groups"], 1)
+
+    def test_stats_match_processing(self):
+        generator = LedgerGenerator(seed=7)
+        rows = generator.generate(500)
+        for pattern in PATTERNS:
+            rows.extend(getattr(generator, pattern)())
+        df = pd.DataFrame(rows)
+
+        diagnostics = Diagnostics()
+        lp = LedgerProcessor(dataframe=df, rate_provider=MockRateProvider(), diagnostics=diagnostics)
+        stats = LedgerProcessor(dataframe=df, dry_run=True).stats()
+
+        groups = lp._parse_transactions()
+        self.assertEqual(stats["groups"], len(groups))
+        self.assertEqual(stats["groups_per_branch"].get(Diagnostics.STAKING_TRANSFER, 0),
+                         diagnostics.counts().get(Diagnostics.STAKING_TRANSFER, 0))
+        self.assertEqual(stats["unknown_case_groups"], sum(count for code, count in diagnostics.counts().items()
+                                                           if code != Diagnostics.STAKING_TRANSFER))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the FIFO lot engine
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.lot_engine import FifoLotEngine
+from src.transactions import DepotTransaction
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+BUY = "Kauf"
+SELL = "Verkauf"
+DELIVERY = "Einlieferung"
+TRANSFER = "Umbuchung (Ausgang)"
+
+
+def _dt(date, type, amount, total, asset="XBT"):
+    return DepotTransaction(date, "12:00:00", type, asset, amount, "", total, "", "", total, note=f"{type} {date}")
+
+
+class LotEngineTest(unittest.TestCase):
+    """Test case implementation for FifoLotEngine"""
+
+    def _engine(self):
+        return FifoLotEngine(inbound_types=[BUY, DELIVERY], outbound_types=[SELL])
+
+    def test_fifo_partial_lots(self):
+        engine = self._engine()
+        gains = engine.process([
+            _dt("2021-01-01", BUY, 1.0, 100.0),
+            _dt("2021-06-01", BUY, 1.0, 200.0),
+            _dt("2021-07-01", SELL, 1.5, 450.0),
+        ])
+
+        self.assertEqual(len(gains), 1)
+        self.assertAlmostEqual(gains[0].cost_basis, 200.0)
+        self.assertAlmostEqual(gains[0].gain, 250.0)
+        self.assertEqual(gains[0].amount_over_one_year, 0.0)
+        self.assertAlmostEqual(gains[0].taxable_gain, 250.0)
+
+        amount, cost = engine.holdings()["XBT"]
+        self.assertAlmostEqual(amount, 0.5)
+        self.assertAlmostEqual(cost, 100.0)
+
+    def test_holding_period(self):
+        gains = self._engine().process([
+            _dt("2021-03-01", BUY, 1.0, 100.0),
+            _dt("2021-03-02", DELIVERY, 1.0, 100.0),
+            _dt("2022-03-02", SELL, 2.0, 400.0),  # the first lot is held for more than one year
+        ])
+
+        self.assertAlmostEqual(gains[0].amount_over_one_year, 1.0)
+        self.assertAlmostEqual(gains[0].gain_over_one_year, 100.0)
+        self.assertAlmostEqual(gains[0].taxable_gain, 100.0)
+
+    def test_transactions_are_sorted_and_transfers_keep_lots(self):
+        engine = self._engine()
+        gains = engine.process([
+            _dt("2021-02-01", SELL, 1.0, 300.0),
+            _dt("2021-01-15", TRANSFER, 1.0, 150.0),
+            _dt("2021-01-01", BUY, 1.0, 100.0),
+        ])
+
+        self.assertAlmostEqual(gains[0].gain, 200.0)
+        self.assertEqual(gains[0].uncovered_amount, 0.0)
+        self.assertEqual(engine.holdings(), {})
+
+    def test_uncovered_sale(self):
+        with self.assertLogs("src.lot_engine", level="WARNING"):
+            gains = self._engine().process([_dt("2021-01-01", SELL, 1.0, 100.0)])
+        self.assertEqual(gains[0].uncovered_amount, 1.0)
+        self.assertEqual(gains[0].cost_basis, 0.0)
+
+    def test_many_staking_lots(self):
+        engine = self._engine()
+        transactions = [_dt("2021-01-01", DELIVERY, 0.001, 0.1) for _ in range(5000)]
+        transactions.append(_dt("2021-02-01", SELL, 4.0, 800.0))
+        gains = engine.process(transactions)
+
+        self.assertAlmostEqual(gains[0].cost_basis, 400.0)
+        amount, cost = engine.holdings()["XBT"]
+        self.assertAlmostEqual(amount, 1.0)
+        self.assertAlmostEqual(cost, 100.0)
+
+    def test_missing_rates(self):
+        with self.assertRaises(ValueError):
+            self._engine().process([_dt("2021-01-01", DELIVERY, 1.0, "DUMMYVAL")])
+
+    def test_ledger_processor_fee_sells(self):
+        df = pd.DataFrame([
+            ledger_row("R1", "2021-01-01 10:00:00", "trade", "ZEUR", -200.0, txid="T1"),
+            ledger_row("R1", "2021-01-01 10:00:00", "trade", "XXBT", 2.0, txid="T2", fee=0.1, balance=1.9),
+        ])
+        lp = LedgerProcessor(dataframe=df, rate_provider=MockRateProvider())
+
+        engine = FifoLotEngine.for_processor(lp)
+        gains = engine.process(lp.depot_transactions)
+
+        # the crypto fee is sold right after the buy
+        self.assertEqual(len(gains), 1)
+        self.assertAlmostEqual(gains[0].amount, 0.1)
+        amount, _ = engine.holdings()["XBT"]
+        self.assertAlmostEqual(amount, 1.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -349,6 +349,43 @@ class LedgerProcessorTest(unittest.TestCase):
 
         self.assertEquals(result_csv, expected_depot_csv)
 
+    def test_import_unknown_refid(self):
+        # Kraken bug: rows with refid "Unknown", a pair cancelling itself out and a real staking reward.
+        # The withdrawal sorts after "Unknown" and must not leak its type into the reward.
+        kraken_csv = dedent("""
+        "txid","refid","time","type","subtype","aclass","asset","amount","fee","balance"
+        "LAAAAA-AAAAA-AAAAAA","Unknown","2022-12-06 01:00:00","transfer","spottostaking","currency","DOT",1.00000000,0.00000000,0.00000000
+        "LBBBBB-BBBBB-BBBBBB","Unknown","2022-12-06 01:00:00","transfer","stakingfromspot","currency","DOT.S",-1.00000000,0.00000000,1.00000000
+        "LCCCCC-CCCCC-CCCCCC","Unknown","2022-12-06 05:12:33","staking","","currency","DOT.S",0.03123500,0.00000000,1.03123500
+        "","WUGLWVG-XQGB5M-MHHHL7","2022-12-07 01:00:00","withdrawal","","currency","ZEUR",-10.0000,0.0000,""
+        "LDDDDD-DDDDD-DDDDDD","WUGLWVG-XQGB5M-MHHHL7","2022-12-07 01:10:00","withdrawal","","currency","ZEUR",-10.0000,0.0000,100.0000
+        """)
+
+        expected_depot_csv = dedent("""
+        2022-12-06;05:12:33;Einlieferung;DOT;0,031235;DUMMYRATE;DUMMYVAL;;;DUMMYTOTAL;DEPOT;;LCCCCC-CCCCC-CCCCCC,LCCCCC-CCCCC-CCCCCC;
+        """)
+
+        df = pd.read_csv(StringIO(kraken_csv))
+
+        lp = LedgerProcessor(dataframe=df, depot_current=self.DEPOT_CURRENT, depot_new=self.DEPOT_NEW, account=self.ACCOUNT)
+        transactions = lp.get_transactions()
+
+        result_csv = "\n"
+        for t in transactions["depot_special_transactions"]:
+            result_csv = result_csv + t.to_csv() + "\n"
+
+        self.assertEqual(result_csv, expected_depot_csv)
+        self.assertEqual([t.note for t in transactions["account_transactions"]], ["WUGLWVG-XQGB5M-MHHHL7,LDDDDD-DDDDD-DDDDDD"] * 2)
+
+    def test_ids_summary(self):
+        lp = LedgerProcessor(dataframe=pd.DataFrame(columns=["txid", "refid", "time", "type", "subtype", "aclass", "asset", "amount", "fee", "balance"]))
+
+        self.assertEqual(lp._get_ids_summary([{"refid": "R1", "txid": "T1"}]), "R1,T1")
+        self.assertEqual(lp._get_ids_summary([{"refid": "", "txid": "T1"}]), ",T1")
+        self.assertEqual(lp._get_ids_summary([{"refid": "R1", "txid": ""}]), "R1")
+        self.assertEqual(lp._get_ids_summary([{"refid": "R2", "txid": "T2"}, {"refid": "R1", "txid": ""},
+                                              {"refid": "R2", "txid": "T1"}]), "R1,R2,T1,T2")
+
     def test_import_staking_withrate(self):
         kraken_csv = dedent("""
         "txid","refid","time","type","subtype","aclass","asset","amount","fee","balance"
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the StageProfiler module and its use in the processing pipeline
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.profiler import StageProfiler
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+class StageProfilerTest(unittest.TestCase):
+    """Test case implementation for StageProfiler"""
+
+    KRAKEN_INPUT_FILE = "./testdata/kraken_withdrawal.csv"
+    PORTFOLIO_PERFORMANCE_RATE_EXPORT = "./testdata/Alle_historischen_Kurse.csv"
+
+    def test_stages_and_counters(self):
+        profiler = StageProfiler()
+        with profiler.stage("a"):
+            pass
+        with profiler.stage("a"):
+            pass
+        profiler.count("x")
+        profiler.count("x", 2)
+
+        report = profiler.report()
+        self.assertEqual(report["stages"]["a"]["calls"], 2)
+        self.assertEqual(report["counters"], {"x": 3})
+
+    def test_pipeline_report(self):
+        profiler = StageProfiler()
+        rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT,
+                                                         currency_mapping={"BTC-EUR": "XBT-EUR"},
+                                                         profiler=profiler)
+        lp = LedgerProcessor(filename=self.KRAKEN_INPUT_FILE, rate_provider=rate_provider, profiler=profiler,
+                             depot_current="DEPOT", depot_new="DEPOT_NEW", account="ACCOUNT")
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            lp.store_transactions(out_dir)
+            report_file = os.path.join(out_dir, "profile.json")
+            profiler.dump(report_file)
+            with open(report_file) as f:
+                report = json.load(f)
+
+        for stage in ["load_rates", "load", "load_i18n", "parse_group", "process", "rate_lookup", "render", "write"]:
+            self.assertIn(stage, report["stages"])
+        self.assertEqual(report["stages"]["write"]["calls"], 3)
+
+        counters = report["counters"]
+        self.assertEqual(counters["rows"], 6)
+        self.assertEqual(counters["groups"], 3)
+        self.assertEqual(counters["groups[dup:withdrawal]"], 3)
+        self.assertEqual(counters["rows[dup:withdrawal]"], 6)
+        self.assertEqual(counters["rate_lookups"], 3)
+        self.assertNotIn("rate_cache_hits", counters)
+
+        rate_provider.get_rate("ETH", "2021-11-03 10:00:00")
+        self.assertEqual(profiler.report()["counters"]["rate_cache_hits"], 1)
+
+    def test_counters_per_combination(self):
+        rows = [
+            ledger_row("R1", "2022-01-01 10:00:00", "trade", "ZEUR", -100.0),
+            ledger_row("R1", "2022-01-01 10:00:00", "trade", "XXBT", 0.01, txid="TR1B"),
+            ledger_row("R2", "2022-01-02 10:00:00", "trade", "ZEUR", -50.0),
+            ledger_row("R2", "2022-01-02 10:00:00", "trade", "XXBT", 0.005, txid="TR2B"),
+            ledger_row("R3", "2022-01-03 10:00:00", "staking", "DOT.S", 0.5),
+        ]
+        profiler = StageProfiler()
+        LedgerProcessor(dataframe=pd.DataFrame(rows), rate_provider=MockRateProvider(), profiler=profiler)
+
+        counters = profiler.report()["counters"]
+        self.assertEqual((counters["groups[dup:trade]"], counters["rows[dup:trade]"]), (2, 4))
+        self.assertEqual((counters["groups[nondup:staking]"], counters["rows[nondup:staking]"]), (1, 1))
+        self.assertEqual(counters["rows"], sum(value for name, value in counters.items() if name.startswith("rows[")))
+
+    def test_rate_cache_returns_same_rate(self):
+        rate_provider = PortfolioPerformanceRateProvider(self.PORTFOLIO_PERFORMANCE_RATE_EXPORT)
+        first = rate_provider.get_rate("BTC", "2022-12-31 20:46:17")
+        second = rate_provider.get_rate("BTC", "2022-12-31 08:00:00")
+        self.assertEqual(first, 15426.75)
+        self.assertEqual(second, first)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the rate coverage check and its use in LedgerProcessor
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.rate_coverage import RateCoverageChecker, RateCoverageError, day_ranges
+from src.test.ledger_rows import ledger_row
+
+# 2022-01-04 has no row, XBT has no rate on 2022-01-02
+EXPORT = """Datum;XBT-EUR;DOT-EUR
+2022-01-01;40.000,5;20,5
+2022-01-02;;21
+2022-01-03;41.000;22
+2022-01-05;42.000;23
+"""
+
+
+class RateCoverageTest(unittest.TestCase):
+    """Test case implementation for the rate coverage check"""
+
+    ROWS = [
+        ledger_row("R1", "2022-01-01 10:00:00", "staking", "DOT.S", 0.5, txid="T1"),
+        ledger_row("R2", "2022-01-02 10:00:00", "staking", "XXBT", 0.001, txid="T2"),
+        ledger_row("R3", "2022-01-04 10:00:00", "staking", "DOT.S", 0.5, txid="T3"),
+        ledger_row("R4", "2022-01-04 11:00:00", "deposit", "ZEUR", 1000.0, txid="T4"),  # fiat, no rate needed
+        ledger_row("R5", "2022-01-05 10:00:00", "staking", "ATOM.S", 0.1, txid="T5"),
+        ledger_row("R6", "2022-01-06 10:00:00", "staking", "ATOM.S", 0.1, txid="T6"),
+        ledger_row("R7", "2022-01-08 10:00:00", "staking", "ATOM.S", 0.1, txid="T7"),
+    ]
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        filename = os.path.join(self._tmp_dir.name, "rates.csv")
+        with open(filename, "w") as f:
+            f.write(EXPORT)
+        self.rate_provider = PortfolioPerformanceRateProvider(filename)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_day_ranges(self):
+        self.assertEqual(day_ranges(["2022-01-03", "2022-01-01", "2022-01-02", "2022-01-05", "2022-01-02"]),
+                         [("2022-01-01", "2022-01-03"), ("2022-01-05", "2022-01-05")])
+        self.assertEqual(day_ranges([]), [])
+
+    def test_missing_rates(self):
+        missing = RateCoverageChecker(self.rate_provider).check([
+            ("DOT", "2022-01-01"), ("XBT", "2022-01-02"), ("DOT", "2022-01-04"), ("XBT", "2022-01-04"),
+            ("ATOM", "2022-01-05"), ("ATOM", "2022-01-06"), ("ATOM", "2022-01-08"), ("DOT", "2022-01-05"),
+        ])
+        self.assertEqual(len(missing), 6)
+        self.assertEqual(missing.lines(), [
+            "no column for ATOM (needed on 2022-01-05..2022-01-06, 2022-01-08)",
+            "no rates on 2022-01-04 (needed for DOT, XBT)",
+            "empty rates for XBT on 2022-01-02",
+        ])
+
+    def test_strict(self):
+        with self.assertRaises(RateCoverageError) as context:
+            LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=self.rate_provider, rate_check="strict")
+        self.assertIn("no column for ATOM", str(context.exception))
+        self.assertIn("no rates on 2022-01-04 (needed for DOT)", str(context.exception))
+
+    def test_mark(self):
+        with self.assertLogs("src.ledger_processor", level="WARNING"):
+            lp = LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=self.rate_provider, rate_check="mark")
+
+        deliveries = {t.note: t for t in lp.depot_transactions if t.type == lp.DELIVERY_INBOUND}
+        self.assertEqual(deliveries["R1,T1"].value, 0.5 * 20.5)
+        marked = [note for note in deliveries if note.startswith(LedgerProcessor.MISSING_RATE_NOTE)]
+        self.assertEqual(len(marked), 5)
+        self.assertEqual(deliveries[f"{LedgerProcessor.MISSING_RATE_NOTE} R3,T3"].rate, "DUMMYRATE")
+
+    def test_complete_rates(self):
+        lp = LedgerProcessor(dataframe=pd.DataFrame(self.ROWS[:1]), rate_provider=self.rate_provider, rate_check="strict")
+        self.assertFalse(lp.missing_rates)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the stage benchmark
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import os
+import tempfile
+import unittest
+
+from benchmarks.ledger_generator import generate_files
+from benchmarks.stage_benchmark import STAGES, compare_to_baseline, run_stages
+
+
+class StageBenchmarkTest(unittest.TestCase):
+    """Test case implementation for the stage benchmark"""
+
+    def test_run_stages(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            ledger_file, rates_file = os.path.join(work_dir, "ledger.csv"), os.path.join(work_dir, "rates.csv")
+            generate_files(300, ledger_file, rates_file, 1)
+            results = run_stages(ledger_file, rates_file, work_dir, memory=True)
+
+            self.assertTrue(os.path.isfile(os.path.join(work_dir, "transactions_account.csv")))
+        self.assertEqual(set(STAGES) - set(results), set())
+        self.assertGreaterEqual(results["rows"], 300)
+        self.assertGreater(results["groups"], 0)
+        self.assertGreater(results["rate_lookup"]["calls"], 0)
+        self.assertIn("peak_mb", results["parse_group"])
+        self.assertNotIn("peak_mb", results["rate_lookup"])  # nested in process
+
+    def test_compare_to_baseline(self):
+        baseline = {"100": {"render": {"seconds": 1.0}, "process": {"seconds": 0.01}}, "1000": {"note": "not tracked"}}
+        results = {"100": {"render": {"seconds": 2.0}, "process": {"seconds": 0.05}}, "1000": {"render": {"seconds": 9.0}}}
+
+        self.assertEqual(compare_to_baseline(results, baseline, 1.5), ["100 rows, render: 2.000s (baseline 1.000s)"])
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the StakingRollup module and its use in LedgerProcessor
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.portfolio_performance_rate_provider import PortfolioPerformanceRateProvider
+from src.rate_coverage import MISSING_RATE_NOTE, RateCoverageError
+from src.staking_rollup import StakingRollup, parse_periods
+from src.test.ledger_rows import ledger_row
+
+# DOT has no rate on 2022-01-02, 2022-01-31 has no row
+EXPORT = """Datum;DOT-EUR
+2022-01-01;10
+2022-01-02;
+2022-01-03;10
+2022-01-30;10
+2022-02-01;20
+"""
+
+
+class MockRateProvider:
+    def get_rate(self, crypto_currency, timestr=None, timeobj=None):
+        day = (timestr or str(timeobj))[:10]
+        return 10.0 if day < "2022-01-20" else 20.0
+
+
+class StakingRollupTest(unittest.TestCase):
+    """Test case implementation for StakingRollup"""
+
+    ROWS = [
+        ledger_row("R1", "2022-01-01 01:00:00", "staking", "DOT.S", 0.1),
+        ledger_row("R2", "2022-01-02 01:00:00", "staking", "DOT.S", 0.2),
+        ledger_row("R3", "2022-01-21 01:00:00", "staking", "DOT.S", 0.3),
+        ledger_row("R4", "2022-02-01 01:00:00", "staking", "DOT.S", 0.4),
+        ledger_row("R5", "2022-01-03 01:00:00", "staking", "ATOM.S", 1.0),
+        ledger_row("R6", "2022-01-04 01:00:00", "staking", "ATOM.S", 2.0),
+    ]
+
+    def _process(self, rollup):
+        return LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=MockRateProvider(), depot_current="DEPOT",
+                               staking_rollup=rollup)
+
+    def test_parse_periods(self):
+        self.assertEqual(parse_periods("monthly"), ("monthly", {}))
+        self.assertEqual(parse_periods("weekly,DOT=daily"), ("weekly", {"DOT": "daily"}))
+        self.assertEqual(parse_periods("ATOM=monthly"), (None, {"ATOM": "monthly"}))
+        self.assertRaises(ValueError, parse_periods, "yearly")
+
+    def test_monthly_sum(self):
+        lp = self._process(StakingRollup("monthly"))
+        deliveries = [(t.date, t.time, t.asset, t.amount, t.value) for t in lp.depot_transactions]
+
+        self.assertEqual(deliveries, [
+            ("2022-01-31", "23:59:59", "ATOM", 3.0, 30.0),
+            ("2022-01-31", "23:59:59", "DOT", 0.6, 0.1 * 10 + 0.2 * 10 + 0.3 * 20),
+            ("2022-02-01", "01:00:00", "DOT", 0.4, 8.0),  # single reward, unchanged
+        ])
+        self.assertTrue(lp.depot_transactions[1].note.startswith("3 rewards 2022-01-01..2022-01-21: R1,TR1 .. R3,TR3"))
+
+    def test_period_end_valuation_and_asset_periods(self):
+        lp = self._process(StakingRollup(None, {"DOT": "weekly"}, valuation="period_end", rate_provider=MockRateProvider()))
+        deliveries = [(t.date, t.asset, t.amount, t.value) for t in lp.depot_transactions]
+
+        self.assertEqual(deliveries, [
+            ("2022-01-02", "DOT", 0.3, 3.0),
+            ("2022-01-03", "ATOM", 1.0, 10.0),
+            ("2022-01-04", "ATOM", 2.0, 20.0),
+            ("2022-01-21", "DOT", 0.3, 6.0),
+            ("2022-02-01", "DOT", 0.4, 8.0),
+        ])
+
+    def test_open_period_is_dated_on_last_reward(self):
+        rollup = StakingRollup("monthly", valuation="period_end", rate_provider=MockRateProvider())
+        lp = LedgerProcessor(dataframe=pd.DataFrame(self.ROWS[:3]), rate_provider=MockRateProvider(), staking_rollup=rollup)
+
+        self.assertEqual([(t.date, t.time, t.value) for t in lp.depot_transactions], [("2022-01-21", "01:00:00", 12.0)])
+
+    def _export_rate_provider(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        filename = os.path.join(tmp_dir.name, "rates.csv")
+        with open(filename, "w") as f:
+            f.write(EXPORT)
+        return PortfolioPerformanceRateProvider(filename)
+
+    def test_group_with_missing_rate_is_marked(self):
+        rate_provider = self._export_rate_provider()
+        rows = [self.ROWS[0], self.ROWS[1], ledger_row("R7", "2022-01-03 01:00:00", "staking", "DOT.S", 0.5)]
+        with self.assertLogs("src.ledger_processor", level="WARNING"):
+            lp = LedgerProcessor(dataframe=pd.DataFrame(rows), rate_provider=rate_provider, rate_check="mark",
+                                 staking_rollup=StakingRollup("monthly"))
+
+        [delivery] = lp.depot_transactions
+        self.assertEqual((delivery.amount, delivery.rate, delivery.value, delivery.total), (0.8, "DUMMYRATE", "DUMMYVAL", "DUMMYTOTAL"))
+        # the marker of the middle reward is kept on the delivery, once
+        self.assertTrue(delivery.note.startswith(f"{MISSING_RATE_NOTE} 3 rewards 2022-01-01..2022-01-03: R1,TR1 .. R7,TR7"))
+
+    def test_missing_period_end_rate(self):
+        rate_provider = self._export_rate_provider()
+        rows = [ledger_row("R7", "2022-01-03 01:00:00", "staking", "DOT.S", 0.5),
+                ledger_row("R8", "2022-01-30 01:00:00", "staking", "DOT.S", 0.4),
+                ledger_row("R9", "2022-02-01 01:00:00", "staking", "DOT.S", 0.1)]
+        rollup = StakingRollup("monthly", valuation="period_end", rate_provider=rate_provider)
+
+        with self.assertRaises(RateCoverageError) as context:
+            LedgerProcessor(dataframe=pd.DataFrame(rows), rate_provider=rate_provider, rate_check="strict", staking_rollup=rollup)
+        self.assertIn("no rates on 2022-01-31 (needed for DOT)", str(context.exception))
+
+        with self.assertLogs("src.ledger_processor", level="WARNING"):
+            lp = LedgerProcessor(dataframe=pd.DataFrame(rows), rate_provider=rate_provider, rate_check="mark", staking_rollup=rollup)
+        delivery, single = lp.depot_transactions
+        self.assertEqual((delivery.date, delivery.amount, delivery.value), ("2022-01-31", 0.9, "DUMMYVAL"))
+        self.assertTrue(delivery.note.startswith(MISSING_RATE_NOTE))
+        self.assertEqual((single.date, single.value), ("2022-02-01", 2.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
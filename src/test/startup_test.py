@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Regression check for the startup cost of cli.py, based on python -X importtime
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parents[2]
+
+# Modules which must only be imported once a processing stage needs them
+HEAVY_MODULES = ["pandas", "numpy"]
+
+# Upper bound for the summed self-time of all imports of a fast path, in microseconds.
+# Python itself needs ~20ms here, pandas alone adds several hundred milliseconds.
+IMPORT_BUDGET_US = 150_000
+
+
+def _run_with_importtime(args):
+    process = subprocess.run([sys.executable, "-X", "importtime"] + args,
+                             cwd=PROJECT_DIR, capture_output=True, text=True)
+
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us)
+    return process, modules
+
+
+class StartupTest(unittest.TestCase):
+    """Test case implementation for the lazy import structure"""
+
+    def _assert_fast_path(self, modules):
+        for heavy_module in HEAVY_MODULES:
+            self.assertNotIn(heavy_module, modules)
+        self.assertLess(sum(modules.values()), IMPORT_BUDGET_US, msg=f"Slowest imports: {sorted(modules.items(), key=lambda m: -m[1])[:10]}")
+
+    def test_help_does_not_import_processing_modules(self):
+        process, modules = _run_with_importtime(["cli.py", "-h"])
+        self.assertEqual(process.returncode, 0)
+        self._assert_fast_path(modules)
+
+    def test_argument_errors_do_not_import_processing_modules(self):
+        process, modules = _run_with_importtime(["cli.py", "./testdata/Alle_historischen_Kurse.csv", "./does_not_exist.csv"])
+        self.assertEqual(process.returncode, 2)
+        self.assertIn("file not found", process.stderr)
+        self._assert_fast_path(modules)
+
+    def test_importing_src_modules_is_cheap(self):
+        process, modules = _run_with_importtime(["-c", "import src.ledger_processor, src.portfolio_performance_rate_provider, src.transactions, src.i18n"])
+        self.assertEqual(process.returncode, 0, msg=process.stderr[-2000:])
+        self._assert_fast_path(modules)
+
+    def test_importing_transactions_keeps_locale(self):
+        code = "import locale; before = locale.setlocale(locale.LC_ALL); import src.transactions; assert locale.setlocale(locale.LC_ALL) == before"
+        process = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, msg=process.stderr)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the StreamProcessor module
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import json
+import unittest
+from io import StringIO
+from textwrap import dedent
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.stream_processor import StreamProcessor, read_csv_rows, read_jsonl_rows
+from src.test.ledger_rows import MockRateProvider
+
+
+class StreamProcessorTest(unittest.TestCase):
+    """Test case implementation for StreamProcessor"""
+
+    KRAKEN_CSV = dedent("""\
+    "txid","refid","time","type","subtype","aclass","asset","amount","fee","balance"
+    "","QCCA6ZN-5V5YRZ-GFXN7W","2020-12-30 06:14:02","deposit","","currency","ZEUR",1000.0000,0.0000,""
+    "LYOM2B-J6VD2-YRYBOA","QCCA6ZN-5V5YRZ-GFXN7W","2020-12-30 06:14:54","deposit","","currency","ZEUR",1000.0000,0.0000,1000.0000
+    "LU4MDZ-PSSAV-7KKYF2","TTWFFE-HZX34-2EEGRM","2020-12-30 08:57:02","trade","","currency","ZEUR",-499.9999,0.8000,499.2001
+    "L3H4BL-PFLZU-JVX2JY","TTWFFE-HZX34-2EEGRM","2020-12-30 08:57:02","trade","","currency","XXBT",0.0174606900,0.0000000000,0.0174606900
+    "","ACC3OMW-HGUTIZ-YWRQ5G","2020-12-30 23:52:47","withdrawal","","currency","ZEUR",-100.0000,0.0900,""
+    "LLMXLS-24H3J-YIAPGT","ACC3OMW-HGUTIZ-YWRQ5G","2020-12-31 00:05:43","withdrawal","","currency","ZEUR",-100.0000,0.0900,399.1101
+    "","RUGLWVG-XQGB5M-MHHHL7","2020-12-31 01:03:09","deposit","","currency","ATOM.S",0.00344300,0.00000000,""
+    "L4U7Y4-WP76L-34UMSV","STFCFLD-65INO-G3O54V","2020-12-31 03:41:47","staking","","currency","ATOM.S",0.00344300,0.00000000,2.09972400
+    "L2BWE5-NBPJB-NIWB5S","TBCS6K-4RXM6-MGRNUC","2021-01-02 09:00:02","trade","","currency","ZEUR",-193.0000,0.2337,206.1101
+    "LLPJSO-KWCYV-ZCXUIN","TBCS6K-4RXM6-MGRNUC","2021-01-02 09:00:02","trade","","currency","DOT",14.0038729800,0.1222000600,13.8816729200
+    """)
+
+    def setUp(self):
+        self.settings = {"rate_provider": MockRateProvider(), "depot_current": "DEPOT", "depot_new": "DEPOT_NEW", "account": "ACCOUNT"}
+
+    def _full_conversion(self):
+        lp = LedgerProcessor(dataframe=pd.read_csv(StringIO(self.KRAKEN_CSV)), **self.settings)
+        return lp.render_transactions()
+
+    def _stream_outputs(self):
+        return {kind: StringIO() for kind in StreamProcessor.KINDS}
+
+    def test_stream_matches_full_conversion(self):
+        outputs = self._stream_outputs()
+        StreamProcessor(outputs, **self.settings).process(read_csv_rows(StringIO(self.KRAKEN_CSV)))
+
+        for kind, csv_output in self._full_conversion().items():
+            expected_header, *expected_lines = csv_output.strip("\n").split("\n")
+            observed_header, *observed_lines = outputs[kind].getvalue().strip("\n").split("\n")
+            self.assertEqual(observed_header, expected_header)
+            self.assertEqual(sorted(observed_lines), sorted(expected_lines))
+
+    def test_groups_are_emitted_once_their_day_is_complete(self):
+        outputs = self._stream_outputs()
+        sp = StreamProcessor(outputs, **self.settings)
+        rows = list(read_csv_rows(StringIO(self.KRAKEN_CSV)))
+
+        for row in rows[:6]:
+            sp.feed(row)
+
+        # 2020-12-30 is complete, except the withdrawal which continues on 2020-12-31
+        self.assertIn("TTWFFE-HZX34-2EEGRM", outputs[LedgerProcessor.DEPOT_NORMAL_FILENAME].getvalue())
+        self.assertIn("QCCA6ZN-5V5YRZ-GFXN7W", outputs[LedgerProcessor.ACCOUNT_FILENAME].getvalue())
+        self.assertNotIn("ACC3OMW-HGUTIZ-YWRQ5G", outputs[LedgerProcessor.ACCOUNT_FILENAME].getvalue())
+
+        for row in rows[6:9]:
+            sp.feed(row)
+
+        account_csv = outputs[LedgerProcessor.ACCOUNT_FILENAME].getvalue()
+        self.assertIn("2020-12-31;00:05:43;Entnahme;100,000000;;;;;;ACC3OMW-HGUTIZ-YWRQ5G,LLMXLS-24H3J-YIAPGT;", account_csv)
+        self.assertIn("STFCFLD-65INO-G3O54V", outputs[LedgerProcessor.DEPOT_SPECIAL_FILENAME].getvalue())
+        self.assertNotIn("TBCS6K-4RXM6-MGRNUC", outputs[LedgerProcessor.DEPOT_NORMAL_FILENAME].getvalue())
+
+        for row in rows[9:]:
+            sp.feed(row)
+        sp.finish()
+        self.assertIn("TBCS6K-4RXM6-MGRNUC", outputs[LedgerProcessor.DEPOT_NORMAL_FILENAME].getvalue())
+
+    # the withdrawal is settled after midnight, after another row of 2021-01-01
+    MIDNIGHT_CSV = dedent("""\
+    "txid","refid","time","type","subtype","aclass","asset","amount","fee","balance"
+    "LYOM2B-J6VD2-YRYBOA","QCCA6ZN-5V5YRZ-GFXN7W","2020-12-31 06:14:54","deposit","","currency","ZEUR",1000.0000,0.0000,1000.0000
+    "","ACC3OMW-HGUTIZ-YWRQ5G","2020-12-31 23:52:47","withdrawal","","currency","ZEUR",-100.0000,0.0900,""
+    "L4U7Y4-WP76L-34UMSV","STFCFLD-65INO-G3O54V","2021-01-01 00:01:47","staking","","currency","ATOM.S",0.00344300,0.00000000,2.09972400
+    "LLMXLS-24H3J-YIAPGT","ACC3OMW-HGUTIZ-YWRQ5G","2021-01-01 00:05:43","withdrawal","","currency","ZEUR",-100.0000,0.0900,899.8200
+    "L2BWE5-NBPJB-NIWB5S","TBCS6K-4RXM6-MGRNUC","2021-01-02 09:00:02","trade","","currency","ZEUR",-193.0000,0.2337,706.5863
+    "LLPJSO-KWCYV-ZCXUIN","TBCS6K-4RXM6-MGRNUC","2021-01-02 09:00:02","trade","","currency","DOT",14.0038729800,0.1222000600,13.8816729200
+    """)
+
+    def test_pending_leg_settled_after_midnight(self):
+        outputs = self._stream_outputs()
+        sp = StreamProcessor(outputs, **self.settings)
+        rows = list(read_csv_rows(StringIO(self.MIDNIGHT_CSV)))
+
+        for row in rows[:3]:
+            sp.feed(row)
+        # 2020-12-31 is held back until its withdrawal is settled
+        self.assertEqual(outputs[LedgerProcessor.ACCOUNT_FILENAME].getvalue(), "")
+
+        with self.assertNoLogs("src.stream_processor", level="WARNING"):
+            for row in rows[3:]:
+                sp.feed(row)
+            sp.finish()
+
+        account_lines = outputs[LedgerProcessor.ACCOUNT_FILENAME].getvalue().strip("\n").split("\n")[1:]
+        lp = LedgerProcessor(dataframe=pd.read_csv(StringIO(self.MIDNIGHT_CSV)), **self.settings)
+        expected_lines = lp.render_transactions()[LedgerProcessor.ACCOUNT_FILENAME].strip("\n").split("\n")[1:]
+        self.assertEqual(sorted(account_lines), sorted(expected_lines))
+        self.assertIn("2021-01-01;00:05:43;Entnahme;100,000000;;;;;;ACC3OMW-HGUTIZ-YWRQ5G,LLMXLS-24H3J-YIAPGT;", account_lines)
+
+    def test_late_settled_leg_is_reported(self):
+        outputs = self._stream_outputs()
+        sp = StreamProcessor(outputs, pending_days=0, **self.settings)
+        rows = list(read_csv_rows(StringIO(self.MIDNIGHT_CSV)))
+
+        for row in rows[:3]:
+            sp.feed(row)
+        with self.assertLogs("src.stream_processor", level="WARNING") as logs:
+            sp.feed(rows[3])
+        self.assertIn("ACC3OMW-HGUTIZ-YWRQ5G", logs.output[0])
+
+    def test_tagged_single_output(self):
+        output = StringIO()
+        StreamProcessor(output, **self.settings).process(read_csv_rows(StringIO(self.KRAKEN_CSV)))
+
+        lines = output.getvalue().strip("\n").split("\n")
+        self.assertTrue(all(line.split(";")[0] in StreamProcessor.KINDS for line in lines))
+        self.assertEqual(sum(1 for line in lines if line.startswith(LedgerProcessor.ACCOUNT_FILENAME)), 5)
+
+    def test_jsonl_input(self):
+        df = pd.read_csv(StringIO(self.KRAKEN_CSV), keep_default_na=False)
+        jsonl = "\n".join(json.dumps(record) for record in df.to_dict("records"))
+
+        csv_outputs = self._stream_outputs()
+        StreamProcessor(csv_outputs, **self.settings).process(read_csv_rows(StringIO(self.KRAKEN_CSV)))
+        jsonl_outputs = self._stream_outputs()
+        StreamProcessor(jsonl_outputs, **self.settings).process(read_jsonl_rows(StringIO(jsonl)))
+
+        for kind in StreamProcessor.KINDS:
+            self.assertEqual(jsonl_outputs[kind].getvalue(), csv_outputs[kind].getvalue())
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the TradeAggregator module and its use in LedgerProcessor
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+def _trade(refid, time, fiat_amount, crypto_amount, crypto_fee=0.0, fiat_fee=0.0, asset="XXBT"):
+    return [
+        ledger_row(refid, time, "trade", "ZEUR", fiat_amount, txid=f"F{refid}", fee=fiat_fee),
+        ledger_row(refid, time, "trade", asset, crypto_amount, txid=f"C{refid}", fee=crypto_fee),
+    ]
+
+
+class TradeAggregatorTest(unittest.TestCase):
+    """Test case implementation for TradeAggregator"""
+
+    ROWS = (_trade("R1", "2022-01-01 10:00:00", -100.0, 0.01, crypto_fee=0.0001)
+            + _trade("R2", "2022-01-01 10:00:00", -300.0, 0.02, fiat_fee=0.5)
+            + _trade("R3", "2022-01-01 10:00:01", -0.1, 0.00001)
+            + _trade("R4", "2022-01-01 10:00:01", 50.0, -0.002)  # sell, other side
+            + _trade("R5", "2022-01-01 10:00:01", -10.0, 1.0, asset="XETH")  # other asset
+            + _trade("R6", "2022-01-01 10:05:00", -100.0, 0.01))  # outside the window
+
+    def _process(self, **kwargs):
+        return LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=MockRateProvider(),
+                               depot_current="DEPOT", account="ACCOUNT", **kwargs)
+
+    def test_without_aggregation(self):
+        lp = self._process()
+        self.assertEqual(len([t for t in lp.depot_transactions if t.type == lp.BUY]), 5)
+
+    def test_aggregation(self):
+        lp = self._process(aggregate_trades=2)
+        buys = [t for t in lp.depot_transactions if t.type == lp.BUY]
+        sells = [t for t in lp.depot_transactions if t.type == lp.SELL]
+
+        self.assertEqual(sorted((t.asset, t.amount) for t in buys), [("ETH", 1.0), ("XBT", 0.01), ("XBT", 0.03001)])
+        aggregate = [t for t in buys if t.amount == 0.03001][0]
+        self.assertEqual(aggregate.value, 400.1)
+        self.assertEqual(aggregate.rate, 400.1 / 0.03001)
+        self.assertEqual(aggregate.fees, 0.5)
+        self.assertEqual(aggregate.total, 400.6)
+        self.assertEqual(aggregate.note, "R1,R2,R3,CR1,CR2,CR3,FR1,FR2,FR3")
+
+        # the fee sell of the first fill is booked once for the aggregate, the sell fill stays separate
+        self.assertEqual(sorted(t.amount for t in sells), [0.0001, 0.002])
+        self.assertEqual(len(lp.account_transactions), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
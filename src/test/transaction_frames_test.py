@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Unit test for the transaction_frames module and LedgerProcessor.to_frames()
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.ledger_processor import LedgerProcessor
+from src.transaction_frames import store_frame
+from src.test.ledger_rows import MockRateProvider, ledger_row
+
+
+class TransactionFramesTest(unittest.TestCase):
+    """Test case implementation for transaction_frames"""
+
+    ROWS = [
+        ledger_row("R1", "2022-01-01 10:00:00", "trade", "ZEUR", -100.0, txid="T1", fee=0.5),
+        ledger_row("R1", "2022-01-01 10:00:00", "trade", "XXBT", 0.01, txid="T2"),
+        ledger_row("R3", "2022-01-02 08:30:00", "staking", "DOT.S", 0.25, txid="T3"),
+        ledger_row("R4", "2022-01-03 12:00:00", "deposit", "ZEUR", 1000.0, txid="T4"),
+    ]
+
+    def _frames(self, rate_provider=MockRateProvider()):
+        lp = LedgerProcessor(dataframe=pd.DataFrame(self.ROWS), rate_provider=rate_provider,
+                             depot_current="DEPOT", account="ACCOUNT")
+        return lp, lp.to_frames()
+
+    def test_depot_frames(self):
+        lp, frames = self._frames()
+        normal = frames[LedgerProcessor.DEPOT_NORMAL_TRANSACTIONS]
+        special = frames[LedgerProcessor.DEPOT_SPECIAL_TRANSACTIONS]
+
+        self.assertEqual(list(normal.columns[:3]), ["datetime", "type", "asset"])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(normal["datetime"]))
+        for column in ["amount", "rate", "value", "fees", "total"]:
+            self.assertTrue(pd.api.types.is_float_dtype(normal[column]), column)
+
+        buy = normal[normal["type"] == lp.BUY].iloc[0]
+        self.assertEqual((buy["asset"], buy["amount"], buy["value"], buy["fees"], buy["total"]), ("XBT", 0.01, 100.0, 0.5, 100.5))
+        self.assertEqual(buy["datetime"], pd.Timestamp("2022-01-01 10:00:00"))
+        self.assertTrue(pd.isna(buy["taxes"]))
+
+        # inbound deliveries keep their type, unlike in the CSV for PP
+        self.assertEqual(list(special["type"]), [lp.DELIVERY_INBOUND])
+        self.assertEqual(list(special["value"]), [25.0])
+
+    def test_account_frame(self):
+        _, frames = self._frames()
+        account = frames[LedgerProcessor.ACCOUNT_TRANSACTIONS]
+        self.assertTrue(pd.api.types.is_float_dtype(account["amount"]))
+        self.assertIn(1000.0, list(account["amount"]))
+
+    def test_placeholders_without_rates(self):
+        _, frames = self._frames(rate_provider=None)
+        special = frames[LedgerProcessor.DEPOT_SPECIAL_TRANSACTIONS]
+        self.assertTrue(pd.api.types.is_float_dtype(special["value"]))
+        self.assertTrue(special["value"].isna().all())
+        self.assertEqual(list(special["amount"]), [0.25])
+
+    def test_empty_frames(self):
+        lp = LedgerProcessor(dataframe=pd.DataFrame(self.ROWS[3:]), rate_provider=MockRateProvider())
+        normal = lp.to_frames()[LedgerProcessor.DEPOT_NORMAL_TRANSACTIONS]
+        self.assertEqual(len(normal), 0)
+        self.assertTrue(pd.api.types.is_float_dtype(normal["amount"]))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            store_frame(pd.DataFrame(), "out.xlsx", "xlsx")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_store_frames(self):
+        lp, frames = self._frames()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for format in ["parquet", "feather", "arrow"]:
+                lp.store_frames(tmp_dir, format)
+            normal = frames[LedgerProcessor.DEPOT_NORMAL_TRANSACTIONS]
+            pd.testing.assert_frame_equal(pd.read_parquet(os.path.join(tmp_dir, "transactions_normal_depot.parquet")), normal)
+            pd.testing.assert_frame_equal(pd.read_feather(os.path.join(tmp_dir, "transactions_normal_depot.feather")), normal)
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, "transactions_account.arrow")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Trade aggregation module
+
+Large orders fill in many trade legs (one refid each) within seconds, and
+every leg becomes its own buy/sell (plus fee sell and fee booking) in PP.
+The aggregator merges the trade groups of one asset and side whose fills lie
+within a time window into one group: one fiat and one crypto row with the
+exact sums of amounts and fees. LedgerProcessor then books it as one
+transaction, whose rate (fiat / crypto) is the volume-weighted rate of the
+fills and whose note lists all refids and txids.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import datetime
+import numbers
+
+from . import fixed_point
+from .assets import DEFAULT_NORMALIZER
+from .ledger_rules import FORCED_BRANCH
+
+# meta entry of an aggregated group: the ledger rows of all merged groups (used for the note)
+AGGREGATED_ROWS = "aggregated_rows"
+
+
+class TradeAggregator:
+
+    def __init__(self, window_seconds, fiat_currency="EUR", asset_normalizer=None):
+        """window_seconds: fills up to this long after the first fill of an aggregate are merged into it"""
+        self._window = datetime.timedelta(seconds=window_seconds)
+        self._fiat_currency = fiat_currency
+        self._asset_normalizer = asset_normalizer if asset_normalizer is not None else DEFAULT_NORMALIZER
+        self.merged_groups = 0
+
+    def _split(self, transaction):
+        """(fiat row, crypto row) of a plain trade group, None for anything else"""
+        meta = transaction.get("meta", {})
+        if meta.get("parsing_info") not in ("dup", "nondup") or set(transaction.get("types", [])) != {"trade"}:
+            return None
+        if FORCED_BRANCH in meta:
+            return None  # forced into a branch by a rule, kept as it is
+        # same fiat detection as LedgerProcessor._process_trade (ZEUR contains EUR)
+        fiat = [row for row in transaction["raw"] if self._fiat_currency in row["asset"]]
+        crypto = [row for row in transaction["raw"] if self._fiat_currency not in row["asset"]]
+        if len(fiat) != 1 or len(crypto) != 1:
+            return None  # left to LedgerProcessor, which reports it
+        if not isinstance(fiat[0]["amount"], numbers.Number) or not isinstance(crypto[0]["amount"], numbers.Number):
+            return None
+        return fiat[0], crypto[0]
+
+    @staticmethod
+    def _time(row):
+        return datetime.datetime.fromisoformat(str(row["time"]).split(".")[0])
+
+    @staticmethod
+    def _sum_row(rows):
+        row = dict(rows[0])
+        row["amount"] = fixed_point.add(*[r["amount"] for r in rows])
+        row["fee"] = fixed_point.add(*[r["fee"] if r["fee"] != "" else 0 for r in rows])
+        return row
+
+    def aggregate(self, transactions):
+        """Returns the groups with mergeable trades combined, in the order of their first group"""
+        candidates = []
+        for transaction_id, transaction in transactions.items():
+            legs = self._split(transaction)
+            if legs is not None:
+                fiat, crypto = legs
+                side = "sell" if fiat["amount"] > 0 else "buy"
+                candidates.append((self._asset_normalizer.normalize(crypto["asset"]), side, self._time(crypto), transaction_id, legs))
+
+        # aggregate id -> ids of its groups
+        members = {}
+        open_aggregates = {}  # (asset, side) -> (aggregate id, time of its first fill)
+        for asset, side, time, transaction_id, legs in sorted(candidates, key=lambda candidate: (candidate[2], candidate[3])):
+            current = open_aggregates.get((asset, side))
+            if current is not None and time - current[1] <= self._window:
+                members[current[0]].append(transaction_id)
+            else:
+                open_aggregates[(asset, side)] = (transaction_id, time)
+                members[transaction_id] = [transaction_id]
+
+        merged_into = {}
+        for aggregate_id, ids in members.items():
+            for transaction_id in ids[1:]:
+                merged_into[transaction_id] = aggregate_id
+        legs_by_id = {candidate[3]: candidate[4] for candidate in candidates}
+
+        result = {}
+        for transaction_id, transaction in transactions.items():
+            if transaction_id in merged_into:
+                continue
+            ids = members.get(transaction_id)
+            if ids is None or len(ids) == 1:
+                result[transaction_id] = transaction
+                continue
+            self.merged_groups += len(ids) - 1
+            rows = [row for group_id in ids for row in transactions[group_id]["raw"]]
+            result[transaction_id] = {
+                "raw": [self._sum_row([legs_by_id[group_id][0] for group_id in ids]),
+                        self._sum_row([legs_by_id[group_id][1] for group_id in ids])],
+                "types": ["trade", "trade"],
+                "meta": dict(transaction.get("meta", {}), **{AGGREGATED_ROWS: rows}),
+            }
+        return result
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Transaction frames module
+
+Turns DepotTransaction/AccountTransaction lists into pandas DataFrames with
+typed columns, taken straight from the transaction attributes (nothing is
+formatted and parsed again): "datetime" (date and time as datetime64),
+numbers as float64 and texts as strings. Values that are not numbers, like
+the placeholders booked without a rate provider or the empty fees of a
+delivery, become NaN. The types are kept as they are, inbound deliveries are
+not renamed to buys like in the CSV for PP.
+
+The frames can be written as Parquet, Feather or Arrow IPC files, which
+needs the optional pyarrow package.
+
+Copyright 2022-05-16 AlexanderLill
+"""
+import numbers
+import os
+
+DEPOT_NUMBER_COLUMNS = ["amount", "rate", "value", "fees", "taxes", "total"]
+DEPOT_TEXT_COLUMNS = ["type", "asset", "account", "other_account", "note", "source"]
+ACCOUNT_NUMBER_COLUMNS = ["amount", "value", "pieces", "per_piece"]
+ACCOUNT_TEXT_COLUMNS = ["type", "asset", "account", "note", "source"]
+
+# format -> file extension
+FORMATS = {"parquet": ".parquet", "feather": ".feather", "arrow": ".arrow"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Writing Parquet/Feather/Arrow files needs the pyarrow package (pip install pyarrow)") from None
+    return pyarrow
+
+
+def transactions_frame(transactions, number_columns, text_columns):
+    """One row per transaction: datetime, then the number and text columns in the given order"""
+    import numpy as np
+    import pandas as pd
+
+    columns = {"datetime": pd.to_datetime([f"{t.date} {t.time}" for t in transactions], format="%Y-%m-%d %H:%M:%S")}
+    for column in number_columns:
+        values = (getattr(t, column) for t in transactions)
+        columns[column] = np.fromiter((value if isinstance(value, numbers.Number) else np.nan for value in values),
+                                      dtype=np.float64, count=len(transactions))
+    for column in text_columns:
+        columns[column] = pd.array([str(getattr(t, column)) for t in transactions], dtype="string")
+    order = ["datetime", "type", "asset"] + [c for c in number_columns + text_columns if c not in ("type", "asset")]
+    return pd.DataFrame(columns)[order]
+
+
+def depot_frame(transactions):
+    return transactions_frame(transactions, DEPOT_NUMBER_COLUMNS, DEPOT_TEXT_COLUMNS)
+
+
+def account_frame(transactions):
+    return transactions_frame(transactions, ACCOUNT_NUMBER_COLUMNS, ACCOUNT_TEXT_COLUMNS)
+
+
+def store_frame(frame, output_filename, format):
+    """Writes one frame as parquet, feather or arrow (IPC file format)"""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}', expected one of {', '.join(FORMATS)}")
+    pyarrow = _pyarrow()
+    if format == "parquet":
+        frame.to_parquet(output_filename, index=False)
+    elif format == "feather":
+        frame.to_feather(output_filename)
+    else:
+        import pyarrow.ipc
+
+        table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+        with pyarrow.ipc.new_file(output_filename, table.schema) as writer:
+            writer.write_table(table)
+
+
+def store_frames(frames, out_dir, format):
+    """Writes {CSV file name: frame} to out_dir, each with the extension of format instead of .csv"""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}', expected one of {', '.join(FORMATS)}")
+    for filename, frame in frames.items():
+        store_frame(frame, os.path.join(out_dir, os.path.splitext(filename)[0] + FORMATS[format]), format)
@@ -7,10 +7,23 @@ Copyright 2022-05-16 AlexanderLill
 import json
 import numbers
 import locale
-locale.setlocale(locale.LC_ALL, "de_DE.utf-8")  # TODO: Cleanup locale stuff
 
 CSV_SEP = ";"
 
+_locale_initialized = False
+
+
+def _format_number(value):
+    """Formats numbers for the PP CSV import, strings (e.g. DUMMYRATE) are passed through"""
+    global _locale_initialized
+    if not isinstance(value, numbers.Number):
+        return value
+    if not _locale_initialized:
+        # Deferred until the first number is rendered, so importing this module stays cheap
+        locale.setlocale(locale.LC_ALL, "de_DE.utf-8")  # TODO: Cleanup locale stuff
+        _locale_initialized = True
+    return locale.format_string('%.6f', value, grouping=True, monetary=True)
+
 class DepotTransaction:
     """
     Datum;Typ;Wertpapier;Stück;Kurs;Betrag;Gebühren;Steuern;Gesamtpreis;Konto;Gegenkonto;Notiz;Quelle
@@ -40,12 +53,12 @@ class DepotTransaction:
         result += f"{self.time}{CSV_SEP}"
         result += f"{self.type}{CSV_SEP}"
         result += f"{self.asset}{CSV_SEP}"
-        result += f"{locale.format_string('%.6f', self.amount, grouping=True, monetary=True) if isinstance(self.amount, numbers.Number) else self.amount}{CSV_SEP}"
-        result += f"{locale.format_string('%.6f', self.rate, grouping=True, monetary=True) if isinstance(self.rate, numbers.Number) else self.rate}{CSV_SEP}"
-        result += f"{locale.format_string('%.6f', self.value, grouping=True, monetary=True) if isinstance(self.value, numbers.Number) else self.value}{CSV_SEP}"
-        result += f"{locale.format_string('%.6f', self.fees, grouping=True, monetary=True) if isinstance(self.fees, numbers.Number) else self.fees}{CSV_SEP}"
+        result += f"{_format_number(self.amount)}{CSV_SEP}"
+        result += f"{_format_number(self.rate)}{CSV_SEP}"
+        result += f"{_format_number(self.value)}{CSV_SEP}"
+        result += f"{_format_number(self.fees)}{CSV_SEP}"
         result += f"{self.taxes}{CSV_SEP}"
-        result += f"{locale.format_string('%.6f', self.total, grouping=True, monetary=True) if isinstance(self.total, numbers.Number) else self.total}{CSV_SEP}"
+        result += f"{_format_number(self.total)}{CSV_SEP}"
         result += f"{self.account}{CSV_SEP}"
         result += f"{self.other_account}{CSV_SEP}"
         result += f"{self.note}{CSV_SEP}"
@@ -81,7 +94,7 @@ class AccountTransaction:
         result += f"{self.date}{CSV_SEP}"
         result += f"{self.time}{CSV_SEP}"
         result += f"{self.type}{CSV_SEP}"
-        result += f"{locale.format_string('%.6f', self.amount, grouping=True,monetary=True) if isinstance(self.amount, numbers.Number) else self.amount}{CSV_SEP}"
+        result += f"{_format_number(self.amount)}{CSV_SEP}"
         result += f"{self.value}{CSV_SEP}"
         result += f"{self.asset}{CSV_SEP}"
         result += f"{self.pieces}{CSV_SEP}"